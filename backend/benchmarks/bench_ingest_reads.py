@@ -0,0 +1,151 @@
+"""Measure read-endpoint latency while ingestion runs.
+
+Usage (from backend/):  PYTHONPATH=src python benchmarks/bench_ingest_reads.py --pages 20 --latency 0.05
+
+Ingests one repo whose history pages arrive from a fake network (`--latency` seconds each)
+while clients hit `/metrics/summary` and `/repos/{id}/commit/{sha}` for commits whose files
+are not stored yet, so every detail request also writes (ensure_commit_files). Three runs:
+
+- idle:   reads only
+- legacy: the old pattern, writing each page and keeping the transaction open across the
+          next page's network wait (commit only at the end)
+- split:  the current ingest_repo (network phase with no transaction, then a short write)
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from habits_api import filequeue, ingest
+from habits_api.app import app
+from habits_api.config import get_settings
+from habits_api.db import Base, Repository, configure_sqlite, get_session
+from habits_api.writes import insert_commits
+
+
+def _commits(prefix: str, count: int) -> list[dict]:
+    return [
+        {"sha": f"{prefix}{i:036x}", "committed_at": "2025-01-01T00:00:00Z", "message": f"{prefix} {i}", "additions": 3, "deletions": 1}
+        for i in range(count)
+    ]
+
+
+async def legacy_ingest(session: AsyncSession, repo: Repository, pages, latency: float) -> None:
+    """Pre-split behaviour: writes stay uncommitted while the next page is fetched."""
+    for page in pages:
+        await asyncio.sleep(latency)
+        await insert_commits(session, repo.id, page)
+    await session.commit()
+
+
+async def run(args: argparse.Namespace, mode: str) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{Path(tmp) / 'bench.db'}")
+        configure_sqlite(engine)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        factory = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+
+        async with factory() as session:
+            repo = Repository(full_name="bench/r")
+            session.add(repo)
+            await session.flush()
+            viewed = list(await insert_commits(session, repo.id, _commits("a", args.reads)))
+            await session.commit()
+            repo_id = repo.id
+
+        pages = [_commits(f"p{p:02d}", args.page_size) for p in range(args.pages)]
+
+        async def fake_pages(full_name, since, after=None, source="github"):
+            for page in pages:
+                await asyncio.sleep(args.latency)
+                yield {"default_branch": "main", "is_private": False, "commits": page, "has_next_page": True, "end_cursor": None}
+
+        async def fake_files(full_name, sha, source="github"):
+            await asyncio.sleep(args.latency / 5)
+            return {"files": [{"path": "a.py", "status": "modified", "additions": 1, "deletions": 0, "patch": "@@ -1 +1 @@\n-a\n+b"}]}
+
+        ingest.iter_commit_pages = fake_pages
+        filequeue.fetch_commit_files = fake_files
+
+        async def _session():
+            async with factory() as s:
+                yield s
+
+        app.dependency_overrides[get_session] = _session
+        timings: list[float] = []
+        errors = 0
+        done = asyncio.Event()
+
+        async def reader(ac: AsyncClient, worker: int) -> None:
+            nonlocal errors
+            i = worker
+            while not done.is_set() and i < len(viewed):
+                url = f"/repos/{repo_id}/commit/{viewed[i]}?include_patch=false" if i % 2 else "/metrics/summary?window=7d"
+                started = time.perf_counter()
+                r = await ac.get(url)
+                timings.append((time.perf_counter() - started) * 1000)
+                errors += r.status_code >= 400
+                i += args.clients
+
+        async def writer() -> float:
+            started = time.perf_counter()
+            async with factory() as session:
+                repo = await session.get(Repository, repo_id)
+                if mode == "legacy":
+                    await legacy_ingest(session, repo, pages, args.latency)
+                elif mode == "split":
+                    await ingest.ingest_repo(session, repo)
+                else:
+                    await asyncio.sleep(args.latency * args.pages)
+            return time.perf_counter() - started
+
+        try:
+            async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as ac:
+                for _ in range(3):  # warm up imports, pools and the first connection
+                    await ac.get("/metrics/summary?window=7d")
+                readers = [asyncio.create_task(reader(ac, w)) for w in range(args.clients)]
+                ingest_seconds = await writer()
+                done.set()
+                await asyncio.gather(*readers)
+        finally:
+            app.dependency_overrides.clear()
+            await engine.dispose()
+
+    return {
+        "reads": len(timings),
+        "errors": errors,
+        "p50_ms": round(statistics.median(timings), 3),
+        "p99_ms": round(statistics.quantiles(timings, n=100)[98], 3),
+        "max_ms": round(max(timings), 3),
+        "ingest_s": round(ingest_seconds, 3),
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per fake network round-trip")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--reads", type=int, default=2000, help="distinct commits available to view")
+    parser.add_argument("--no-wal", action="store_true", help="use SQLite's rollback journal instead of WAL")
+    args = parser.parse_args()
+
+    settings = get_settings()
+    settings.response_cache_ttl_seconds = 0  # measure the database, not the response cache
+    settings.sqlite_wal = not args.no_wal
+    results = {mode: await run(args, mode) for mode in ("idle", "legacy", "split")}
+    print(json.dumps({"wal": settings.sqlite_wal, "pages": args.pages, "latency_s": args.latency, **results}, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,124 @@
+"""Measure DB size and commit_detail latency for inline vs compressed patch storage.
+
+Usage (from backend/):  PYTHONPATH=src python benchmarks/bench_patch_storage.py --commits 500 --files 8
+
+Builds a database with patches stored inline in commit_files.patch (the old layout), measures it,
+then runs the migration to compressed patch_blobs, VACUUMs and measures again.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from habits_api.app import app
+from habits_api.db import Base, CommitFile, Repository, get_session
+from habits_api.patches import migrate_patches
+from habits_api.writes import insert_commits
+
+WORDS = "self return value config session commit repo patch update select insert await async def class if else for in".split()
+
+
+def fake_patch(rng: random.Random, lines: int) -> str:
+    out = [f"@@ -1,{lines} +1,{lines} @@"]
+    for _ in range(lines):
+        code = " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 10)))
+        out.append(rng.choice(" +-") + "    " + code)
+    return "\n".join(out) + "\n"
+
+
+async def measure(factory, db_path: Path, engine, shas, requests: int) -> dict:
+    async with engine.connect() as conn:
+        await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("VACUUM"))
+
+    async def _session():
+        async with factory() as s:
+            yield s
+
+    app.dependency_overrides[get_session] = _session
+    result = {"db_bytes": os.path.getsize(db_path)}
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as ac:
+            for include in (False, True):
+                timings = []
+                for i in range(requests):
+                    sha = shas[i % len(shas)]
+                    started = time.perf_counter()
+                    r = await ac.get(f"/repos/1/commit/{sha}", params={"include_patch": str(include).lower()})
+                    timings.append((time.perf_counter() - started) * 1000)
+                    r.raise_for_status()
+                key = "with_patch" if include else "without_patch"
+                result[f"{key}_p50_ms"] = round(statistics.median(timings), 3)
+                result[f"{key}_p99_ms"] = round(statistics.quantiles(timings, n=100)[98], 3)
+    finally:
+        app.dependency_overrides.clear()
+    return result
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--commits", type=int, default=500)
+    parser.add_argument("--files", type=int, default=8)
+    parser.add_argument("--lines", type=int, default=80, help="average patch length in lines")
+    parser.add_argument("--requests", type=int, default=300)
+    args = parser.parse_args()
+    rng = random.Random(42)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "bench.db"
+        engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        factory = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+
+        async with factory() as session:
+            repo = Repository(full_name="bench/repo")
+            session.add(repo)
+            await session.flush()
+            commits = [{"sha": f"{i:040x}", "committed_at": "2025-01-01T00:00:00Z", "message": f"c{i}"} for i in range(args.commits)]
+            ids = await insert_commits(session, repo.id, commits)
+            # Old layout: patch text inline in commit_files.patch
+            session.add_all(
+                CommitFile(commit_id=cid, path=f"src/m{j}.py", status="modified", patch=fake_patch(rng, rng.randint(args.lines // 2, args.lines * 3 // 2)))
+                for cid in ids.values()
+                for j in range(args.files)
+            )
+            await session.commit()
+        shas = list(ids)
+
+        before = await measure(factory, db_path, engine, shas, args.requests)
+        async with factory() as session:
+            started = time.perf_counter()
+            moved = await migrate_patches(session)
+            migrate_seconds = round(time.perf_counter() - started, 3)
+        after = await measure(factory, db_path, engine, shas, args.requests)
+        await engine.dispose()
+
+    print(
+        json.dumps(
+            {
+                "commits": args.commits,
+                "files_per_commit": args.files,
+                "migrated_rows": moved,
+                "migrate_seconds": migrate_seconds,
+                "inline": before,
+                "compressed": after,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
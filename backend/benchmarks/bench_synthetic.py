@@ -0,0 +1,207 @@
+"""End-to-end synthetic load: ingest from a local fake GitHub, then load the read endpoints.
+
+Usage (from backend/):  PYTHONPATH=src python benchmarks/bench_synthetic.py --repos 10 --commits 200 --files 5
+
+Three phases against a fresh SQLite database, with GitHub replaced by `fake_github.FakeGitHub`:
+
+- ingest: `ingest_all` over every repo (batched GraphQL history, then the per-repo writes)
+- files:  the file queue drains, fetching each commit's files over REST
+- reads:  `--clients` concurrent clients issue `--requests` requests across the read endpoints
+
+Prints one JSON document (also written to `--output`) with commits/sec, API calls per commit,
+per-endpoint p50/p99 and peak RSS, so runs can be diffed. The rate governor's local pacing is
+lifted unless `--paced` is given, so the numbers measure this code rather than the token bucket.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import httpx
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from fake_github import FakeGitHub
+from habits_api import github, ratelimit
+from habits_api.app import app
+from habits_api.config import get_settings
+from habits_api.db import Base, Commit, CommitFile, Repository, configure_sqlite, get_session
+from habits_api.filequeue import FileFetchQueue
+from habits_api.ingest import ingest_all
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def percentiles(timings: list[float]) -> dict:
+    if len(timings) < 2:
+        return {"n": len(timings), "p50_ms": round(timings[0], 3) if timings else None, "p99_ms": None}
+    return {
+        "n": len(timings),
+        "p50_ms": round(statistics.median(timings), 3),
+        "p99_ms": round(statistics.quantiles(timings, n=100)[98], 3),
+    }
+
+
+async def count(factory, column) -> int:
+    async with factory() as session:
+        return (await session.execute(select(func.count(column)))).scalar_one()
+
+
+async def run(args: argparse.Namespace) -> dict:
+    fake = FakeGitHub(args.repos, args.commits, args.files, seed=args.seed, latency=args.latency)
+    github._client = httpx.AsyncClient(transport=ASGITransport(app=fake.app))
+    result: dict = {
+        "params": {k: v for k, v in vars(args).items() if k != "output"},
+        "fake_commits": fake.total_commits,
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{Path(tmp) / 'bench.db'}")
+        configure_sqlite(engine)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        factory = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+        async with factory() as session:
+            repos = [Repository(full_name=name) for name in fake.repos]
+            session.add_all(repos)
+            await session.commit()
+            repo_ids = [r.id for r in repos]
+
+        try:
+            started = time.perf_counter()
+            stats = await ingest_all(factory, concurrency=args.concurrency, repo_ids=repo_ids)
+            seconds = time.perf_counter() - started
+            commits = await count(factory, Commit.id)
+            result["ingest"] = {
+                "commits": commits,
+                "failed_repos": stats.repos_failed,
+                "seconds": round(seconds, 3),
+                "commits_per_sec": round(commits / seconds, 1),
+                "graphql_calls": fake.calls["graphql"],
+                "api_calls_per_commit": round(fake.calls["graphql"] / max(commits, 1), 4),
+                "peak_rss_mb": peak_rss_mb(),
+            }
+
+            started = time.perf_counter()
+            await FileFetchQueue(factory, concurrency=args.concurrency).drain()
+            seconds = time.perf_counter() - started
+            files = await count(factory, CommitFile.id)
+            result["files"] = {
+                "commits": commits,
+                "files": files,
+                "seconds": round(seconds, 3),
+                "commits_per_sec": round(commits / seconds, 1),
+                "rest_calls": fake.calls["rest"],
+                "api_calls_per_commit": round(fake.calls["rest"] / max(commits, 1), 4),
+                "peak_rss_mb": peak_rss_mb(),
+            }
+
+            result["reads"] = await load_reads(args, factory, fake, repo_ids)
+            result["reads"]["peak_rss_mb"] = peak_rss_mb()
+            result["total_api_calls_per_commit"] = round(sum(fake.calls.values()) / max(commits, 1), 4)
+        finally:
+            await github.close_client()
+            await engine.dispose()
+    return result
+
+
+async def load_reads(args: argparse.Namespace, factory, fake: FakeGitHub, repo_ids: list[int]) -> dict:
+    rng = random.Random(args.seed)
+    shas = {repo_id: [c.sha for c in fake.repos[name]] for repo_id, name in zip(repo_ids, fake.repos)}
+
+    def pick() -> tuple[str, str]:
+        kind = rng.choice(["summary", "repos", "repo_metrics", "repo_commits", "commit_detail"])
+        repo_id = rng.choice(repo_ids)
+        url = {
+            "summary": "/metrics/summary?window=7d",
+            "repos": "/repos",
+            "repo_metrics": f"/repos/{repo_id}/metrics?window=7d",
+            "repo_commits": f"/repos/{repo_id}/commits?window=7d&limit=100",
+            "commit_detail": f"/repos/{repo_id}/commit/{rng.choice(shas[repo_id])}" if shas[repo_id] else "/repos",
+        }[kind]
+        return kind, url
+
+    plan = [pick() for _ in range(args.requests)]
+    timings: dict[str, list[float]] = defaultdict(list)
+    errors = 0
+
+    async def _session():
+        async with factory() as s:
+            yield s
+
+    async def client(ac: AsyncClient, worker: int) -> None:
+        nonlocal errors
+        for kind, url in plan[worker :: args.clients]:
+            started = time.perf_counter()
+            r = await ac.get(url)
+            timings[kind].append((time.perf_counter() - started) * 1000)
+            errors += r.status_code >= 400
+
+    app.dependency_overrides[get_session] = _session
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as ac:
+            started = time.perf_counter()
+            await asyncio.gather(*(client(ac, w) for w in range(args.clients)))
+            seconds = time.perf_counter() - started
+    finally:
+        app.dependency_overrides.clear()
+
+    everything = [t for ts in timings.values() for t in ts]
+    return {
+        "requests": len(everything),
+        "errors": errors,
+        "requests_per_sec": round(len(everything) / seconds, 1),
+        **percentiles(everything),
+        "endpoints": {kind: percentiles(ts) for kind, ts in sorted(timings.items())},
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repos", type=int, default=10)
+    parser.add_argument("--commits", type=int, default=200, help="commits per repo")
+    parser.add_argument("--files", type=int, default=5, help="max changed files per commit")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every fake GitHub call")
+    parser.add_argument("--concurrency", type=int, default=4, help="ingest writers and file-queue workers")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cache", action="store_true", help="keep the response cache on during reads")
+    parser.add_argument("--paced", action="store_true", help="keep the rate governor's configured pacing")
+    parser.add_argument("--output", type=Path, help="also write the JSON result here")
+    args = parser.parse_args()
+
+    settings = get_settings()
+    settings.github_token = "bench"
+    settings.http_cache_path = ""
+    settings.commit_files_prefetch = 0  # files are loaded by the file phase
+    if not args.cache:
+        settings.response_cache_ttl_seconds = 0
+    if not args.paced:
+        settings.github_graphql_rate_per_second = settings.github_rest_rate_per_second = 1e6
+        settings.github_rate_burst = 1_000_000
+    ratelimit._governor = None  # rebuilt from the settings above
+
+    result = await run(args)
+    text = json.dumps(result, indent=2)
+    if args.output:
+        args.output.write_text(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,122 @@
+"""Compare per-row vs set-based commit ingestion writes.
+
+Usage (from backend/):  PYTHONPATH=src python benchmarks/bench_upsert.py --commits 2000 --files 5
+
+Each mode writes the same pages into a fresh SQLite database, then writes them a second
+time (all duplicates, as on a re-ingest). Prints one JSON object with rows/sec per mode.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import datetime as dt
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from habits_api.db import Base, Commit, CommitFile, Repository
+from habits_api.writes import insert_commit_files, insert_commits
+
+
+def make_pages(commits: int, files: int, page_size: int = 100):
+    base = dt.datetime(2025, 1, 1, tzinfo=dt.timezone.utc)
+    page = []
+    for i in range(commits):
+        page.append(
+            {
+                "sha": f"{i:040x}",
+                "committed_at": (base + dt.timedelta(minutes=i)).isoformat(),
+                "message": f"commit {i}",
+                "author_name": "Bench",
+                "author_login": "bench",
+                "additions": 10,
+                "deletions": 3,
+                "changed_files": files,
+                "url": None,
+                "files": [
+                    {"path": f"src/file_{j}.py", "status": "modified", "additions": 2, "deletions": 1, "patch": "@@ -1 +1 @@\n-a\n+b\n"}
+                    for j in range(files)
+                ],
+            }
+        )
+        if len(page) == page_size:
+            yield page
+            page = []
+    if page:
+        yield page
+
+
+async def write_per_row(session: AsyncSession, repo_id: int, page) -> None:
+    # The pre-bulk ingest path: existence check, add + flush for an id, then one add per file.
+    for c in page:
+        exists = await session.execute(select(func.count(Commit.id)).where(Commit.repo_id == repo_id, Commit.sha == c["sha"]))
+        if exists.scalar_one():
+            continue
+        commit = Commit(
+            repo_id=repo_id,
+            sha=c["sha"],
+            author_name=c["author_name"],
+            author_login=c["author_login"],
+            committed_at=dt.datetime.fromisoformat(c["committed_at"]),
+            message=c["message"],
+            additions=c["additions"],
+            deletions=c["deletions"],
+            changed_files=c["changed_files"],
+            url=c["url"],
+        )
+        session.add(commit)
+        await session.flush()
+        for f in c["files"]:
+            session.add(CommitFile(commit_id=commit.id, **f))
+
+
+async def write_bulk(session: AsyncSession, repo_id: int, page) -> None:
+    ids = await insert_commits(session, repo_id, page)
+    by_sha = {c["sha"]: c["files"] for c in page}
+    await insert_commit_files(session, {cid: by_sha[sha] for sha, cid in ids.items()})
+
+
+async def run(mode: str, commits: int, files: int) -> dict:
+    writer = write_per_row if mode == "per_row" else write_bulk
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{Path(tmp) / 'bench.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        factory = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+        async with factory() as session:
+            repo = Repository(full_name="bench/repo")
+            session.add(repo)
+            await session.commit()
+            repo_id = repo.id
+
+        result = {"mode": mode}
+        for phase in ("fresh", "duplicate"):
+            started = time.perf_counter()
+            async with factory() as session:
+                for page in make_pages(commits, files):
+                    await writer(session, repo_id, page)
+                    await session.commit()
+            elapsed = time.perf_counter() - started
+            rows = commits * (1 + files)
+            result[f"{phase}_seconds"] = round(elapsed, 3)
+            result[f"{phase}_rows_per_sec"] = round(rows / elapsed, 1)
+        await engine.dispose()
+        return result
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--commits", type=int, default=2000)
+    parser.add_argument("--files", type=int, default=5)
+    args = parser.parse_args()
+
+    results = [await run(mode, args.commits, args.files) for mode in ("per_row", "bulk")]
+    print(json.dumps({"commits": args.commits, "files_per_commit": args.files, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,188 @@
+"""A local GitHub stand-in for benchmarks: the GraphQL and REST calls habits_api makes.
+
+Serves `repos` synthetic repositories named `bench/repo-000`, ... each with `commits` commits
+spread over the last day and `files` changed files per commit (patch sizes vary per file).
+Everything is derived from `seed`, so two runs with the same parameters see the same data.
+
+    fake = FakeGitHub(repos=10, commits=200, files=5)
+    github._client = httpx.AsyncClient(transport=httpx.ASGITransport(app=fake.app))
+
+`fake.calls` counts requests per kind ("graphql", "rest").
+"""
+from __future__ import annotations
+
+import asyncio
+import datetime as dt
+import hashlib
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+WORDS = "self return value config session commit repo patch update select insert await async def class if else for in".split()
+DIRS = ["src", "src/core", "src/api", "tests", "docs", "scripts"]
+EXTS = [".py", ".ts", ".md", ".json", ".yml"]
+# high enough that a benchmark never parks on a quota reset
+RATE_LIMIT = 1_000_000
+
+
+@dataclass
+class FakeCommit:
+    sha: str
+    committed_at: dt.datetime
+    message: str
+    # (path, status, additions, deletions)
+    files: List[Tuple[str, str, int, int]]
+
+    @property
+    def additions(self) -> int:
+        return sum(f[2] for f in self.files)
+
+    @property
+    def deletions(self) -> int:
+        return sum(f[3] for f in self.files)
+
+
+def _patch(rng: random.Random, additions: int, deletions: int) -> str:
+    lines = [f"@@ -1,{deletions + 2} +1,{additions + 2} @@", "     context"]
+    for sign, count in (("-", deletions), ("+", additions)):
+        for _ in range(count):
+            lines.append(sign + "    " + " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 10))))
+    lines.append("     context")
+    return "\n".join(lines)
+
+
+class FakeGitHub:
+    def __init__(self, repos: int, commits: int, files: int, seed: int = 0, latency: float = 0.0) -> None:
+        self.latency = latency
+        self.seed = seed
+        self.calls: Counter[str] = Counter()
+        now = dt.datetime.now(dt.timezone.utc).replace(microsecond=0)
+        self.repos: Dict[str, List[FakeCommit]] = {}
+        for r in range(repos):
+            name = f"bench/repo-{r:03d}"
+            rng = random.Random(f"{seed}:{name}")
+            history = []
+            for i in range(commits):
+                sha = hashlib.sha1(f"{seed}:{name}:{i}".encode()).hexdigest()
+                # newest first, inside the default 24h first-ingest window
+                committed_at = now - dt.timedelta(seconds=60 + i * (23 * 3600 // max(commits, 1)))
+                changed = []
+                for f in range(max(1, rng.randint(files // 2 or 1, files))):
+                    path = f"{rng.choice(DIRS)}/mod_{rng.randint(0, 4 * files)}_{f}{rng.choice(EXTS)}"
+                    # skewed sizes: mostly small edits, some large ones
+                    additions = min(400, int(rng.paretovariate(1.2) * 4))
+                    deletions = rng.randint(0, additions)
+                    changed.append((path, rng.choice(["modified", "modified", "modified", "added"]), additions, deletions))
+                history.append(FakeCommit(sha, committed_at, f"Change {i} in {name}\n\nDetails.", changed))
+            self.repos[name] = history
+        self.by_sha = {c.sha: c for history in self.repos.values() for c in history}
+        self.app = self._build_app()
+
+    @property
+    def total_commits(self) -> int:
+        return len(self.by_sha)
+
+    def _headers(self, kind: str) -> Dict[str, str]:
+        reset = int(time.time()) + 3600
+        return {
+            "x-ratelimit-limit": str(RATE_LIMIT),
+            "x-ratelimit-remaining": str(max(0, RATE_LIMIT - self.calls[kind])),
+            "x-ratelimit-reset": str(reset),
+        }
+
+    def _history(self, full_name: str, since: str, after: Optional[str], first: int) -> Optional[Dict[str, Any]]:
+        history = self.repos.get(full_name)
+        if history is None:
+            return None
+        cutoff = dt.datetime.fromisoformat(since.replace("Z", "+00:00"))
+        matching = [c for c in history if c.committed_at >= cutoff]
+        start = int(after) if after else 0
+        page = matching[start : start + first]
+        end = start + len(page)
+        nodes = [
+            {
+                "oid": c.sha,
+                "committedDate": c.committed_at.isoformat().replace("+00:00", "Z"),
+                "message": c.message,
+                "additions": c.additions,
+                "deletions": c.deletions,
+                "changedFiles": len(c.files),
+                "url": f"https://github.com/{full_name}/commit/{c.sha}",
+                "author": {"name": "Bench Author", "user": {"login": "bench"}},
+            }
+            for c in page
+        ]
+        return {
+            "isPrivate": False,
+            "nameWithOwner": full_name,
+            "defaultBranchRef": {
+                "name": "main",
+                "target": {"history": {"pageInfo": {"hasNextPage": end < len(matching), "endCursor": str(end)}, "nodes": nodes}},
+            },
+        }
+
+    def _graphql(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        variables = body.get("variables") or {}
+        rate = {"remaining": max(0, RATE_LIMIT - self.calls["graphql"]), "resetAt": "2099-01-01T00:00:00Z"}
+        if "viewer" in body.get("query", ""):
+            nodes = [{"nameWithOwner": n, "isPrivate": False, "defaultBranchRef": {"name": "main"}} for n in self.repos]
+            return {"data": {"viewer": {"repositories": {"pageInfo": {"hasNextPage": False, "endCursor": None}, "nodes": nodes}}}}
+        if "o0" in variables:
+            data: Dict[str, Any] = {"rateLimit": rate}
+            i = 0
+            while f"o{i}" in variables:
+                full_name = f"{variables[f'o{i}']}/{variables[f'n{i}']}"
+                data[f"r{i}"] = self._history(full_name, variables[f"s{i}"], None, 100)
+                i += 1
+            return {"data": data}
+        full_name = f"{variables['owner']}/{variables['name']}"
+        return {"data": {"repository": self._history(full_name, variables["since"], variables.get("cursor"), 100), "rateLimit": rate}}
+
+    def _commit(self, sha: str) -> Optional[Dict[str, Any]]:
+        c = self.by_sha.get(sha)
+        if c is None:
+            return None
+        rng = random.Random(f"{self.seed}:{sha}:patch")
+        files = [
+            {
+                "filename": path,
+                "status": status,
+                "additions": additions,
+                "deletions": deletions,
+                "changes": additions + deletions,
+                "patch": _patch(rng, additions, deletions),
+            }
+            for path, status, additions, deletions in c.files
+        ]
+        return {
+            "sha": sha,
+            "files": files,
+            "stats": {"additions": c.additions, "deletions": c.deletions, "total": c.additions + c.deletions},
+        }
+
+    def _build_app(self) -> FastAPI:
+        app = FastAPI()
+
+        @app.post("/graphql")
+        async def graphql(request: Request) -> JSONResponse:
+            self.calls["graphql"] += 1
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            return JSONResponse(self._graphql(await request.json()), headers=self._headers("graphql"))
+
+        @app.get("/repos/{owner}/{name}/commits/{sha}")
+        async def commit(owner: str, name: str, sha: str) -> JSONResponse:
+            self.calls["rest"] += 1
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            body = self._commit(sha)
+            if body is None:
+                return JSONResponse({"message": "Not Found"}, status_code=404, headers=self._headers("rest"))
+            return JSONResponse(body, headers=self._headers("rest"))
+
+        return app
@@ -1,17 +1,36 @@
 from __future__ import annotations
 
 import datetime as dt
-from typing import List, Optional
+import json
+from typing import List, Optional, Tuple
+from urllib.parse import parse_qs
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
-from fastapi import Depends, FastAPI, HTTPException, Query
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import Select, func, select
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from sqlalchemy import or_, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from .backfill import backfill_status, notify_backfill, plan_backfill
+from .cache import WithHeaders, cached_json
 from .config import Window, get_settings
-from .db import Commit, Repository, get_session, init_db, SessionLocal, CommitFile
-from .ingest import ingest_all, start_scheduler, ensure_commit_files
-from .schemas import CommitOut, RepoMetrics, RepoOut, SummaryOut, SummaryRepo, CommitFileOut, CommitDetail
+from .db import Commit, Repository, RepoSchedule, get_session, init_db, SessionLocal, CommitFile, as_utc
+from .events import event_stream, get_broadcaster
+from .filequeue import prefetch_commit_files
+from .github import close_client, open_client
+from .httpcache import get_http_cache
+from .ingest import ingest_all, start_ingestion, stop_ingestion, ensure_commit_files
+from .leader import get_election, is_leader, start_leader_election, stop_leader_election
+from .pagination import InvalidCursor, decode_cursor, encode_cursor
+from .patches import load_patches, patch_dedup_report
+from .ratelimit import get_governor
+from .relay import start_event_relay, stop_event_relay
+from .rollups import rebuild_rollups, rollups_missing, window_totals
+from .schemas import CommitOut, RepoMetrics, RepoOut, SummaryOut, SummaryRepo, CommitFileOut, CommitDetail, TimeseriesOut, TimeseriesPoint
+from .telemetry import CONTENT_TYPE, REGISTRY, MetricsMiddleware
+from .timeseries import DEFAULT_SPAN, MAX_BUCKETS, bucket_totals, buckets
+from .webhooks import EVENT_HEADER, SIGNATURE_HEADER, get_push_queue, parse_push, start_push_queue, stop_push_queue, verify_signature
 
 app = FastAPI(title="Habit Tracker — Git Commits")
 
@@ -21,14 +40,39 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # let browser clients follow commit-list pages
+    expose_headers=["X-Next-Cursor", "Link"],
 )
+if get_settings().prometheus_metrics:
+    app.add_middleware(MetricsMiddleware)
 
 
 @app.on_event("startup")
 async def _startup():
     await init_db()
-    # start scheduler
-    start_scheduler(ingest_all, SessionLocal)
+    async with SessionLocal() as session:
+        if await rollups_missing(session):
+            await rebuild_rollups(session)
+    await open_client()
+    if get_settings().github_webhook_secret:
+        start_push_queue(SessionLocal)
+    # writes by the ingesting process (this one or another) invalidate caches and feed /stream
+    await start_event_relay(SessionLocal)
+    # every process serves reads; only the elected leader runs background ingestion, and
+    # none does with INGEST_IN_API=false (a `habits_api.worker` process ingests instead)
+    await start_leader_election(SessionLocal, _start_ingestion, stop_ingestion, ingests=get_settings().ingest_in_api)
+
+
+@app.on_event("shutdown")
+async def _shutdown():
+    await stop_leader_election(stop_ingestion)
+    await stop_event_relay()
+    await stop_push_queue()
+    await close_client()
+
+
+async def _start_ingestion() -> None:
+    await start_ingestion(SessionLocal)
 
 
 @app.get("/health")
@@ -53,38 +97,175 @@ async def list_repos(session: AsyncSession = Depends(get_session)):
 
 
 @app.post("/admin/ingest")
-async def trigger_ingest(session: AsyncSession = Depends(get_session)) -> dict:
-    count = await ingest_all(session)
-    return {"ingested_new": count}
+async def trigger_ingest() -> dict:
+    """Run one ingestion tick here; only in the process that ingests (the leader, with INGEST_IN_API on)."""
+    if not is_leader():
+        # a second ingest beside the leader or worker would duplicate its API calls
+        raise HTTPException(status_code=409, detail="Ingestion runs in another process")
+    stats = await ingest_all(SessionLocal)
+    return {
+        "ingested_new": stats.new_commits,
+        "repos_total": stats.repos_total,
+        "repos_done": stats.repos_done,
+        "repos_failed": stats.repos_failed,
+        "wall_time_s": stats.wall_time_s,
+    }
+
+
+@app.post("/admin/backfill/{repo_id}", status_code=202)
+async def start_backfill(
+    repo_id: int,
+    since: dt.datetime = Query(..., description="Oldest commit time to import"),
+    until: Optional[dt.datetime] = Query(None, description="Defaults to now"),
+    slice_days: Optional[int] = Query(None, ge=1, le=3650),
+    session: AsyncSession = Depends(get_session),
+) -> dict:
+    """Plan a historical import for one repo; the ingestion leader works through it in the background."""
+    repo = await session.get(Repository, repo_id)
+    if repo is None:
+        raise HTTPException(status_code=404, detail="Repository not found")
+    since, until = as_utc(since), as_utc(until)
+    if until is not None and until <= since:
+        raise HTTPException(status_code=400, detail="until must be after since")
+    planned = await plan_backfill(session, repo, since, until, slice_days)
+    notify_backfill()
+    return {"planned": planned, **await backfill_status(session, repo_id)}
+
+
+@app.get("/admin/backfill/{repo_id}")
+async def get_backfill(repo_id: int, session: AsyncSession = Depends(get_session)) -> dict:
+    """Progress of a repo's backfill: slices by status and commits imported so far."""
+    return await backfill_status(session, repo_id)
+
+
+@app.get("/stream")
+async def stream(request: Request) -> StreamingResponse:
+    """Server-Sent Events: an `ingest` event per repo whenever ingestion stores new commits.
+
+    Each event carries the newest commits, the repo's commit counts per window and its
+    `last_checked_at`. A `resync` event means the client fell behind and should refetch.
+    """
+    return StreamingResponse(
+        event_stream(get_broadcaster(), request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/webhooks/github", status_code=202)
+async def github_webhook(request: Request) -> dict:
+    """Receive GitHub webhooks; pushes to a default branch queue that repo for ingestion."""
+    secret = get_settings().github_webhook_secret
+    if not secret:
+        raise HTTPException(status_code=503, detail="Webhooks are not configured")
+    body = await request.body()
+    if not verify_signature(secret, body, request.headers.get(SIGNATURE_HEADER)):
+        raise HTTPException(status_code=401, detail="Invalid signature")
+    event = request.headers.get(EVENT_HEADER, "")
+    if event == "ping":
+        return {"status": "pong"}
+    if event != "push":
+        return {"status": "ignored", "event": event}
+    if request.headers.get("content-type", "").startswith("application/x-www-form-urlencoded"):
+        raw = parse_qs(body.decode("utf-8")).get("payload", ["{}"])[0]
+    else:
+        raw = body
+    try:
+        payload = json.loads(raw)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Malformed payload")
+    if not isinstance(payload, dict):
+        raise HTTPException(status_code=400, detail="Payload must be a JSON object")
+    try:
+        push = parse_push(payload)
+    except (AttributeError, TypeError, KeyError):
+        # well-formed JSON whose fields have the wrong shapes
+        raise HTTPException(status_code=400, detail="Malformed payload")
+    queue = get_push_queue()
+    if push is None or queue is None:
+        return {"status": "ignored", "event": event}
+    queued = queue.add(push)
+    return {"status": "queued" if queued else "merged", "repo": push.full_name, "commits": len(push.commits)}
+
+
+@app.get("/admin/leader")
+async def leader_status() -> dict:
+    """Which process holds the ingestion lease, and whether it is this one."""
+    settings = get_settings()
+    election = get_election()
+    base = {"mode": settings.leader_election, "ingest_in_api": settings.ingest_in_api}
+    if election is None:
+        return {**base, "is_leader": is_leader()}
+    return {**base, **await election.status()}
+
+
+@app.get("/admin/schedule")
+async def poll_schedule(session: AsyncSession = Depends(get_session)) -> list:
+    """Per-repo adaptive polling state, soonest due first."""
+    res = await session.execute(
+        select(Repository.full_name, RepoSchedule)
+        .join(RepoSchedule, RepoSchedule.repo_id == Repository.id)
+        .order_by(RepoSchedule.next_due_at)
+    )
+    return [
+        {
+            "repo": full_name,
+            "next_due_at": s.next_due_at,
+            "interval_seconds": s.interval_seconds,
+            "last_commit_at": s.last_commit_at,
+            "failures": s.failures,
+        }
+        for full_name, s in res.all()
+    ]
+
+
+@app.get("/admin/ratelimit")
+async def rate_limit_status() -> dict:
+    """Current GitHub GraphQL/REST budgets as tracked by the rate governor."""
+    return get_governor().snapshot()
+
+
+@app.get("/admin/http-cache")
+async def http_cache_status() -> dict:
+    """Hit/miss counters and size of the GitHub REST conditional-request cache."""
+    cache = get_http_cache()
+    return cache.stats() if cache else {"enabled": False}
+
+
+@app.get("/admin/patch-stats")
+async def patch_stats(session: AsyncSession = Depends(get_session)) -> dict:
+    """How many file patches share each stored blob (content-addressed dedup)."""
+    return await patch_dedup_report(session)
+
+
+@app.get("/metrics/prometheus", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    if not get_settings().prometheus_metrics:
+        raise HTTPException(404, detail="metrics disabled")
+    return PlainTextResponse(REGISTRY.render(), media_type=CONTENT_TYPE)
 
 
 @app.get("/metrics/summary", response_model=SummaryOut)
-async def summary(window: str = Query("24h"), session: AsyncSession = Depends(get_session)):
+async def summary(request: Request, window: str = Query("24h"), session: AsyncSession = Depends(get_session)):
     w = Window.from_str(window)
+    return await cached_json(request, ("summary", w.value), lambda: _summary(session, w))
+
+
+async def _summary(session: AsyncSession, w: Window) -> SummaryOut:
     since = dt.datetime.now(dt.timezone.utc) - dt.timedelta(seconds=w.seconds)
 
     # per-repo counts
-    subq = (
-        select(
-            Commit.repo_id.label("repo_id"),
-            func.count(Commit.id).label("count"),
-            func.coalesce(func.sum(Commit.additions + Commit.deletions), 0).label("lines"),
-        )
-        .where(Commit.committed_at >= since)
-        .group_by(Commit.repo_id)
-        .subquery()
-    )
-
-    res = await session.execute(select(Repository, subq.c.count, subq.c.lines).join(subq, Repository.id == subq.c.repo_id, isouter=True))
-    rows = res.all()
+    totals = await window_totals(session, since)
+    res = await session.execute(select(Repository))
+    repos = res.scalars().all()
     per_repo = []
     total_commits = 0
     total_lines = 0
     repos_updated = 0
     last_checked = None
-    for repo, count, lines in rows:
-        c = int(count or 0)
-        l = int(lines or 0)
+    for repo in repos:
+        c, adds, dels = totals.get(repo.id, (0, 0, 0))
+        l = adds + dels
         total_commits += c
         total_lines += l
         if c > 0:
@@ -103,40 +284,146 @@ async def summary(window: str = Query("24h"), session: AsyncSession = Depends(ge
     )
 
 
+@app.get("/metrics/timeseries", response_model=TimeseriesOut)
+async def timeseries(
+    request: Request,
+    bucket: str = Query("day", pattern="^(hour|day|week)$"),
+    since: Optional[dt.datetime] = Query(None, description="ISO 8601; defaults to 48h, 30d or 26w back"),
+    until: Optional[dt.datetime] = Query(None, description="ISO 8601; defaults to now"),
+    tz: str = Query("UTC", description="IANA zone for bucket boundaries, e.g. Europe/Berlin"),
+    repo_id: Optional[int] = Query(None, description="one repo; all repos when omitted"),
+    session: AsyncSession = Depends(get_session),
+):
+    """Commits, additions and deletions per hour, day or week (weeks start on Monday), with
+    zero-filled buckets aligned to local midnight / hour boundaries in `tz`."""
+    try:
+        zone = ZoneInfo(tz)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise HTTPException(400, detail=f"unknown time zone {tz!r}")
+    key = ("timeseries", bucket, since, until, tz, repo_id)
+    return await cached_json(request, key, lambda: _timeseries(session, bucket, as_utc(since), as_utc(until), zone, repo_id))
+
+
+async def _timeseries(
+    session: AsyncSession,
+    bucket: str,
+    since: Optional[dt.datetime],
+    until: Optional[dt.datetime],
+    zone: ZoneInfo,
+    repo_id: Optional[int],
+) -> TimeseriesOut:
+    until = until or dt.datetime.now(dt.timezone.utc)
+    since = since or until - DEFAULT_SPAN[bucket]
+    if since >= until:
+        raise HTTPException(400, detail="since must be before until")
+    if repo_id is not None and await session.get(Repository, repo_id) is None:
+        raise HTTPException(404, detail="repo not found")
+    spans = buckets(bucket, since, until, zone)
+    if len(spans) > MAX_BUCKETS:
+        raise HTTPException(400, detail=f"range spans more than {MAX_BUCKETS} {bucket} buckets")
+
+    totals = await bucket_totals(session, bucket, spans[0].start.astimezone(dt.timezone.utc), spans[-1].end_utc, zone, repo_id)
+    points = []
+    for b in spans:
+        commits, adds, dels = totals.get(b.key, (0, 0, 0))
+        points.append(TimeseriesPoint(start=b.start, commits=commits, additions=adds, deletions=dels))
+    return TimeseriesOut(
+        bucket=bucket,
+        tz=zone.key,
+        repo_id=repo_id,
+        since=spans[0].start,
+        until=spans[-1].end_utc.astimezone(zone),
+        points=points,
+    )
+
+
 @app.get("/repos/{repo_id}/metrics", response_model=RepoMetrics)
-async def repo_metrics(repo_id: int, window: str = Query("24h"), session: AsyncSession = Depends(get_session)):
+async def repo_metrics(request: Request, repo_id: int, window: str = Query("24h"), session: AsyncSession = Depends(get_session)):
     w = Window.from_str(window)
+    return await cached_json(request, ("repo_metrics", repo_id, w.value), lambda: _repo_metrics(session, repo_id, w))
+
+
+async def _repo_metrics(session: AsyncSession, repo_id: int, w: Window) -> RepoMetrics:
     since = dt.datetime.now(dt.timezone.utc) - dt.timedelta(seconds=w.seconds)
 
     repo = (await session.get(Repository, repo_id))
     if not repo:
         raise HTTPException(404, detail="repo not found")
 
-    res = await session.execute(
-        select(
-            func.count(Commit.id), func.coalesce(func.sum(Commit.additions), 0), func.coalesce(func.sum(Commit.deletions), 0)
-        ).where(Commit.repo_id == repo_id, Commit.committed_at >= since)
-    )
-    commits, adds, dels = res.one()
+    commits, adds, dels = (await window_totals(session, since, repo_id=repo_id)).get(repo_id, (0, 0, 0))
     return RepoMetrics(window=w.value, repo_id=repo.id, full_name=repo.full_name, commits_count=int(commits or 0), lines_added=int(adds or 0), lines_deleted=int(dels or 0))
 
 
 @app.get("/repos/{repo_id}/commits", response_model=List[CommitOut])
-async def repo_commits(repo_id: int, window: str = Query("24h"), limit: int = Query(100, ge=1, le=1000), session: AsyncSession = Depends(get_session)):
+async def repo_commits(
+    request: Request,
+    repo_id: int,
+    window: str = Query("24h"),
+    since: Optional[dt.datetime] = Query(None, description="ISO 8601; overrides `window`"),
+    until: Optional[dt.datetime] = Query(None, description="ISO 8601, exclusive"),
+    cursor: Optional[str] = Query(None, description="`X-Next-Cursor` of the previous page"),
+    limit: int = Query(100, ge=1, le=1000),
+    session: AsyncSession = Depends(get_session),
+):
+    """Commits newest first. Pages are keyset-paginated: when more remain, the response carries
+    `X-Next-Cursor` and a `Link: <...>; rel="next"` URL for the following page."""
     w = Window.from_str(window)
-    since = dt.datetime.now(dt.timezone.utc) - dt.timedelta(seconds=w.seconds)
+    since, until = as_utc(since), as_utc(until)
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except InvalidCursor as e:
+        raise HTTPException(400, detail=str(e))
+    key = ("repo_commits", repo_id, w.value, since, until, cursor, limit)
+    return await cached_json(request, key, lambda: _repo_commits(request, session, repo_id, w, since, until, after, limit))
+
+
+async def _repo_commits(
+    request: Request,
+    session: AsyncSession,
+    repo_id: int,
+    w: Window,
+    since: Optional[dt.datetime],
+    until: Optional[dt.datetime],
+    after: Optional[Tuple[dt.datetime, int]],
+    limit: int,
+) -> WithHeaders:
+    if since is None:
+        since = dt.datetime.now(dt.timezone.utc) - dt.timedelta(seconds=w.seconds)
     repo = (await session.get(Repository, repo_id))
     if not repo:
         raise HTTPException(404, detail="repo not found")
 
-    res = await session.execute(
-        select(Commit)
-        .where(Commit.repo_id == repo_id, Commit.committed_at >= since)
-        .order_by(Commit.committed_at.desc())
-        .limit(limit)
-    )
-    commits = res.scalars().all()
-    return [
+    # Only the columns CommitOut needs; ix_commits_repo_committed_id serves both the range and
+    # the order, and the cursor turns page N into a seek, so deep pages cost the same as the first.
+    stmt = select(
+        Commit.id,
+        Commit.sha,
+        Commit.author_name,
+        Commit.author_login,
+        Commit.committed_at,
+        Commit.message,
+        Commit.additions,
+        Commit.deletions,
+        Commit.changed_files,
+        Commit.url,
+    ).where(Commit.repo_id == repo_id, Commit.committed_at >= since)
+    if until is not None:
+        stmt = stmt.where(Commit.committed_at < until)
+    if after is not None:
+        at, last_id = after
+        stmt = stmt.where(Commit.committed_at <= at, or_(Commit.committed_at < at, Commit.id < last_id))
+    res = await session.execute(stmt.order_by(Commit.committed_at.desc(), Commit.id.desc()).limit(limit + 1))
+    rows = res.all()
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].committed_at, rows[-1].id)
+        headers["X-Next-Cursor"] = next_cursor
+        headers["Link"] = f'<{request.url.include_query_params(cursor=next_cursor)}>; rel="next"'
+    if after is None:
+        # warm the file details of the newest commits, so opening one is served locally
+        await prefetch_commit_files(session, repo, rows)
+    items = [
         CommitOut(
             sha=c.sha,
             author_name=c.author_name,
@@ -148,8 +435,9 @@ async def repo_commits(repo_id: int, window: str = Query("24h"), limit: int = Qu
             changed_files=c.changed_files,
             url=c.url,
         )
-        for c in commits
+        for c in rows
     ]
+    return WithHeaders(items, headers)
 
 
 @app.get("/repos/{repo_id}/commit/{sha}", response_model=CommitDetail)
@@ -170,13 +458,15 @@ async def commit_detail(repo_id: int, sha: str, include_patch: bool = Query(True
     files = resf.scalars().all()
 
     allow_patch = (not repo.is_private) or settings.allow_private_code
+    # Patch bodies are only read (and decompressed) when they are going to be returned
+    patches = await load_patches(session, files) if (allow_patch and include_patch) else {}
     out_files = [
         CommitFileOut(
             path=f.path,
             status=f.status,
             additions=f.additions,
             deletions=f.deletions,
-            patch=(f.patch if (allow_patch and include_patch) else None),
+            patch=patches.get(f.id),
         )
         for f in files
     ]
@@ -0,0 +1,328 @@
+"""Historical backfill: import a repo's older history in time slices, in parallel, resumably.
+
+Regular ingestion only walks forward from `last_checked_at` (24h for a new repo). A backfill
+plans `backfill_slices` rows covering [since, until) and a pool of workers fetches them
+newest first. After every history page the slice's GraphQL cursor is checkpointed with the
+page's commits in one short transaction, so a crash or restart resumes mid-slice. Backfill
+never touches `last_checked_at` or the poll schedule, so incremental ingestion carries on
+unaffected; it also stops short of the GraphQL budget's last BACKFILL_GRAPHQL_RESERVE points,
+leaving those to the regular polls. Commit files are not queued; they load on demand.
+"""
+from __future__ import annotations
+
+import asyncio
+import datetime as dt
+import logging
+from typing import Dict, List, Optional
+
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from .cache import bump_generation
+from .config import get_settings
+from .db import BackfillSlice, Repository, as_utc, dialect_insert
+from .ratelimit import GRAPHQL, get_governor
+from .relay import record_event
+from .sources import GITHUB, iter_commit_pages, source_for
+from .writes import insert_commits
+
+log = logging.getLogger(__name__)
+
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+# A running slice's worker refreshes updated_at this many times per BACKFILL_STALE_SECONDS.
+HEARTBEATS_PER_STALE = 4
+# Retry delay grows 1m, 2m, 4m, ... capped at an hour; then the slice is marked failed.
+RETRY_BASE_SECONDS = 60
+RETRY_MAX_SECONDS = 3600
+MAX_ATTEMPTS = 5
+
+
+def _now() -> dt.datetime:
+    return dt.datetime.now(dt.timezone.utc)
+
+
+def plan_slices(since: dt.datetime, until: dt.datetime, slice_days: int) -> List[tuple[dt.datetime, dt.datetime]]:
+    """Split [since, until) into `slice_days`-long ranges cut forward from `since`, oldest first."""
+    step = dt.timedelta(days=max(1, slice_days))
+    out = []
+    start = since
+    while start < until:
+        end = min(until, start + step)
+        out.append((start, end))
+        start = end
+    return out
+
+
+def _gaps(since: dt.datetime, until: dt.datetime, covered: List[tuple[dt.datetime, dt.datetime]]) -> List[tuple[dt.datetime, dt.datetime]]:
+    """The parts of [since, until) outside every range in `covered`."""
+    out = []
+    start = since
+    for lo, hi in sorted(covered):
+        if hi <= start:
+            continue
+        if lo >= until:
+            break
+        if lo > start:
+            out.append((start, lo))
+        start = max(start, hi)
+    if start < until:
+        out.append((start, until))
+    return out
+
+
+async def plan_backfill(
+    session: AsyncSession,
+    repo: Repository,
+    since: dt.datetime,
+    until: Optional[dt.datetime] = None,
+    slice_days: Optional[int] = None,
+) -> int:
+    """Record slices covering [since, until) for `repo`; returns how many are new.
+
+    Only the parts of the range no earlier slice covers are planned, so re-running a command
+    (or widening its range) never fetches a period twice. `until` defaults to the end of the
+    repo's existing plan, or to now for a first plan; commits newer than that arrive through
+    regular polling anyway.
+    """
+    res = await session.execute(select(BackfillSlice.since, BackfillSlice.until).where(BackfillSlice.repo_id == repo.id))
+    covered = [(as_utc(lo), as_utc(hi)) for lo, hi in res.all()]
+    if until is None:
+        until = max((hi for _, hi in covered), default=None) or _now()
+    size = slice_days or get_settings().backfill_slice_days
+    slices = [sl for lo, hi in _gaps(as_utc(since), as_utc(until), covered) for sl in plan_slices(lo, hi, size)]
+    if not slices:
+        await session.rollback()
+        return 0
+    now = _now()
+    rows = [
+        {"repo_id": repo.id, "since": s, "until": u, "status": PENDING, "commits": 0, "attempts": 0, "next_attempt_at": now, "updated_at": now}
+        for s, u in slices
+    ]
+    # DO NOTHING covers a concurrent planner inserting the same slices
+    stmt = dialect_insert(session, BackfillSlice).values(rows).on_conflict_do_nothing(index_elements=["repo_id", "since", "until"])
+    res = await session.execute(stmt)
+    await session.commit()
+    return max(res.rowcount or 0, 0)
+
+
+async def backfill_status(session: AsyncSession, repo_id: int) -> Dict[str, object]:
+    """Slice counts by status, commits imported so far and the covered range."""
+    res = await session.execute(
+        select(BackfillSlice.status, func.count(), func.sum(BackfillSlice.commits), func.min(BackfillSlice.since), func.max(BackfillSlice.until))
+        .where(BackfillSlice.repo_id == repo_id)
+        .group_by(BackfillSlice.status)
+    )
+    slices = {PENDING: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+    commits = 0
+    since: Optional[dt.datetime] = None
+    until: Optional[dt.datetime] = None
+    for status, n, c, lo, hi in res.all():
+        slices[status] = n
+        commits += int(c or 0)
+        since = lo if since is None or lo < since else since
+        until = hi if until is None or hi > until else until
+    return {"repo_id": repo_id, "slices": slices, "commits": commits, "since": since, "until": until}
+
+
+class BackfillRunner:
+    """Works through pending `backfill_slices` with a pool of async workers.
+
+    Slices are claimed with a conditional UPDATE, so several processes (or a restarted one)
+    never work the same slice twice. While a slice is worked its `updated_at` is refreshed
+    by a heartbeat, through slow pages and budget pauses alike; a claim left without one for
+    BACKFILL_STALE_SECONDS belonged to a worker that died and is taken over.
+    """
+
+    def __init__(self, session_factory: async_sessionmaker, concurrency: Optional[int] = None) -> None:
+        settings = get_settings()
+        self.session_factory = session_factory
+        self.concurrency = max(1, concurrency or settings.backfill_concurrency)
+        self.graphql_reserve = settings.backfill_graphql_reserve
+        self.stale_seconds = settings.backfill_stale_seconds
+        self.poll_seconds = settings.backfill_poll_seconds
+        self._wake = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    def notify(self) -> None:
+        """Wake idle workers early (e.g. right after a backfill was planned)."""
+        self._wake.set()
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def stop(self) -> None:
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def drain(self, repo_id: Optional[int] = None) -> int:
+        """Process every due slice inline and return how many were handled (CLI/tests)."""
+        handled = 0
+
+        async def _run() -> None:
+            nonlocal handled
+            while (slice_id := await self._claim(repo_id)) is not None:
+                await self.process(slice_id)
+                handled += 1
+
+        await asyncio.gather(*(_run() for _ in range(self.concurrency)))
+        return handled
+
+    async def _worker(self) -> None:
+        while True:
+            self._wake.clear()
+            try:
+                slice_id = await self._claim()
+                if slice_id is not None:
+                    await self.process(slice_id)
+                    continue
+            except Exception as e:
+                log.exception("Backfill worker failed: %s", e)
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _claim(self, repo_id: Optional[int] = None) -> Optional[int]:
+        """Mark the newest due slice as running and return its id, or None when there is none."""
+        async with self.session_factory() as session:
+            while True:
+                now = _now()
+                due = or_(
+                    and_(BackfillSlice.status == PENDING, BackfillSlice.next_attempt_at <= now),
+                    and_(BackfillSlice.status == RUNNING, BackfillSlice.updated_at < now - dt.timedelta(seconds=self.stale_seconds)),
+                )
+                stmt = select(BackfillSlice.id, BackfillSlice.status, BackfillSlice.updated_at).where(due)
+                if repo_id is not None:
+                    stmt = stmt.where(BackfillSlice.repo_id == repo_id)
+                row = (await session.execute(stmt.order_by(BackfillSlice.until.desc()).limit(1))).one_or_none()
+                if row is None:
+                    await session.rollback()
+                    return None
+                # only wins if nobody claimed it between the select and this update
+                res = await session.execute(
+                    update(BackfillSlice)
+                    .where(BackfillSlice.id == row.id, BackfillSlice.status == row.status, BackfillSlice.updated_at == row.updated_at)
+                    .values(status=RUNNING, updated_at=now)
+                )
+                await session.commit()
+                if res.rowcount == 1:
+                    return row.id
+
+    async def _wait_for_budget(self) -> None:
+        """Hold off while the GraphQL quota is down to the share kept for incremental ingest."""
+        budget = get_governor().budgets[GRAPHQL]
+        while budget.remaining is not None and budget.remaining <= self.graphql_reserve and budget.reset_at and budget.reset_at > _now():
+            delay = (budget.reset_at - _now()).total_seconds()
+            log.info("Backfill paused for %.0fs: %s GraphQL points left", delay, budget.remaining)
+            await asyncio.sleep(max(delay, 0.0) + 1)
+
+    async def _heartbeat(self, slice_id: int) -> None:
+        """Keep the claim on `slice_id` fresh until cancelled."""
+        while True:
+            await asyncio.sleep(self.stale_seconds / HEARTBEATS_PER_STALE)
+            try:
+                async with self.session_factory() as session:
+                    await session.execute(
+                        update(BackfillSlice).where(BackfillSlice.id == slice_id, BackfillSlice.status == RUNNING).values(updated_at=_now())
+                    )
+                    await session.commit()
+            except Exception as e:
+                log.warning("Backfill heartbeat failed: %s", e)
+
+    async def process(self, slice_id: int) -> None:
+        heartbeat = asyncio.create_task(self._heartbeat(slice_id))
+        try:
+            await self._process(slice_id)
+        finally:
+            heartbeat.cancel()
+            await asyncio.gather(heartbeat, return_exceptions=True)
+
+    async def _process(self, slice_id: int) -> None:
+        async with self.session_factory() as session:
+            res = await session.execute(
+                select(BackfillSlice, Repository.full_name, Repository.source)
+                .join(Repository, Repository.id == BackfillSlice.repo_id)
+                .where(BackfillSlice.id == slice_id)
+            )
+            row = res.one_or_none()
+        if row is None:
+            return  # repo was deleted; its slices went with it
+        s, full_name, source = row
+        since, until = as_utc(s.since), as_utc(s.until)
+        label = f"{full_name} {since:%Y-%m-%d}..{until:%Y-%m-%d}"
+        added = 0
+        try:
+            source = source_for(source)
+            if source == GITHUB:
+                await self._wait_for_budget()
+            # the network wait happens between pages, with no transaction open
+            async for page in iter_commit_pages(full_name, since, after=s.cursor, source=source, until=until):
+                async with self.session_factory() as session:
+                    new_ids = await insert_commits(session, s.repo_id, page.get("commits", []))
+                    added += len(new_ids)
+                    await session.execute(
+                        update(BackfillSlice)
+                        .where(BackfillSlice.id == slice_id)
+                        .values(cursor=page.get("end_cursor"), commits=BackfillSlice.commits + len(new_ids), updated_at=_now())
+                    )
+                    await session.commit()
+                if source == GITHUB and page.get("has_next_page"):
+                    await self._wait_for_budget()
+        except Exception as e:
+            await self._record_failure(slice_id, label, e)
+        else:
+            async with self.session_factory() as session:
+                await session.execute(
+                    update(BackfillSlice).where(BackfillSlice.id == slice_id).values(status=DONE, last_error=None, updated_at=_now())
+                )
+                await session.commit()
+            log.info("Backfilled %s: %s new commits", label, added)
+        finally:
+            if added:
+                bump_generation()
+                async with self.session_factory() as session:
+                    await record_event(session)
+
+    async def _record_failure(self, slice_id: int, label: str, error: Exception) -> None:
+        async with self.session_factory() as session:
+            s = await session.get(BackfillSlice, slice_id)
+            if s is None:
+                return
+            s.attempts += 1
+            s.last_error = str(error)
+            s.updated_at = _now()
+            if s.attempts >= MAX_ATTEMPTS:
+                log.error("Giving up on backfill of %s after %s attempts: %s", label, s.attempts, error)
+                s.status = FAILED
+            else:
+                delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (s.attempts - 1))
+                s.status = PENDING
+                s.next_attempt_at = _now() + dt.timedelta(seconds=delay)
+                log.warning("Backfill of %s failed (attempt %s): %s", label, s.attempts, error)
+            await session.commit()
+
+
+# The running app's backfill workers, if any; they resume unfinished slices on start.
+_runner: Optional[BackfillRunner] = None
+
+
+def start_backfill_runner(session_factory: async_sessionmaker) -> BackfillRunner:
+    global _runner
+    _runner = BackfillRunner(session_factory)
+    _runner.start()
+    return _runner
+
+
+async def stop_backfill_runner() -> None:
+    global _runner
+    if _runner is not None:
+        await _runner.stop()
+        _runner = None
+
+
+def notify_backfill() -> None:
+    if _runner is not None:
+        _runner.notify()
@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+import pydantic_core
+from fastapi import Request, Response
+
+from .config import get_settings
+
+
+@dataclass
+class CachedBody:
+    generation: int
+    stored_at: float
+    body: bytes
+    etag: str
+    headers: Dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class WithHeaders:
+    """A value for `cached_json` plus response headers cached along with it (e.g. pagination links)."""
+
+    value: Any
+    headers: Dict[str, str]
+
+
+class ResponseCache:
+    """In-process cache of serialized read-endpoint responses.
+
+    Entries are tagged with the data generation; ingestion bumps the generation after writing,
+    which invalidates everything at once. A short TTL bounds staleness of sliding time windows
+    (commits age out of "last 24h" without any write).
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.generation = 0
+        self._entries: "OrderedDict[Hashable, CachedBody]" = OrderedDict()
+
+    def bump(self) -> int:
+        self.generation += 1
+        self._entries.clear()
+        return self.generation
+
+    def get(self, key: Hashable) -> Optional[CachedBody]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.generation != self.generation or time.monotonic() - entry.stored_at > self.ttl_seconds:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: Hashable, body: bytes, headers: Optional[Dict[str, str]] = None, generation: Optional[int] = None) -> CachedBody:
+        """Store `body` as built from data of `generation` (default: the current one).
+
+        A body built before a bump is returned but not stored: it may predate the write.
+        """
+        generation = self.generation if generation is None else generation
+        entry = CachedBody(generation, time.monotonic(), body, etag_for(body), headers or {})
+        if self.ttl_seconds > 0 and generation == self.generation:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+
+def etag_for(body: bytes) -> str:
+    # Strong validator: derived from the exact bytes sent.
+    return '"%s"' % hashlib.sha256(body).hexdigest()[:32]
+
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    candidates = [c.strip() for c in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> ResponseCache:
+    global _cache
+    if _cache is None:
+        settings = get_settings()
+        _cache = ResponseCache(settings.response_cache_ttl_seconds, settings.response_cache_max_entries)
+    return _cache
+
+
+def bump_generation() -> None:
+    """Invalidate cached read responses; called after ingestion writes."""
+    get_response_cache().bump()
+
+
+async def cached_json(request: Request, key: Hashable, build: Callable[[], Awaitable[Any]]) -> Response:
+    """Serve `build()` as JSON through the response cache, with an ETag and If-None-Match/304."""
+    cache = get_response_cache()
+    entry = cache.get(key)
+    if entry is None:
+        # taken before building: a write landing mid-build must not be masked by this result
+        generation = cache.generation
+        built = await build()
+        if isinstance(built, WithHeaders):
+            entry = cache.put(key, pydantic_core.to_json(built.value), built.headers, generation=generation)
+        else:
+            entry = cache.put(key, pydantic_core.to_json(built), generation=generation)
+    headers = {**entry.headers, "ETag": entry.etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
@@ -0,0 +1,140 @@
+"""Maintenance commands: `python -m habits_api.cli <command>` (run from backend/ with PYTHONPATH=src)."""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import datetime as dt
+import json
+import uuid
+
+import httpx
+from sqlalchemy import select, text
+
+from .backfill import BackfillRunner, backfill_status, plan_backfill
+from .config import get_settings
+from .db import Repository, SessionLocal, as_utc, engine, init_db
+from .patches import dedupe_patches, gc_patches, migrate_patches, patch_dedup_report
+from .rollups import rebuild_rollups
+from .sources import SOURCES
+from .webhooks import DELIVERY_HEADER, EVENT_HEADER, SIGNATURE_HEADER, sign
+
+
+async def _rebuild_rollups(args: argparse.Namespace) -> None:
+    await init_db()
+    async with SessionLocal() as session:
+        rows = await rebuild_rollups(session)
+    print(f"rebuilt {rows} hourly rollup rows")
+
+
+async def _migrate_patches(args: argparse.Namespace) -> None:
+    await init_db()
+    async with SessionLocal() as session:
+        moved = await migrate_patches(session)
+    print(f"moved {moved} inline patches into compressed blobs")
+    if args.vacuum and engine.dialect.name == "sqlite":
+        async with engine.connect() as conn:
+            await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.execute(text("VACUUM"))
+        print("vacuumed database")
+
+
+async def _dedupe_patches(args: argparse.Namespace) -> None:
+    await init_db()
+    async with SessionLocal() as session:
+        merged = await dedupe_patches(session)
+        swept = await gc_patches(session)
+        report = await patch_dedup_report(session)
+    print(f"merged {merged} duplicate blobs, deleted {swept} unreferenced blobs")
+    print(json.dumps(report))
+
+
+async def _set_source(args: argparse.Namespace) -> None:
+    await init_db()
+    async with SessionLocal() as session:
+        repo = (await session.execute(select(Repository).where(Repository.full_name == args.full_name))).scalar_one_or_none()
+        if repo is None:
+            repo = Repository(full_name=args.full_name)
+            session.add(repo)
+        repo.source = None if args.source == "default" else args.source
+        await session.commit()
+    print(f"{args.full_name}: source={args.source}")
+
+
+def _timestamp(value: str) -> dt.datetime:
+    return as_utc(dt.datetime.fromisoformat(value.replace("Z", "+00:00")))
+
+
+async def _backfill(args: argparse.Namespace) -> None:
+    await init_db()
+    async with SessionLocal() as session:
+        repo = (await session.execute(select(Repository).where(Repository.full_name == args.full_name))).scalar_one_or_none()
+        if repo is None:
+            repo = Repository(full_name=args.full_name)
+            session.add(repo)
+            await session.commit()
+        planned = await plan_backfill(session, repo, args.since, args.until, args.slice_days)
+        repo_id = repo.id
+    print(f"{args.full_name}: planned {planned} new slices")
+    handled = await BackfillRunner(SessionLocal, concurrency=args.concurrency).drain(repo_id)
+    async with SessionLocal() as session:
+        print(json.dumps(await backfill_status(session, repo_id), default=str))
+    print(f"processed {handled} slices")
+
+
+async def _replay_webhook(args: argparse.Namespace) -> None:
+    secret = args.secret or get_settings().github_webhook_secret
+    if not secret:
+        raise SystemExit("set GITHUB_WEBHOOK_SECRET or pass --secret")
+    with open(args.payload, "rb") as f:
+        body = f.read()
+    headers = {
+        "Content-Type": "application/json",
+        EVENT_HEADER: args.event,
+        DELIVERY_HEADER: str(uuid.uuid4()),
+        SIGNATURE_HEADER: sign(secret, body),
+    }
+    async with httpx.AsyncClient() as client:
+        resp = await client.post(args.url, content=body, headers=headers)
+    print(resp.status_code, resp.text)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="habits_api.cli")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("rebuild-rollups", help="recompute commit_rollups from the commits table")
+    p.set_defaults(func=_rebuild_rollups)
+
+    p = sub.add_parser("migrate-patches", help="compress legacy inline commit_files.patch text into patch_blobs")
+    p.add_argument("--vacuum", action="store_true", help="VACUUM afterwards to return freed pages (SQLite)")
+    p.set_defaults(func=_migrate_patches)
+
+    p = sub.add_parser("dedupe-patches", help="hash pre-dedup blobs, merge duplicates, delete orphans and print the dedup ratio")
+    p.set_defaults(func=_dedupe_patches)
+
+    p = sub.add_parser("set-source", help="choose the ingestion engine for one repo (GitHub API or local git mirror)")
+    p.add_argument("full_name", help="owner/name")
+    p.add_argument("source", choices=[*SOURCES, "default"], help="'default' follows INGEST_SOURCE")
+    p.set_defaults(func=_set_source)
+
+    p = sub.add_parser("backfill", help="import a repo's history between two dates in parallel time slices (resumable)")
+    p.add_argument("full_name", help="owner/name")
+    p.add_argument("--since", type=_timestamp, required=True, help="ISO date or timestamp (UTC unless given)")
+    p.add_argument("--until", type=_timestamp, help="defaults to now")
+    p.add_argument("--slice-days", type=int, help="defaults to BACKFILL_SLICE_DAYS")
+    p.add_argument("--concurrency", type=int, help="defaults to BACKFILL_CONCURRENCY")
+    p.set_defaults(func=_backfill)
+
+    p = sub.add_parser("replay-webhook", help="sign a recorded GitHub webhook payload and POST it to a running server")
+    p.add_argument("payload", help="path to a JSON payload, e.g. tests/fixtures/github_push.json")
+    p.add_argument("--url", default="http://127.0.0.1:8081/webhooks/github")
+    p.add_argument("--event", default="push", help="X-GitHub-Event header value")
+    p.add_argument("--secret", help="defaults to GITHUB_WEBHOOK_SECRET")
+    p.set_defaults(func=_replay_webhook)
+
+    args = parser.parse_args(argv)
+    asyncio.run(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -13,10 +13,59 @@ class Settings(BaseSettings):
     github_token: Optional[str] = Field(default=None, alias="GITHUB_TOKEN")
     repo_allowlist: str = Field(default="", alias="REPO_ALLOWLIST")
     database_url: str = Field(default="sqlite+aiosqlite:///./data.db", alias="DATABASE_URL")
+    sqlite_wal: bool = Field(default=True, alias="SQLITE_WAL")
     public_view_token: Optional[str] = Field(default=None, alias="PUBLIC_VIEW_TOKEN")
     allow_private_code: bool = Field(default=False, alias="ALLOW_PRIVATE_CODE")
     scheduler_enabled: bool = Field(default=True, alias="SCHEDULER_ENABLED")
     scheduler_interval_minutes: int = Field(default=15, alias="SCHEDULER_INTERVAL_MINUTES")
+    ingest_in_api: bool = Field(default=True, alias="INGEST_IN_API")
+    event_relay: bool = Field(default=True, alias="EVENT_RELAY")
+    event_relay_poll_seconds: float = Field(default=1.0, alias="EVENT_RELAY_POLL_SECONDS")
+    worker_metrics_port: int = Field(default=0, alias="WORKER_METRICS_PORT")
+    leader_election: str = Field(default="db", alias="LEADER_ELECTION")
+    leader_lease_ttl_seconds: float = Field(default=30.0, alias="LEADER_LEASE_TTL_SECONDS")
+    leader_lock_file: str = Field(default="./habits-leader.lock", alias="LEADER_LOCK_FILE")
+    scheduler_mode: str = Field(default="adaptive", alias="SCHEDULER_MODE")
+    scheduler_min_interval_minutes: int = Field(default=5, alias="SCHEDULER_MIN_INTERVAL_MINUTES")
+    scheduler_max_interval_minutes: int = Field(default=1440, alias="SCHEDULER_MAX_INTERVAL_MINUTES")
+    scheduler_backoff_factor: float = Field(default=2.0, alias="SCHEDULER_BACKOFF_FACTOR")
+    scheduler_polls_per_hour: int = Field(default=600, alias="SCHEDULER_POLLS_PER_HOUR")
+    prometheus_metrics: bool = Field(default=True, alias="PROMETHEUS_METRICS")
+    response_cache_ttl_seconds: float = Field(default=60.0, alias="RESPONSE_CACHE_TTL_SECONDS")
+    response_cache_max_entries: int = Field(default=512, alias="RESPONSE_CACHE_MAX_ENTRIES")
+    stream_queue_size: int = Field(default=100, alias="STREAM_QUEUE_SIZE")
+    stream_keepalive_seconds: float = Field(default=15.0, alias="STREAM_KEEPALIVE_SECONDS")
+    ingest_concurrency: int = Field(default=4, alias="INGEST_CONCURRENCY")
+    file_fetch_concurrency: int = Field(default=4, alias="FILE_FETCH_CONCURRENCY")
+    file_fetch_max_attempts: int = Field(default=5, alias="FILE_FETCH_MAX_ATTEMPTS")
+    file_fetch_poll_seconds: float = Field(default=30.0, alias="FILE_FETCH_POLL_SECONDS")
+    commit_files_prefetch: int = Field(default=5, alias="COMMIT_FILES_PREFETCH")
+    backfill_concurrency: int = Field(default=2, alias="BACKFILL_CONCURRENCY")
+    backfill_slice_days: int = Field(default=30, alias="BACKFILL_SLICE_DAYS")
+    backfill_graphql_reserve: int = Field(default=1000, alias="BACKFILL_GRAPHQL_RESERVE")
+    backfill_stale_seconds: float = Field(default=120.0, alias="BACKFILL_STALE_SECONDS")
+    backfill_poll_seconds: float = Field(default=30.0, alias="BACKFILL_POLL_SECONDS")
+    github_timeout_seconds: float = Field(default=30.0, alias="GITHUB_TIMEOUT_SECONDS")
+    github_max_connections: int = Field(default=20, alias="GITHUB_MAX_CONNECTIONS")
+    github_max_keepalive: int = Field(default=10, alias="GITHUB_MAX_KEEPALIVE")
+    github_http2: bool = Field(default=False, alias="GITHUB_HTTP2")
+    github_max_retries: int = Field(default=3, alias="GITHUB_MAX_RETRIES")
+    github_retry_backoff_seconds: float = Field(default=0.5, alias="GITHUB_RETRY_BACKOFF_SECONDS")
+    github_graphql_rate_per_second: float = Field(default=5.0, alias="GITHUB_GRAPHQL_RATE_PER_SECOND")
+    github_rest_rate_per_second: float = Field(default=10.0, alias="GITHUB_REST_RATE_PER_SECOND")
+    github_rate_burst: int = Field(default=20, alias="GITHUB_RATE_BURST")
+    github_rate_reserve: int = Field(default=50, alias="GITHUB_RATE_RESERVE")
+    http_cache_path: str = Field(default="./http_cache.db", alias="HTTP_CACHE_PATH")
+    http_cache_max_mb: int = Field(default=256, alias="HTTP_CACHE_MAX_MB")
+    github_graphql_batch_size: int = Field(default=25, alias="GITHUB_GRAPHQL_BATCH_SIZE")
+    github_webhook_secret: Optional[str] = Field(default=None, alias="GITHUB_WEBHOOK_SECRET")
+    webhook_debounce_seconds: float = Field(default=5.0, alias="WEBHOOK_DEBOUNCE_SECONDS")
+    webhook_poll_interval_minutes: int = Field(default=360, alias="WEBHOOK_POLL_INTERVAL_MINUTES")
+    ingest_source: str = Field(default="github", alias="INGEST_SOURCE")
+    git_mirror_dir: str = Field(default="./mirrors", alias="GIT_MIRROR_DIR")
+    git_remote_url: str = Field(default="https://github.com/{full_name}.git", alias="GIT_REMOTE_URL")
+    git_binary: str = Field(default="git", alias="GIT_BINARY")
+    git_timeout_seconds: float = Field(default=600.0, alias="GIT_TIMEOUT_SECONDS")
 
     @property
     def repo_list(self) -> List[str]:
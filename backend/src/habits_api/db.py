@@ -1,13 +1,14 @@
 from __future__ import annotations
 
 import datetime as dt
-from typing import AsyncIterator
+from typing import AsyncIterator, Optional
 
-from sqlalchemy import BigInteger, Boolean, DateTime, ForeignKey, Integer, String, Text, UniqueConstraint
-from sqlalchemy.ext.asyncio import AsyncAttrs, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy import BigInteger, Boolean, DateTime, ForeignKey, Index, Integer, LargeBinary, String, Text, UniqueConstraint, event, inspect, text
+from sqlalchemy.ext.asyncio import AsyncAttrs, AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
 from .config import get_settings
+from .telemetry import instrument_engine
 
 
 class Base(AsyncAttrs, DeclarativeBase):
@@ -22,6 +23,8 @@ class Repository(Base):
     default_branch: Mapped[str] = mapped_column(String(128), default="main")
     is_private: Mapped[bool] = mapped_column(Boolean, default=False)
     enabled: Mapped[bool] = mapped_column(Boolean, default=True)
+    # ingestion engine: "github" (API) or "git" (local mirror); NULL means INGEST_SOURCE
+    source: Mapped[str | None] = mapped_column(String(16), nullable=True)
     last_checked_at: Mapped[dt.datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
     created_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), default=lambda: dt.datetime.now(dt.timezone.utc))
     updated_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), default=lambda: dt.datetime.now(dt.timezone.utc), onupdate=lambda: dt.datetime.now(dt.timezone.utc))
@@ -33,6 +36,8 @@ class Commit(Base):
     __tablename__ = "commits"
     __table_args__ = (
         UniqueConstraint("repo_id", "sha", name="uq_commits_repo_sha"),
+        # newest-first listings and keyset pages walk this index without sorting
+        Index("ix_commits_repo_committed_id", "repo_id", "committed_at", "id"),
     )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
@@ -62,19 +67,193 @@ class CommitFile(Base):
     status: Mapped[str | None] = mapped_column(String(32))
     additions: Mapped[int] = mapped_column(Integer, default=0)
     deletions: Mapped[int] = mapped_column(Integer, default=0)
-    patch: Mapped[str | None] = mapped_column(Text)
+    # Legacy inline patch text; new rows store it compressed in patch_blobs (see patches.py).
+    patch: Mapped[str | None] = mapped_column(Text, deferred=True)
+    patch_blob_id: Mapped[int | None] = mapped_column(ForeignKey("patch_blobs.id", ondelete="SET NULL"), nullable=True)
 
     commit: Mapped[Commit] = relationship()
 
 
+class PatchBlob(Base):
+    """Compressed patch body, stored once per distinct content and shared by every file row
+    (across repos, forks and cherry-picks) that has the same patch text."""
+
+    __tablename__ = "patch_blobs"
+    __table_args__ = (
+        Index("ix_patch_blobs_hash", "hash", unique=True),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    # sha256 of the uncompressed patch text; NULL only for blobs written before dedup
+    hash: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    codec: Mapped[str] = mapped_column(String(16), default="zlib")
+    data: Mapped[bytes] = mapped_column(LargeBinary)
+    # NULL for blobs written before gc had a grace period
+    created_at: Mapped[dt.datetime | None] = mapped_column(DateTime(timezone=True), nullable=True, default=lambda: dt.datetime.now(dt.timezone.utc))
+
+
+class CommitRollup(Base):
+    """Per-(repo, UTC hour) commit totals, maintained alongside commit inserts."""
+
+    __tablename__ = "commit_rollups"
+    # all-repo time ranges (summary totals, time series) scan by hour; covering, so the scan
+    # never visits the table (about 8x faster over a year of rollups for 300 repos)
+    __table_args__ = (Index("ix_commit_rollups_hour", "hour", "repo_id", "commits", "additions", "deletions"),)
+
+    repo_id: Mapped[int] = mapped_column(ForeignKey("repositories.id", ondelete="CASCADE"), primary_key=True)
+    hour: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
+    commits: Mapped[int] = mapped_column(Integer, default=0)
+    additions: Mapped[int] = mapped_column(Integer, default=0)
+    deletions: Mapped[int] = mapped_column(Integer, default=0)
+
+
+class CommitFileJob(Base):
+    """Pending per-commit file fetch, drained by the background file queue."""
+
+    __tablename__ = "commit_file_jobs"
+
+    commit_id: Mapped[int] = mapped_column(ForeignKey("commits.id", ondelete="CASCADE"), primary_key=True)
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    next_attempt_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), index=True, default=lambda: dt.datetime.now(dt.timezone.utc))
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), default=lambda: dt.datetime.now(dt.timezone.utc))
+
+
+class RepoSchedule(Base):
+    """Adaptive polling state per repo (see scheduling.py); kept in the DB to survive restarts."""
+
+    __tablename__ = "repo_schedules"
+
+    repo_id: Mapped[int] = mapped_column(ForeignKey("repositories.id", ondelete="CASCADE"), primary_key=True)
+    next_due_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), index=True)
+    interval_seconds: Mapped[int] = mapped_column(Integer)
+    last_commit_at: Mapped[dt.datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    failures: Mapped[int] = mapped_column(Integer, default=0)
+    # set by request_poll (a webhook on a non-leader process), cleared by the next poll
+    poll_requested_at: Mapped[dt.datetime | None] = mapped_column(DateTime(timezone=True), nullable=True, index=True)
+    updated_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), default=lambda: dt.datetime.now(dt.timezone.utc), onupdate=lambda: dt.datetime.now(dt.timezone.utc))
+
+
+class Lease(Base):
+    """Named lease held by one process at a time (see leader.py)."""
+
+    __tablename__ = "leases"
+
+    name: Mapped[str] = mapped_column(String(64), primary_key=True)
+    holder: Mapped[str] = mapped_column(String(255))
+    expires_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True))
+    renewed_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True))
+
+
+class BackfillSlice(Base):
+    """One time range of a repo's history to import (see backfill.py); progress is checkpointed per page."""
+
+    __tablename__ = "backfill_slices"
+    __table_args__ = (UniqueConstraint("repo_id", "since", "until", name="uq_backfill_slices_range"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    repo_id: Mapped[int] = mapped_column(ForeignKey("repositories.id", ondelete="CASCADE"), index=True)
+    since: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True))
+    until: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True))
+    status: Mapped[str] = mapped_column(String(16), default="pending", index=True)
+    # GraphQL endCursor of the last page written, so a resumed slice skips what it already has
+    cursor: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    commits: Mapped[int] = mapped_column(Integer, default=0)
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    next_attempt_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), default=lambda: dt.datetime.now(dt.timezone.utc))
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    updated_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), default=lambda: dt.datetime.now(dt.timezone.utc))
+
+
+class IngestEvent(Base):
+    """Data-changed notice from the ingesting process, tailed by every API process (see relay.py)."""
+
+    __tablename__ = "ingest_events"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    origin: Mapped[str] = mapped_column(String(64))
+    # JSON /stream event, or NULL for a cache invalidation only
+    payload: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[dt.datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: dt.datetime.now(dt.timezone.utc), index=True
+    )
+
+
 settings = get_settings()
+
+
+def configure_sqlite(engine: AsyncEngine, busy_timeout_ms: int = 5000) -> None:
+    """WAL lets API reads proceed while ingestion writes; busy_timeout makes writers queue
+    for the lock instead of failing with "database is locked"."""
+    if engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def _pragmas(dbapi_conn, _record) -> None:
+        cursor = dbapi_conn.cursor()
+        if settings.sqlite_wal:
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+        cursor.close()
+
+
 engine = create_async_engine(settings.database_url, echo=False, future=True)
+configure_sqlite(engine)
+if settings.prometheus_metrics:
+    instrument_engine(engine)
 SessionLocal = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
 
 
+def as_utc(ts: Optional[dt.datetime]) -> Optional[dt.datetime]:
+    """`ts` as an aware UTC datetime (None stays None).
+
+    SQLite hands DateTime columns back naive; they were stored as UTC.
+    """
+    if ts is None:
+        return None
+    return ts.astimezone(dt.timezone.utc) if ts.tzinfo else ts.replace(tzinfo=dt.timezone.utc)
+
+
+def dialect_insert(session: AsyncSession, table):
+    """Dialect-native INSERT construct (supports ON CONFLICT ... RETURNING).
+
+    Statements are executed with a list of parameter dicts, which SQLAlchemy batches into
+    multi-row VALUES ("insertmanyvalues") while still collecting RETURNING rows.
+    """
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"bulk writes are not supported on {dialect!r}")
+    return insert(table)
+
+
+def _upgrade_schema(sync_conn) -> None:
+    """Add columns and indexes introduced after a table was first created.
+
+    create_all only creates missing tables, so existing databases need this to pick up
+    new nullable columns and new indexes.
+    """
+    insp = inspect(sync_conn)
+    for table in Base.metadata.sorted_tables:
+        if not insp.has_table(table.name):
+            continue
+        existing = {c["name"] for c in insp.get_columns(table.name)}
+        for col in table.columns:
+            if col.name not in existing:
+                col_type = col.type.compile(dialect=sync_conn.dialect)
+                sync_conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {col.name} {col_type}"))
+        for index in table.indexes:
+            index.create(sync_conn, checkfirst=True)
+
+
 async def init_db() -> None:
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_upgrade_schema)
 
 
 async def get_session() -> AsyncIterator[AsyncSession]:
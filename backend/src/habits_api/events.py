@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Set
+
+from .config import get_settings
+
+log = logging.getLogger(__name__)
+
+
+class Subscriber:
+    """One connected client: a bounded queue plus a flag for when it fell behind."""
+
+    def __init__(self, maxsize: int) -> None:
+        self.queue: asyncio.Queue[Dict[str, Any]] = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def offer(self, event: Dict[str, Any]) -> None:
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Slow client: discard its backlog and tell it to refetch instead of buffering
+            # without bound or stalling the publisher.
+            self.dropped += self.queue.qsize()
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"type": "resync"})
+
+
+class Broadcaster:
+    """In-process fan-out of dashboard deltas to every open /stream connection."""
+
+    def __init__(self, queue_size: int) -> None:
+        self.queue_size = queue_size
+        self._subscribers: Set[Subscriber] = set()
+
+    def subscribe(self) -> Subscriber:
+        sub = Subscriber(self.queue_size)
+        self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        self._subscribers.discard(sub)
+
+    def publish(self, event: Dict[str, Any]) -> None:
+        for sub in list(self._subscribers):
+            sub.offer(event)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+
+def format_sse(event: Dict[str, Any]) -> str:
+    return f"event: {event.get('type', 'message')}\ndata: {json.dumps(event, default=str, separators=(',', ':'))}\n\n"
+
+
+async def event_stream(
+    broadcaster: Broadcaster,
+    is_disconnected: Callable[[], Awaitable[bool]],
+    keepalive_seconds: Optional[float] = None,
+) -> AsyncIterator[str]:
+    """Yield SSE frames for one client until it disconnects; sends comment pings when idle."""
+    keepalive = keepalive_seconds or get_settings().stream_keepalive_seconds
+    sub = broadcaster.subscribe()
+    try:
+        yield format_sse({"type": "hello"})
+        while not await is_disconnected():
+            try:
+                event = await asyncio.wait_for(sub.queue.get(), timeout=keepalive)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            yield format_sse(event)
+    finally:
+        broadcaster.unsubscribe(sub)
+
+
+_broadcaster: Optional[Broadcaster] = None
+
+
+def get_broadcaster() -> Broadcaster:
+    global _broadcaster
+    if _broadcaster is None:
+        _broadcaster = Broadcaster(get_settings().stream_queue_size)
+    return _broadcaster
+
+
+def publish(event: Dict[str, Any]) -> None:
+    get_broadcaster().publish(event)
@@ -0,0 +1,238 @@
+from __future__ import annotations
+
+import asyncio
+import datetime as dt
+import logging
+from typing import List, Optional, Sequence, Set
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from .config import get_settings
+from .db import Commit, CommitFile, CommitFileJob, Repository
+from .ratelimit import REST, get_governor
+from .singleflight import SingleFlight
+from .sources import GITHUB, fetch_commit_files, source_for
+from .writes import insert_commit_files
+
+log = logging.getLogger(__name__)
+
+# Retry delay grows 1m, 2m, 4m, ... capped at an hour.
+RETRY_BASE_SECONDS = 60
+RETRY_MAX_SECONDS = 3600
+
+
+# Loads of the same commit's files (detail views, prefetch, queue workers) share one fetch.
+_flights = SingleFlight()
+
+
+async def load_commit_files(
+    session_factory: async_sessionmaker,
+    repo_id: int,
+    full_name: str,
+    source: Optional[str],
+    commit_id: int,
+    sha: str,
+) -> int:
+    """Fetch a commit's files, store them and clear its queued job; returns files added.
+
+    Coalesced per (repo, sha): concurrent callers wait for the one fetch in flight. The
+    fetch runs with no transaction open; the write is one short transaction.
+    """
+
+    async def _load() -> int:
+        payload = await fetch_commit_files(full_name, sha, source=source_for(source))
+        async with session_factory() as session:
+            added = await insert_commit_files(session, {commit_id: payload.get("files", [])})
+            await session.execute(delete(CommitFileJob).where(CommitFileJob.commit_id == commit_id))
+            await session.commit()
+        return added
+
+    return await _flights.do((repo_id, sha), _load)
+
+
+class FileFetchQueue:
+    """Drains `commit_file_jobs` with a pool of async workers.
+
+    Jobs are rows written in the same transaction as their commits, so pending work survives
+    restarts. Workers fetch over the network with no transaction open, then apply the files and
+    delete the job in one short write.
+    """
+
+    def __init__(self, session_factory: async_sessionmaker, concurrency: Optional[int] = None) -> None:
+        settings = get_settings()
+        self.session_factory = session_factory
+        self.concurrency = max(1, concurrency or settings.file_fetch_concurrency)
+        self.max_attempts = settings.file_fetch_max_attempts
+        self.poll_seconds = settings.file_fetch_poll_seconds
+        self._wake = asyncio.Event()
+        self._inflight: Set[int] = set()
+        self._tasks: List[asyncio.Task] = []
+
+    def notify(self) -> None:
+        """Wake the dispatcher early (e.g. right after ingestion queued new jobs)."""
+        self._wake.set()
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        work: asyncio.Queue[int] = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._dispatch(work))]
+        self._tasks += [asyncio.create_task(self._worker(work)) for _ in range(self.concurrency)]
+
+    async def stop(self) -> None:
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def drain(self) -> int:
+        """Process every due job inline and return how many were handled (CLI/tests)."""
+        handled = 0
+        sem = asyncio.Semaphore(self.concurrency)
+
+        async def _run(commit_id: int) -> None:
+            async with sem:
+                await self.process(commit_id)
+
+        while True:
+            ids = await self._due_jobs(self.concurrency * 4)
+            if not ids:
+                return handled
+            self._inflight.update(ids)
+            try:
+                await asyncio.gather(*(_run(cid) for cid in ids))
+            finally:
+                self._inflight.difference_update(ids)
+            handled += len(ids)
+
+    async def _due_jobs(self, limit: int) -> List[int]:
+        now = dt.datetime.now(dt.timezone.utc)
+        async with self.session_factory() as session:
+            stmt = select(CommitFileJob.commit_id).where(CommitFileJob.next_attempt_at <= now)
+            if self._inflight:
+                stmt = stmt.where(CommitFileJob.commit_id.not_in(self._inflight))
+            res = await session.execute(stmt.order_by(CommitFileJob.next_attempt_at).limit(limit))
+            return list(res.scalars().all())
+
+    async def _dispatch(self, work: "asyncio.Queue[int]") -> None:
+        while True:
+            # Clear before querying so a notify() racing with the query is not lost.
+            self._wake.clear()
+            try:
+                ids = await self._due_jobs(self.concurrency * 4)
+            except Exception as e:
+                log.exception("File queue dispatch failed: %s", e)
+                ids = []
+            if not ids:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            for cid in ids:
+                self._inflight.add(cid)
+                work.put_nowait(cid)
+            await work.join()
+
+    async def _worker(self, work: "asyncio.Queue[int]") -> None:
+        while True:
+            cid = await work.get()
+            try:
+                await self.process(cid)
+            except Exception as e:
+                log.exception("File queue worker failed on commit %s: %s", cid, e)
+            finally:
+                self._inflight.discard(cid)
+                work.task_done()
+
+    async def process(self, commit_id: int) -> None:
+        async with self.session_factory() as session:
+            res = await session.execute(
+                select(Repository.id, Repository.full_name, Repository.source, Commit.sha)
+                .join(Commit, Commit.repo_id == Repository.id)
+                .where(Commit.id == commit_id)
+            )
+            row = res.one_or_none()
+        if row is None:
+            return  # commit was deleted; its job went with it
+
+        try:
+            await load_commit_files(self.session_factory, row.id, row.full_name, row.source, commit_id, row.sha)
+        except Exception as e:
+            await self._record_failure(commit_id, f"{row.full_name}@{row.sha}", e)
+
+    async def _record_failure(self, commit_id: int, label: str, error: Exception) -> None:
+        async with self.session_factory() as session:
+            job = await session.get(CommitFileJob, commit_id)
+            if job is None:
+                return
+            job.attempts += 1
+            if job.attempts >= self.max_attempts:
+                # Give up; commit_detail can still fetch the files on demand.
+                log.error("Giving up on files for %s after %s attempts: %s", label, job.attempts, error)
+                await session.delete(job)
+            else:
+                delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (job.attempts - 1))
+                job.next_attempt_at = dt.datetime.now(dt.timezone.utc) + dt.timedelta(seconds=delay)
+                job.last_error = str(error)
+                log.warning("Fetching files for %s failed (attempt %s): %s", label, job.attempts, error)
+            await session.commit()
+
+
+# The running app's queue, if any; ingestion pokes it after committing new jobs.
+_queue: Optional[FileFetchQueue] = None
+
+
+def start_file_queue(session_factory: async_sessionmaker) -> FileFetchQueue:
+    global _queue
+    _queue = FileFetchQueue(session_factory)
+    _queue.start()
+    return _queue
+
+
+async def stop_file_queue() -> None:
+    global _queue
+    if _queue is not None:
+        await _queue.stop()
+        _queue = None
+
+
+def notify_pending() -> None:
+    if _queue is not None:
+        _queue.notify()
+
+
+# Background prefetch tasks, referenced so they are not garbage-collected mid-flight.
+_prefetches: Set[asyncio.Task] = set()
+
+
+async def prefetch_commit_files(session: AsyncSession, repo: Repository, commits: Sequence[Commit]) -> int:
+    """Start background loads for the newest listed commits whose files are not stored yet.
+
+    Called when a commit list is served, so a click on one of them is answered locally.
+    Skipped while the REST budget is at its reserve. Returns how many loads were started.
+    """
+    limit = get_settings().commit_files_prefetch
+    candidates = list(commits[:limit]) if limit > 0 else []
+    if not candidates:
+        return 0
+    if source_for(repo.source) == GITHUB and get_governor().budgets[REST].wait_seconds() > 0:
+        return 0
+    res = await session.execute(select(CommitFile.commit_id).where(CommitFile.commit_id.in_([c.id for c in candidates])).distinct())
+    stored = set(res.scalars().all())
+    missing = [c for c in candidates if c.id not in stored and (repo.id, c.sha) not in _flights]
+    factory = async_sessionmaker(session.bind, expire_on_commit=False, class_=AsyncSession)
+    for c in missing:
+        task = asyncio.create_task(_prefetch_one(factory, repo.id, repo.full_name, repo.source, c.id, c.sha))
+        _prefetches.add(task)
+        task.add_done_callback(_prefetches.discard)
+    return len(missing)
+
+
+async def _prefetch_one(session_factory: async_sessionmaker, repo_id: int, full_name: str, source: Optional[str], commit_id: int, sha: str) -> None:
+    try:
+        await load_commit_files(session_factory, repo_id, full_name, source, commit_id, sha)
+    except Exception as e:
+        # the file queue still has the job, so a failed prefetch is retried there
+        log.debug("Prefetching files for %s@%s failed: %s", full_name, sha, e)
@@ -1,16 +1,111 @@
 from __future__ import annotations
 
+import asyncio
 import datetime as dt
+import logging
+import random
+import time
 from dataclasses import dataclass
-from typing import Any, Dict, Iterable, List, Optional, Tuple
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
 
 import httpx
 
 from .config import get_settings
+from .httpcache import close_http_cache, get_http_cache
+from .ratelimit import GRAPHQL, REST, get_governor
+from .telemetry import GITHUB_REQUEST_SECONDS, GITHUB_REQUESTS
 
+log = logging.getLogger(__name__)
 
 GQL_URL = "https://api.github.com/graphql"
 
+# Shared, app-owned client so every GitHub call reuses pooled keep-alive connections.
+_client: Optional[httpx.AsyncClient] = None
+
+
+def create_client() -> httpx.AsyncClient:
+    """Build an AsyncClient configured from settings (pool limits, timeout, optional HTTP/2)."""
+    settings = get_settings()
+    http2 = settings.github_http2
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            log.warning("GITHUB_HTTP2 is enabled but the 'h2' package is missing; falling back to HTTP/1.1")
+            http2 = False
+    limits = httpx.Limits(
+        max_connections=settings.github_max_connections,
+        max_keepalive_connections=settings.github_max_keepalive,
+    )
+    return httpx.AsyncClient(timeout=settings.github_timeout_seconds, limits=limits, http2=http2)
+
+
+def get_client() -> httpx.AsyncClient:
+    """Return the shared client, creating it lazily (e.g. for scripts that skip app startup)."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = create_client()
+    return _client
+
+
+async def open_client() -> httpx.AsyncClient:
+    return get_client()
+
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+    close_http_cache()
+
+
+def _backoff_delay(attempt: int) -> float:
+    # Full jitter: uniform in [0, base * 2^attempt]
+    base = get_settings().github_retry_backoff_seconds
+    return random.uniform(0, base * (2**attempt))
+
+
+async def _request(client: Optional[httpx.AsyncClient], method: str, url: str, **kwargs: Any) -> httpx.Response:
+    """Send a request through the rate governor.
+
+    Retries 5xx responses and connection errors with jittered backoff. Rate-limit rejections
+    are retried once the governor's budget allows, instead of surfacing as failures.
+    REST GETs are made conditional against the on-disk HTTP cache when it is enabled.
+    """
+    client = client or get_client()
+    governor = get_governor()
+    kind = GRAPHQL if url == GQL_URL else REST
+    cache = get_http_cache() if method == "GET" else None
+    cached = await cache.get(url) if cache else None
+    if cache and cached:
+        kwargs["headers"] = {**kwargs.get("headers", {}), **cache.conditional_headers(cached)}
+
+    attempts = get_settings().github_max_retries + 1
+    for attempt in range(attempts):
+        last = attempt == attempts - 1
+        await governor.acquire(kind)
+        started = time.perf_counter()
+        try:
+            resp = await client.request(method, url, **kwargs)
+        except httpx.TransportError as e:
+            GITHUB_REQUEST_SECONDS.observe(time.perf_counter() - started, kind=kind)
+            GITHUB_REQUESTS.inc(kind=kind, status="error")
+            if last:
+                raise
+            log.warning("GitHub %s %s failed (%s); retrying", method, url, e)
+        else:
+            GITHUB_REQUEST_SECONDS.observe(time.perf_counter() - started, kind=kind)
+            GITHUB_REQUESTS.inc(kind=kind, status=resp.status_code)
+            if governor.observe(kind, resp) and not last:
+                log.warning("GitHub %s %s was rate limited (%s); waiting for budget", method, url, resp.status_code)
+                continue
+            if resp.status_code < 500 or last:
+                return await cache.revalidated(url, cached, resp) if cache else resp
+            log.warning("GitHub %s %s returned %s; retrying", method, url, resp.status_code)
+        await asyncio.sleep(_backoff_delay(attempt))
+    raise AssertionError("unreachable")
+
 
 def _auth_headers(token: Optional[str]) -> Dict[str, str]:
     headers = {"Accept": "application/vnd.github+json"}
@@ -24,25 +119,23 @@ def split_repo(full_name: str) -> Tuple[str, str]:
     return owner, name
 
 
-async def fetch_commits_since(full_name: str, since: dt.datetime) -> Dict[str, Any]:
-    """Fetch commit history on the default branch since timestamp via GitHub GraphQL.
-
-    Returns a dict with keys: default_branch, is_private, commits: [ ... ].
-    Each commit includes oid, committedDate, message, author, additions, deletions, changedFiles, url.
-    """
-    settings = get_settings()
-    owner, name = split_repo(full_name)
+HISTORY_PAGE_SIZE = 100
+# Repos per aliased history query. The 500k-node limit would allow thousands, but each alias
+# asks for a full 100-commit page with messages; past a few dozen, documents run into GitHub's
+# 10s server timeout and come back as partial errors, and one failure costs the whole chunk.
+MAX_GRAPHQL_BATCH = 50
 
-    query = """
-    query($owner:String!, $name:String!, $since:GitTimestamp!) {
-      repository(owner:$owner, name:$name) {
+# Selection set for one repository's default-branch history; shared by the
+# single-repo and the aliased batch queries. `since`/`until`/`after` are variable names or literals.
+_REPO_SELECTION = """
         isPrivate
         nameWithOwner
         defaultBranchRef {
           name
           target {
             ... on Commit {
-              history(since:$since, first: 100) {
+              history(since:%(since)s, until:%(until)s, after:%(after)s, first: %(first)d) {
+                pageInfo { hasNextPage endCursor }
                 nodes {
                   oid
                   committedDate
@@ -60,27 +153,15 @@ async def fetch_commits_since(full_name: str, since: dt.datetime) -> Dict[str, A
             }
           }
         }
-      }
-      rateLimit { remaining resetAt }
-    }
-    """
+"""
 
-    variables = {
-        "owner": owner,
-        "name": name,
-        "since": since.isoformat(),
-    }
 
-    async with httpx.AsyncClient(timeout=30) as client:
-        resp = await client.post(GQL_URL, json={"query": query, "variables": variables}, headers=_auth_headers(settings.github_token))
-        resp.raise_for_status()
-        data = resp.json()
-        if "errors" in data:
-            raise RuntimeError(f"GitHub GraphQL error: {data['errors']}")
-
-    repo = data["data"]["repository"]
+def _parse_repository(repo: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Turn a GraphQL `repository` node into one page of the commit-history payload."""
     default_branch = repo["defaultBranchRef"]["name"] if repo and repo.get("defaultBranchRef") else "main"
-    nodes = repo["defaultBranchRef"]["target"]["history"]["nodes"] if repo and repo.get("defaultBranchRef") else []
+    history = repo["defaultBranchRef"]["target"]["history"] if repo and repo.get("defaultBranchRef") else {}
+    nodes = history.get("nodes") or []
+    page_info = history.get("pageInfo") or {}
 
     commits = []
     for n in nodes:
@@ -102,10 +183,152 @@ async def fetch_commits_since(full_name: str, since: dt.datetime) -> Dict[str, A
         "default_branch": default_branch,
         "is_private": bool(repo.get("isPrivate")) if repo else False,
         "commits": commits,
+        "has_next_page": bool(page_info.get("hasNextPage")),
+        "end_cursor": page_info.get("endCursor"),
     }
 
 
-async def list_viewer_repositories() -> List[Dict[str, Any]]:
+async def iter_commit_pages(
+    full_name: str,
+    since: dt.datetime,
+    after: Optional[str] = None,
+    client: Optional[httpx.AsyncClient] = None,
+    until: Optional[dt.datetime] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """Yield default-branch history pages (newest first) since timestamp, following endCursor.
+
+    Each page has keys: default_branch, is_private, commits, has_next_page, end_cursor.
+    Pass `after` to resume from a page already seen (e.g. the first page of a batch fetch),
+    and `until` to stop at an upper bound (backfill slices).
+    """
+    settings = get_settings()
+    owner, name = split_repo(full_name)
+
+    query = """
+    query($owner:String!, $name:String!, $since:GitTimestamp!, $until:GitTimestamp, $cursor:String) {
+      repository(owner:$owner, name:$name) {%s}
+      rateLimit { remaining resetAt }
+    }
+    """ % (_REPO_SELECTION % {"since": "$since", "until": "$until", "after": "$cursor", "first": HISTORY_PAGE_SIZE})
+
+    cursor = after
+    while True:
+        variables = {
+            "owner": owner,
+            "name": name,
+            "since": since.isoformat(),
+            "until": until.isoformat() if until else None,
+            "cursor": cursor,
+        }
+        resp = await _request(client, "POST", GQL_URL, json={"query": query, "variables": variables}, headers=_auth_headers(settings.github_token))
+        resp.raise_for_status()
+        data = resp.json()
+        if "errors" in data:
+            raise RuntimeError(f"GitHub GraphQL error: {data['errors']}")
+        get_governor().observe_graphql(data["data"].get("rateLimit"))
+
+        page = _parse_repository(data["data"]["repository"])
+        yield page
+        if not page["has_next_page"] or not page["end_cursor"]:
+            break
+        cursor = page["end_cursor"]
+
+
+async def fetch_commits_since(full_name: str, since: dt.datetime, client: Optional[httpx.AsyncClient] = None) -> Dict[str, Any]:
+    """Fetch the full commit history on the default branch since timestamp via GitHub GraphQL.
+
+    Returns a dict with keys: default_branch, is_private, commits: [ ... ].
+    Each commit includes oid, committedDate, message, author, additions, deletions, changedFiles, url.
+    Collects every page in memory; ingestion streams with iter_commit_pages instead.
+    """
+    payload: Dict[str, Any] = {"default_branch": "main", "is_private": False, "commits": []}
+    async for page in iter_commit_pages(full_name, since, client=client):
+        payload["default_branch"] = page["default_branch"]
+        payload["is_private"] = page["is_private"]
+        payload["commits"].extend(page["commits"])
+    payload["has_next_page"] = False
+    payload["end_cursor"] = None
+    return payload
+
+
+@dataclass
+class BatchResult:
+    """Per-repo outcome of fetch_commits_batch, keyed by full_name."""
+
+    payloads: Dict[str, Dict[str, Any]]
+    errors: Dict[str, str]
+
+
+def _batch_query(count: int) -> str:
+    params = ", ".join(f"$o{i}:String!, $n{i}:String!, $s{i}:GitTimestamp!" for i in range(count))
+    aliases = []
+    for i in range(count):
+        selection = _REPO_SELECTION % {"since": f"$s{i}", "until": "null", "after": "null", "first": HISTORY_PAGE_SIZE}
+        aliases.append(f"r{i}: repository(owner:$o{i}, name:$n{i}) {{{selection}}}")
+    return "query(%s) {\n%s\nrateLimit { remaining resetAt }\n}" % (params, "\n".join(aliases))
+
+
+async def fetch_commits_batch(
+    items: Iterable[Tuple[str, dt.datetime]],
+    client: Optional[httpx.AsyncClient] = None,
+    batch_size: Optional[int] = None,
+) -> BatchResult:
+    """Fetch history for many repositories with aliased GraphQL queries.
+
+    Repos are packed `batch_size` per document (at most MAX_GRAPHQL_BATCH), so N repos
+    cost ceil(N / batch_size) round-trips. Each payload is the first history page, shaped like
+    iter_commit_pages output; resume with `after=payload["end_cursor"]` when `has_next_page`.
+    A repo that fails (missing, no access, or its whole chunk failing) lands in `errors`.
+    """
+    settings = get_settings()
+    pending = list(dict(items).items())
+    size = max(1, min(batch_size or settings.github_graphql_batch_size, MAX_GRAPHQL_BATCH))
+    result = BatchResult(payloads={}, errors={})
+
+    for start in range(0, len(pending), size):
+        chunk = pending[start : start + size]
+        variables: Dict[str, Any] = {}
+        for i, (full_name, since) in enumerate(chunk):
+            owner, name = split_repo(full_name)
+            variables.update({f"o{i}": owner, f"n{i}": name, f"s{i}": since.isoformat()})
+
+        try:
+            resp = await _request(
+                client,
+                "POST",
+                GQL_URL,
+                json={"query": _batch_query(len(chunk)), "variables": variables},
+                headers=_auth_headers(settings.github_token),
+            )
+            resp.raise_for_status()
+            data = resp.json()
+        except Exception as e:
+            log.exception("Batched GitHub history fetch failed for %s repos: %s", len(chunk), e)
+            for full_name, _ in chunk:
+                result.errors[full_name] = str(e)
+            continue
+
+        # Errors for individual aliases come back next to partial data, with path [alias, ...].
+        alias_errors: Dict[str, str] = {}
+        for err in data.get("errors") or []:
+            path = err.get("path") or []
+            if path:
+                alias_errors.setdefault(str(path[0]), err.get("message", "unknown error"))
+        nodes = data.get("data") or {}
+        get_governor().observe_graphql(nodes.get("rateLimit"))
+
+        for i, (full_name, _) in enumerate(chunk):
+            alias = f"r{i}"
+            repo = nodes.get(alias)
+            if repo is None:
+                result.errors[full_name] = alias_errors.get(alias) or f"GitHub GraphQL error: {data.get('errors')}"
+            else:
+                result.payloads[full_name] = _parse_repository(repo)
+
+    return result
+
+
+async def list_viewer_repositories(client: Optional[httpx.AsyncClient] = None) -> List[Dict[str, Any]]:
     """Return all repositories visible to the token's user with minimal fields.
 
     Each dict: {full_name, default_branch, is_private}
@@ -132,30 +355,29 @@ async def list_viewer_repositories() -> List[Dict[str, Any]]:
     """
     repos: List[Dict[str, Any]] = []
     cursor: Optional[str] = None
-    async with httpx.AsyncClient(timeout=30) as client:
-        while True:
-            payload = {"query": query, "variables": {"cursor": cursor}}
-            resp = await client.post(GQL_URL, json=payload, headers=_auth_headers(settings.github_token))
-            resp.raise_for_status()
-            data = resp.json()
-            if "errors" in data:
-                raise RuntimeError(f"GitHub GraphQL error: {data['errors']}")
-            repo_conn = data["data"]["viewer"]["repositories"]
-            for n in repo_conn["nodes"]:
-                repos.append(
-                    {
-                        "full_name": n["nameWithOwner"],
-                        "default_branch": (n.get("defaultBranchRef") or {}).get("name") or "main",
-                        "is_private": bool(n.get("isPrivate")),
-                    }
-                )
-            if not repo_conn["pageInfo"]["hasNextPage"]:
-                break
-            cursor = repo_conn["pageInfo"]["endCursor"]
+    while True:
+        payload = {"query": query, "variables": {"cursor": cursor}}
+        resp = await _request(client, "POST", GQL_URL, json=payload, headers=_auth_headers(settings.github_token))
+        resp.raise_for_status()
+        data = resp.json()
+        if "errors" in data:
+            raise RuntimeError(f"GitHub GraphQL error: {data['errors']}")
+        repo_conn = data["data"]["viewer"]["repositories"]
+        for n in repo_conn["nodes"]:
+            repos.append(
+                {
+                    "full_name": n["nameWithOwner"],
+                    "default_branch": (n.get("defaultBranchRef") or {}).get("name") or "main",
+                    "is_private": bool(n.get("isPrivate")),
+                }
+            )
+        if not repo_conn["pageInfo"]["hasNextPage"]:
+            break
+        cursor = repo_conn["pageInfo"]["endCursor"]
     return repos
 
 
-async def fetch_commit_files(full_name: str, sha: str) -> Dict[str, Any]:
+async def fetch_commit_files(full_name: str, sha: str, client: Optional[httpx.AsyncClient] = None) -> Dict[str, Any]:
     """Fetch per-file changes for a commit via GitHub REST v3.
 
     Returns: { files: [ {path, status, additions, deletions, patch?} ],
@@ -164,10 +386,9 @@ async def fetch_commit_files(full_name: str, sha: str) -> Dict[str, Any]:
     settings = get_settings()
     owner, name = split_repo(full_name)
     url = f"https://api.github.com/repos/{owner}/{name}/commits/{sha}"
-    async with httpx.AsyncClient(timeout=30) as client:
-        resp = await client.get(url, headers=_auth_headers(settings.github_token))
-        resp.raise_for_status()
-        data = resp.json()
+    resp = await _request(client, "GET", url, headers=_auth_headers(settings.github_token))
+    resp.raise_for_status()
+    data = resp.json()
     files = []
     for f in data.get("files", []) or []:
         files.append(
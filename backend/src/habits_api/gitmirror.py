@@ -0,0 +1,292 @@
+"""Ingestion engine backed by local bare mirrors instead of the GitHub API.
+
+Each tracked repo is kept as a bare repository under GIT_MIRROR_DIR and brought up to date
+with `git fetch`. Commits, per-file numstat and patches are parsed from streamed `git log` /
+`git show` output into the same payload shapes as github.iter_commit_pages and
+github.fetch_commit_files, so ingestion can pick an engine per repo.
+"""
+from __future__ import annotations
+
+import asyncio
+import base64
+import datetime as dt
+import logging
+import os
+import re
+import shutil
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from .config import get_settings
+from .db import as_utc
+from .github import HISTORY_PAGE_SIZE, split_repo
+
+log = logging.getLogger(__name__)
+
+# Separators that cannot appear in commit metadata: record start, field, end of message.
+_RS, _FS, _EOM = "\x1e", "\x1f", "\x1d"
+_LOG_FORMAT = "--format=" + _RS + _FS.join(["%H", "%cI", "%an", "%ae", "%B"]) + _EOM
+# Lines of `git log`/`git show` output can be long (huge minified diffs).
+_LINE_LIMIT = 16 * 1024 * 1024
+_NOREPLY = re.compile(r"^(?:\d+\+)?([^@]+)@users\.noreply\.github\.com$", re.IGNORECASE)
+_STATUS = {"A": "added", "D": "removed", "M": "modified", "T": "changed"}
+
+_locks: Dict[str, asyncio.Lock] = {}
+
+
+class GitError(RuntimeError):
+    pass
+
+
+def mirror_path(full_name: str) -> Path:
+    owner, name = split_repo(full_name)
+    return Path(get_settings().git_mirror_dir) / owner / f"{name}.git"
+
+
+def remote_url(full_name: str) -> str:
+    return get_settings().git_remote_url.format(full_name=full_name)
+
+
+def _git_env(url: str) -> Dict[str, str]:
+    """Environment for git: never prompt, and send the GitHub token when talking to github.com.
+
+    The token goes in through GIT_CONFIG_* rather than `-c`, so it never shows up in argv
+    (visible to every user via ps and /proc).
+    """
+    env = {**os.environ, "GIT_TERMINAL_PROMPT": "0"}
+    token = get_settings().github_token
+    if token and url.startswith("https://github.com/"):
+        basic = base64.b64encode(f"x-access-token:{token}".encode()).decode()
+        env.update(
+            GIT_CONFIG_COUNT="1",
+            GIT_CONFIG_KEY_0="http.https://github.com/.extraheader",
+            GIT_CONFIG_VALUE_0=f"AUTHORIZATION: basic {basic}",
+        )
+    return env
+
+
+async def _spawn(path: Optional[Path], *args: str, url: str = "") -> asyncio.subprocess.Process:
+    cmd = [get_settings().git_binary, "-c", "core.quotePath=false"]
+    if path is not None:
+        cmd += ["-C", str(path)]
+    return await asyncio.create_subprocess_exec(
+        *cmd, *args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE, env=_git_env(url), limit=_LINE_LIMIT
+    )
+
+
+async def _git(path: Optional[Path], *args: str, url: str = "") -> str:
+    proc = await _spawn(path, *args, url=url)
+    try:
+        out, err = await asyncio.wait_for(proc.communicate(), get_settings().git_timeout_seconds)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        raise GitError(f"git {args[0]} timed out")
+    if proc.returncode != 0:
+        raise GitError(f"git {args[0]} failed: {err.decode(errors='replace').strip()}")
+    return out.decode("utf-8", errors="replace")
+
+
+async def _git_lines(path: Path, *args: str) -> AsyncIterator[str]:
+    """Stream stdout line by line; the process is killed if the caller stops early."""
+    proc = await _spawn(path, *args)
+    assert proc.stdout is not None and proc.stderr is not None
+    try:
+        async for raw in proc.stdout:
+            yield raw.decode("utf-8", errors="replace").rstrip("\n")
+        err = await proc.stderr.read()
+        if await proc.wait() != 0:
+            raise GitError(f"git {args[0]} failed: {err.decode(errors='replace').strip()}")
+    finally:
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+
+
+async def sync_mirror(full_name: str) -> Path:
+    """Create the bare mirror on first use, otherwise fetch new branch heads into it."""
+    lock = _locks.setdefault(full_name, asyncio.Lock())
+    async with lock:
+        path = mirror_path(full_name)
+        url = remote_url(full_name)
+        if path.exists():
+            await _git(path, "fetch", "--prune", "--no-tags", "--quiet", "origin", url=url)
+            return path
+        # Build in a temp dir and rename, so a failed first fetch never leaves a half mirror.
+        tmp = path.with_name(path.name + ".tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.parent.mkdir(parents=True, exist_ok=True)
+        await _git(None, "init", "--bare", "--quiet", str(tmp))
+        await _git(tmp, "remote", "add", "origin", url)
+        # Only branches: pull-request refs on GitHub would multiply the fetch size.
+        await _git(tmp, "config", "remote.origin.fetch", "+refs/heads/*:refs/heads/*")
+        await _git(tmp, "fetch", "--no-tags", "--quiet", "origin", url=url)
+        head = await _git(tmp, "ls-remote", "--symref", "origin", "HEAD", url=url)
+        match = re.search(r"^ref: (refs/heads/\S+)\tHEAD", head, re.MULTILINE)
+        if match:
+            await _git(tmp, "symbolic-ref", "HEAD", match.group(1))
+        os.replace(tmp, path)
+        log.info("Created git mirror for %s at %s", full_name, path)
+        return path
+
+
+async def default_branch(path: Path) -> str:
+    try:
+        return (await _git(path, "symbolic-ref", "--short", "HEAD")).strip() or "main"
+    except GitError:
+        return "main"
+
+
+def _login_from_email(email: str) -> Optional[str]:
+    match = _NOREPLY.match(email or "")
+    return match.group(1) if match else None
+
+
+def _parse_numstat(line: str) -> Optional[tuple[int, int, str]]:
+    """`adds<TAB>dels<TAB>path`; binary files report `-` for both counts."""
+    parts = line.split("\t", 2)
+    if len(parts) != 3:
+        return None
+    adds, dels, path = parts
+    return (0 if adds == "-" else int(adds)), (0 if dels == "-" else int(dels)), path
+
+
+async def iter_commit_pages(
+    full_name: str, since: dt.datetime, page_size: int = HISTORY_PAGE_SIZE, until: Optional[dt.datetime] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """Yield default-branch history pages (newest first) since timestamp, parsed from `git log`.
+
+    Pages have the same keys as github.iter_commit_pages except is_private, which git cannot
+    know (callers keep the stored value). The mirror is fetched first.
+    """
+    path = await sync_mirror(full_name)
+    branch = await default_branch(path)
+    # naive bounds are UTC (as SQLite returns them), never host-local time
+    bounds = ["--since=" + as_utc(since).isoformat()]
+    if until is not None:
+        bounds.append("--until=" + as_utc(until).isoformat())
+    lines = _git_lines(
+        path, "log", branch, *bounds, _LOG_FORMAT, "--numstat", "--no-renames", "--diff-merges=first-parent", "--"
+    )
+
+    page: List[Dict[str, Any]] = []
+    current: Optional[Dict[str, Any]] = None
+    header: Optional[List[str]] = None  # lines of a commit header whose message is still open
+
+    try:
+        async for line in lines:
+            if header is None and line.startswith(_RS):
+                if current is not None:
+                    page.append(current)
+                    current = None
+                    # a full page is only released once the next commit starts, so has_next_page is exact
+                    if len(page) == page_size:
+                        yield {"default_branch": branch, "commits": page, "has_next_page": True, "end_cursor": None}
+                        page = []
+                header = [line[1:]]
+            elif header is not None:
+                header.append(line)
+            elif current is not None and line:
+                stat = _parse_numstat(line)
+                if stat:
+                    current["additions"] += stat[0]
+                    current["deletions"] += stat[1]
+                    current["changed_files"] += 1
+                continue
+
+            if header is not None and header[-1].endswith(_EOM):
+                sha, committed_at, author_name, author_email, message = "\n".join(header)[: -len(_EOM)].split(_FS, 4)
+                header = None
+                current = {
+                    "sha": sha,
+                    "committed_at": committed_at,
+                    "message": message.rstrip("\n"),
+                    "author_name": author_name,
+                    "author_login": _login_from_email(author_email),
+                    "additions": 0,
+                    "deletions": 0,
+                    "changed_files": 0,
+                    "url": f"https://github.com/{full_name}/commit/{sha}",
+                }
+    finally:
+        await lines.aclose()
+
+    if current is not None:
+        page.append(current)
+    yield {"default_branch": branch, "commits": page, "has_next_page": False, "end_cursor": None}
+
+
+async def fetch_commits_since(full_name: str, since: dt.datetime) -> Dict[str, Any]:
+    """Collect every page from iter_commit_pages; is_private is always None (unknown to git)."""
+    payload: Dict[str, Any] = {"default_branch": "main", "is_private": None, "commits": []}
+    async for page in iter_commit_pages(full_name, since):
+        payload["default_branch"] = page["default_branch"]
+        payload["commits"].extend(page["commits"])
+    payload["has_next_page"] = False
+    payload["end_cursor"] = None
+    return payload
+
+
+def _split_patches(diff_lines: List[str]) -> List[Optional[str]]:
+    """Split `git show -p` output into per-file hunks, trimmed like GitHub's `patch` field.
+
+    Binary files and pure mode changes have no hunks and map to None.
+    """
+    sections: List[List[str]] = []
+    for line in diff_lines:
+        if line.startswith("diff --git "):
+            sections.append([])
+        elif sections and (sections[-1] or line.startswith("@@")):
+            sections[-1].append(line)
+    return ["\n".join(lines) if lines else None for lines in sections]
+
+
+async def fetch_commit_files(full_name: str, sha: str) -> Dict[str, Any]:
+    """Per-file changes for a commit, parsed from `git show --raw --numstat -p`.
+
+    Returns the same shape as github.fetch_commit_files. Fetches the mirror once if the
+    commit is not there yet.
+    """
+    path = mirror_path(full_name)
+    if not path.exists() or not await _has_commit(path, sha):
+        path = await sync_mirror(full_name)
+
+    statuses: List[str] = []
+    stats: List[tuple[int, int, str]] = []
+    diff: List[str] = []
+    async for line in _git_lines(
+        path, "show", "--format=", "--raw", "--numstat", "-p", "--no-renames", "--diff-merges=first-parent", sha
+    ):
+        if diff or line.startswith("diff --git "):
+            diff.append(line)
+        elif line.startswith(":"):
+            # `:old_mode new_mode old_sha new_sha STATUS<TAB>path`
+            statuses.append(line.split("\t", 1)[0].rsplit(" ", 1)[-1][:1])
+        elif line:
+            stat = _parse_numstat(line)
+            if stat:
+                stats.append(stat)
+
+    patches = _split_patches(diff)
+    files = []
+    for i, (adds, dels, file_path) in enumerate(stats):
+        files.append(
+            {
+                "path": file_path,
+                "status": _STATUS.get(statuses[i] if i < len(statuses) else "", "modified"),
+                "additions": adds,
+                "deletions": dels,
+                "patch": patches[i] if i < len(patches) else None,
+            }
+        )
+    additions = sum(f["additions"] for f in files)
+    deletions = sum(f["deletions"] for f in files)
+    return {"files": files, "stats": {"additions": additions, "deletions": deletions, "total": additions + deletions}}
+
+
+async def _has_commit(path: Path, sha: str) -> bool:
+    try:
+        await _git(path, "cat-file", "-e", f"{sha}^{{commit}}")
+        return True
+    except GitError:
+        return False
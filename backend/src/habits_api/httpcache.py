@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import asyncio
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import httpx
+
+from .config import get_settings
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS http_cache (
+    url TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    content_type TEXT,
+    body BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_http_cache_accessed_at ON http_cache (accessed_at);
+"""
+
+
+@dataclass
+class CacheEntry:
+    etag: Optional[str]
+    last_modified: Optional[str]
+    content_type: Optional[str]
+    body: bytes
+
+
+class HttpCache:
+    """On-disk validator cache for GitHub REST GETs, keyed by URL.
+
+    Stores the ETag/Last-Modified of each 200 response with its (zlib-compressed) body, so the
+    next request can be sent conditionally; GitHub answers unchanged resources with a 304 that
+    does not count against the rate limit. Entries are evicted least-recently-used once the
+    stored bodies exceed `max_bytes`. Uses stdlib sqlite3 from worker threads.
+
+    Reads stay reads: recency is only rewritten for entries last touched more than
+    `touch_after_seconds` ago, which is precise enough for LRU at this scale. The stored size
+    is tracked in memory (seeded on open), so a write costs no table scan unless it pushes the
+    cache over budget; eviction then re-sums, in case other processes share the file, and
+    frees down to EVICT_TO of the budget so evictions come in batches.
+    """
+
+    TOUCH_AFTER_SECONDS = 60.0
+    EVICT_TO = 0.9
+
+    def __init__(self, path: str, max_bytes: int, touch_after_seconds: Optional[float] = None) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.touch_after_seconds = self.TOUCH_AFTER_SECONDS if touch_after_seconds is None else touch_after_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+        self._total = self._stored_bytes()
+
+    def _stored_bytes(self) -> int:
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM http_cache").fetchone()[0]
+
+    def _get(self, url: str) -> Optional[CacheEntry]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, content_type, body, accessed_at FROM http_cache WHERE url = ?", (url,)
+            ).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            if now - row[4] >= self.touch_after_seconds:
+                self._conn.execute("UPDATE http_cache SET accessed_at = ? WHERE url = ?", (now, url))
+                self._conn.commit()
+        etag, last_modified, content_type, body, _ = row
+        return CacheEntry(etag, last_modified, content_type, zlib.decompress(body))
+
+    def _put(self, url: str, entry: CacheEntry) -> None:
+        body = zlib.compress(entry.body)
+        with self._lock:
+            previous = self._conn.execute("SELECT size FROM http_cache WHERE url = ?", (url,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO http_cache (url, etag, last_modified, content_type, body, size, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, entry.etag, entry.last_modified, entry.content_type, body, len(body), time.time()),
+            )
+            self._total += len(body) - (previous[0] if previous else 0)
+            if self._total > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        total = self._stored_bytes()
+        target = int(self.max_bytes * self.EVICT_TO)
+        if total > self.max_bytes:
+            for url, size in self._conn.execute("SELECT url, size FROM http_cache ORDER BY accessed_at").fetchall():
+                self._conn.execute("DELETE FROM http_cache WHERE url = ?", (url,))
+                self.evictions += 1
+                total -= size
+                if total <= target:
+                    break
+        self._total = total
+
+    async def get(self, url: str) -> Optional[CacheEntry]:
+        return await asyncio.to_thread(self._get, url)
+
+    async def put(self, url: str, entry: CacheEntry) -> None:
+        await asyncio.to_thread(self._put, url, entry)
+
+    def conditional_headers(self, entry: Optional[CacheEntry]) -> Dict[str, str]:
+        headers: Dict[str, str] = {}
+        if entry and entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry and entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    async def revalidated(self, url: str, entry: Optional[CacheEntry], resp: httpx.Response) -> httpx.Response:
+        """Resolve a conditional response: a 304 becomes the cached 200, a fresh 200 is stored."""
+        if resp.status_code == 304 and entry is not None:
+            self.hits += 1
+            headers = dict(resp.headers)
+            if entry.content_type:
+                headers["content-type"] = entry.content_type
+            headers.pop("content-length", None)
+            return httpx.Response(200, headers=headers, content=entry.body, request=resp.request)
+        self.misses += 1
+        if resp.status_code == 200 and (resp.headers.get("etag") or resp.headers.get("last-modified")):
+            await resp.aread()
+            await self.put(
+                url,
+                CacheEntry(resp.headers.get("etag"), resp.headers.get("last-modified"), resp.headers.get("content-type"), resp.content),
+            )
+        return resp
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM http_cache").fetchone()[0]
+            size = self._total
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": entries,
+            "size_bytes": size,
+            "max_bytes": self.max_bytes,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_cache: Optional[HttpCache] = None
+
+
+def get_http_cache() -> Optional[HttpCache]:
+    """The shared REST cache, or None when HTTP_CACHE_PATH is empty."""
+    global _cache
+    settings = get_settings()
+    if _cache is None and settings.http_cache_path:
+        _cache = HttpCache(settings.http_cache_path, settings.http_cache_max_mb * 1024 * 1024)
+    return _cache
+
+
+def close_http_cache() -> None:
+    global _cache
+    if _cache is not None:
+        _cache.close()
+        _cache = None
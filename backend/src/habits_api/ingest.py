@@ -1,16 +1,30 @@
 from __future__ import annotations
 
+import asyncio
 import datetime as dt
 import logging
-from typing import Iterable
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator, Iterable, Optional
 
+from apscheduler.events import EVENT_JOB_MAX_INSTANCES
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from sqlalchemy import select, func
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
+from .backfill import start_backfill_runner, stop_backfill_runner
+from .cache import bump_generation
 from .config import Window, get_settings
-from .db import Commit, Repository, CommitFile
-from .github import fetch_commits_since, list_viewer_repositories, fetch_commit_files
+from .db import Commit, Repository, CommitFile, RepoSchedule, as_utc
+from .events import get_broadcaster, publish
+from .filequeue import load_commit_files, notify_pending, start_file_queue, stop_file_queue
+from .github import fetch_commits_batch, list_viewer_repositories
+from .relay import record_event
+from .rollups import window_totals
+from .scheduling import AdaptiveScheduler, record_poll
+from .sources import GITHUB, iter_commit_pages, source_for
+from .telemetry import INGEST_NEW_COMMITS, INGEST_REPO_SECONDS, INGEST_TICK_OVERLAPS, INGEST_TICK_SECONDS, INGEST_TICKS_RUNNING
+from .writes import enqueue_file_jobs, insert_commit_files, insert_commits, parse_timestamp
 
 log = logging.getLogger(__name__)
 
@@ -47,117 +61,364 @@ async def ensure_allowlisted_repos(session: AsyncSession) -> None:
     await session.commit()
 
 
-async def ingest_repo(session: AsyncSession, repo: Repository) -> int:
+@dataclass
+class IngestStats:
+    """Outcome of one ingestion tick across all enabled repositories."""
+
+    repos_total: int = 0
+    repos_done: int = 0
+    repos_failed: int = 0
+    new_commits: int = 0
+    wall_time_s: float = 0.0
+
+
+def _since_for(last_checked_at: Optional[dt.datetime], now: dt.datetime) -> dt.datetime:
+    # SQLite hands last_checked_at back naive; it was stored as UTC
+    return as_utc(last_checked_at) or (now - dt.timedelta(hours=24))
+
+
+async def _history_pages(full_name: str, since: dt.datetime, first_page: Optional[dict], source: str = GITHUB) -> AsyncIterator[dict]:
+    """Yield history pages, starting from a prefetched first page when one is given."""
+    if first_page is None:
+        async for page in iter_commit_pages(full_name, since, source=source):
+            yield page
+        return
+    yield first_page
+    if first_page.get("has_next_page") and first_page.get("end_cursor"):
+        async for page in iter_commit_pages(full_name, since, after=first_page["end_cursor"], source=source):
+            yield page
+
+
+async def _write_commits(session: AsyncSession, repo: Repository, commits: Iterable[dict]) -> list[dict]:
+    """Bulk-insert a page of commits and queue their file fetches; returns the new commits."""
+    commits = list(commits)
+    new_ids = await insert_commits(session, repo.id, commits)  # type: ignore[arg-type]
+    # Per-file details are filled in behind ingestion by the file queue workers
+    await enqueue_file_jobs(session, new_ids.values())
+    return [c for c in commits if c["sha"] in new_ids]
+
+
+# Newest commits included in a live-stream delta; the rest are only counted.
+STREAM_MAX_COMMITS = 20
+# Commits buffered by ingest_repo's network phase before a write transaction applies them.
+WRITE_BATCH_COMMITS = 1000
+
+
+async def _publish_delta(session: AsyncSession, repo: Repository, new_commits: list[dict], new: int) -> Optional[dict]:
+    """Push a compact update for this repo to /stream subscribers; returns the event.
+
+    Built only when someone can receive it: a subscriber here, or other processes via the relay.
+    """
+    if get_broadcaster().subscriber_count == 0 and not get_settings().event_relay:
+        return None
     now = dt.datetime.now(dt.timezone.utc)
-    since = repo.last_checked_at or (now - dt.timedelta(hours=24))
+    counts = {}
+    for value in ("6h", "24h", "7d"):
+        w = Window.from_str(value)
+        totals = await window_totals(session, now - dt.timedelta(seconds=w.seconds), repo_id=repo.id, now=now)
+        counts[w.value] = totals.get(repo.id, (0, 0, 0))[0]
+    event = {
+        "type": "ingest",
+        "repo_id": repo.id,
+        "full_name": repo.full_name,
+        "last_checked_at": repo.last_checked_at,
+        "new_count": new,
+        "new_commits": [
+            {
+                "sha": c["sha"],
+                "committed_at": c["committed_at"],
+                "message": (c.get("message") or "").split("\n", 1)[0],
+                "author_login": c.get("author_login"),
+                "additions": int(c.get("additions", 0)),
+                "deletions": int(c.get("deletions", 0)),
+            }
+            for c in new_commits
+        ],
+        "commits_count": counts,
+    }
+    publish(event)
+    return event
+
 
+async def _end_transaction(session: AsyncSession) -> None:
+    """Close the session's open (read) transaction before network I/O.
+
+    On SQLite even a read transaction keeps a lock that a writer's commit has to wait for,
+    so nothing may stay open while waiting on GitHub or git.
+    """
+    if session.in_transaction():
+        await session.commit()
+
+
+async def ingest_repo(
+    session: AsyncSession,
+    repo: Repository,
+    payload: Optional[dict] = None,
+    now: Optional[dt.datetime] = None,
+    since: Optional[dt.datetime] = None,
+) -> int:
+    """Ingest new commits for a single repository.
+
+    History comes from the repo's engine (`source`: GitHub API or local git mirror). The work
+    is split in two phases: a network phase that buffers history pages with no transaction
+    open, and a short write phase that applies them in one transaction. A backlog larger
+    than WRITE_BATCH_COMMITS is written in several such transactions, so memory stays bounded.
+    `payload` may be a prefetched first page (see fetch_commits_batch); `now` must then be the
+    time taken before that fetch, since it becomes the next `since`. `since` overrides the
+    start of the history walk (webhooks pass the oldest pushed commit). `last_checked_at` only
+    advances in the final write, so an interrupted run is retried from the same point.
+    Raises on GitHub/DB failures; callers decide how to isolate them.
+    """
+    full_name, started = repo.full_name, time.perf_counter()
     try:
-        payload = await fetch_commits_since(repo.full_name, since)
-    except Exception as e:
-        log.exception("Ingestion failed for %s: %s", repo.full_name, e)
-        return 0
+        new = await _ingest_repo(session, repo, payload, now, since)
+    finally:
+        INGEST_REPO_SECONDS.observe(time.perf_counter() - started, repo=full_name)
+    INGEST_NEW_COMMITS.inc(new, repo=full_name)
+    return new
 
-    repo.default_branch = payload.get("default_branch", repo.default_branch)
-    # repo.is_private may update but we keep existing if not provided
-    repo.is_private = bool(payload.get("is_private", repo.is_private))
+
+async def _ingest_repo(
+    session: AsyncSession,
+    repo: Repository,
+    payload: Optional[dict],
+    now: Optional[dt.datetime],
+    since: Optional[dt.datetime],
+) -> int:
+    now = now or dt.datetime.now(dt.timezone.utc)
+    since = since or _since_for(repo.last_checked_at, now)
+    full_name, source = repo.full_name, source_for(repo.source)
+    await _end_transaction(session)
 
     new = 0
-    for c in payload.get("commits", []):
-        committed_at = dt.datetime.fromisoformat(c["committed_at"].replace("Z", "+00:00"))
-        # Upsert by (repo_id, sha)
-        exists = await session.execute(
-            select(func.count(Commit.id)).where(Commit.repo_id == repo.id, Commit.sha == c["sha"])  # type: ignore[arg-type]
-        )
-        if exists.scalar_one() == 0:
-            commit = Commit(
-                repo_id=repo.id,  # type: ignore[arg-type]
-                sha=c["sha"],
-                author_name=c.get("author_name"),
-                author_login=c.get("author_login"),
-                committed_at=committed_at,
-                message=c.get("message", ""),
-                additions=int(c.get("additions", 0)),
-                deletions=int(c.get("deletions", 0)),
-                changed_files=int(c.get("changed_files", 0)),
-                url=c.get("url"),
-            )
-            session.add(commit)
-            await session.flush()  # assign commit.id
+    newest: list[dict] = []
+    latest: Optional[dt.datetime] = None
+    meta: Optional[dict] = None
+    buffered: list[dict] = []
 
-            # Fetch and persist per-file changes (REST)
-            try:
-                files_payload = await fetch_commit_files(repo.full_name, commit.sha)
-                for f in files_payload.get("files", []):
-                    session.add(
-                        CommitFile(
-                            commit_id=commit.id,  # type: ignore[arg-type]
-                            path=f.get("path") or "",
-                            status=f.get("status"),
-                            additions=int(f.get("additions", 0)),
-                            deletions=int(f.get("deletions", 0)),
-                            patch=f.get("patch"),
-                        )
-                    )
-            except Exception as e:
-                log.exception("Failed to fetch files for %s@%s: %s", repo.full_name, commit.sha, e)
+    async def write(commits: list[dict]) -> None:
+        nonlocal new, latest
+        written = await _write_commits(session, repo, commits)
+        new += len(written)
+        for c in written:
+            ts = parse_timestamp(c["committed_at"])
+            latest = ts if latest is None or ts > latest else latest
+        # pages arrive newest first, so the first ones seen are the newest
+        newest.extend(written[: STREAM_MAX_COMMITS - len(newest)])
 
-            new += 1
+    # Network phase: no transaction is open while pages are fetched.
+    async for page in _history_pages(full_name, since, payload, source=source):
+        meta = meta or page
+        buffered.extend(page.get("commits", []))
+        if len(buffered) >= WRITE_BATCH_COMMITS:
+            await write(buffered)
+            await session.commit()
+            buffered = []
 
+    # Write phase: remaining commits, repo metadata and the schedule in one transaction.
+    await write(buffered)
+    before = (repo.default_branch, repo.is_private, repo.last_checked_at is None)
+    if meta is not None:
+        repo.default_branch = meta.get("default_branch", repo.default_branch)
+        # repo.is_private may update but we keep existing if not provided
+        repo.is_private = bool(meta.get("is_private", repo.is_private))
+    changed = bool(new) or before != (repo.default_branch, repo.is_private, False)
     repo.last_checked_at = now
+    await record_poll(session, repo.id, now, newest_commit_at=latest)
     await session.commit()
-    log.info("Ingested %s: %s new commits", repo.full_name, new)
+    # An idle poll only moves last_checked_at; cached reads catch up with that at the TTL
+    # rather than every poll emptying every process's cache.
+    if changed:
+        bump_generation()
+        event = None
+        if new:
+            notify_pending()
+            event = await _publish_delta(session, repo, newest, new)
+        # ... in the other processes too (a separate worker, or the other uvicorn workers)
+        await record_event(session, event)
+    await _end_transaction(session)
+    log.info("Ingested %s: %s new commits", full_name, new)
     return new
 
 
-async def ingest_all(session: AsyncSession) -> int:
-    await ensure_allowlisted_repos(session)
-    res = await session.execute(select(Repository).where(Repository.enabled == True))  # noqa: E712
-    repos = res.scalars().all()
-    count = 0
-    for r in repos:
-        count += await ingest_repo(session, r)
-    return count
+async def _ingest_one(
+    session_factory: async_sessionmaker,
+    repo_id: int,
+    sem: asyncio.Semaphore,
+    stats: IngestStats,
+    payload: Optional[dict] = None,
+    now: Optional[dt.datetime] = None,
+) -> None:
+    # Each task gets its own session so a failing repo rolls back only its own writes.
+    async with sem:
+        async with session_factory() as session:
+            repo = await session.get(Repository, repo_id)
+            if repo is None:
+                return
+            try:
+                new = await ingest_repo(session, repo, payload=payload, now=now)
+            except Exception as e:
+                log.exception("Ingestion failed for %s: %s", repo.full_name, e)
+                stats.repos_failed += 1
+                return
+    stats.repos_done += 1
+    stats.new_commits += new
+
+
+async def ingest_all(
+    session_factory: async_sessionmaker,
+    concurrency: Optional[int] = None,
+    repo_ids: Optional[Iterable[int]] = None,
+) -> IngestStats:
+    """Ingest all enabled repositories, or just `repo_ids` (the adaptive scheduler's due repos).
+
+    History for every GitHub-sourced repo is fetched with batched GraphQL queries (git-mirror
+    repos read their own history), then the per-repo writes run up to `concurrency` at once.
+    """
+    if INGEST_TICKS_RUNNING.value() > 0:
+        INGEST_TICK_OVERLAPS.inc()
+    INGEST_TICKS_RUNNING.inc()
+    started = time.perf_counter()
+    try:
+        return await _ingest_all(session_factory, concurrency, repo_ids, started)
+    finally:
+        INGEST_TICKS_RUNNING.dec()
+        INGEST_TICK_SECONDS.observe(time.perf_counter() - started)
+
+
+async def _ingest_all(
+    session_factory: async_sessionmaker,
+    concurrency: Optional[int],
+    repo_ids: Optional[Iterable[int]],
+    started: float,
+) -> IngestStats:
+    limit = max(1, concurrency or get_settings().ingest_concurrency)
+
+    async with session_factory() as session:
+        stmt = select(Repository.id, Repository.full_name, Repository.last_checked_at, Repository.source).where(
+            Repository.enabled == True  # noqa: E712
+        )
+        if repo_ids is None:
+            await ensure_allowlisted_repos(session)
+        else:
+            # the scheduler syncs the repo list on its own cadence
+            stmt = stmt.where(Repository.id.in_(list(repo_ids)))
+        res = await session.execute(stmt)
+        targets = res.all()
+
+    stats = IngestStats(repos_total=len(targets))
+    now = dt.datetime.now(dt.timezone.utc)
+    via_api = [t for t in targets if source_for(t.source) == GITHUB]
+    batch = await fetch_commits_batch([(t.full_name, _since_for(t.last_checked_at, now)) for t in via_api])
+    for full_name, error in batch.errors.items():
+        log.error("Ingestion failed for %s: %s", full_name, error)
+    stats.repos_failed += len(batch.errors)
+
+    sem = asyncio.Semaphore(limit)
+    await asyncio.gather(
+        *(
+            _ingest_one(session_factory, t.id, sem, stats, payload=batch.payloads.get(t.full_name), now=now)
+            for t in targets
+            if t.full_name in batch.payloads or source_for(t.source) != GITHUB
+        )
+    )
+    stats.wall_time_s = round(time.perf_counter() - started, 3)
+    log.info(
+        "Ingest tick: %s/%s repos done, %s failed, %s new commits in %.2fs",
+        stats.repos_done,
+        stats.repos_total,
+        stats.repos_failed,
+        stats.new_commits,
+        stats.wall_time_s,
+    )
+    return stats
 
 
 async def ensure_commit_files(session: AsyncSession, repo: Repository, commit: Commit) -> int:
     """Ensure CommitFile rows exist for the given commit; fetch if missing.
 
+    Used on the request path, so it fetches right away instead of waiting for the file queue,
+    and clears the commit's queued job. Concurrent viewers of the same commit share one fetch.
     Returns the number of files added.
     """
     res = await session.execute(select(func.count(CommitFile.id)).where(CommitFile.commit_id == commit.id))
     if int(res.scalar_one() or 0) > 0:
         return 0
+    await _end_transaction(session)
+    # written through a session of its own, which outlives this request if it is cancelled
+    factory = async_sessionmaker(session.bind, expire_on_commit=False, class_=AsyncSession)
     try:
-        payload = await fetch_commit_files(repo.full_name, commit.sha)
-        added = 0
-        for f in payload.get("files", []):
-            session.add(
-                CommitFile(
-                    commit_id=commit.id,  # type: ignore[arg-type]
-                    path=f.get("path") or "",
-                    status=f.get("status"),
-                    additions=int(f.get("additions", 0)),
-                    deletions=int(f.get("deletions", 0)),
-                    patch=f.get("patch"),
-                )
-            )
-            added += 1
-        await session.commit()
-        return added
+        return await load_commit_files(factory, repo.id, repo.full_name, repo.source, commit.id, commit.sha)
     except Exception as e:
         log.exception("ensure_commit_files failed for %s@%s: %s", repo.full_name, commit.sha, e)
         return 0
 
 
-def start_scheduler(job_func, session_factory) -> AsyncIOScheduler:
+# How often the fixed-interval scheduler looks for polls requested by other processes.
+REQUESTED_POLL_CHECK_SECONDS = 30
+
+
+async def ingest_requested(session_factory: async_sessionmaker) -> Optional[IngestStats]:
+    """Poll repos whose poll was requested through `request_poll`; None when there are none."""
+    async with session_factory() as session:
+        res = await session.execute(select(RepoSchedule.repo_id).where(RepoSchedule.poll_requested_at.is_not(None)))
+        repo_ids = res.scalars().all()
+    if not repo_ids:
+        return None
+    return await ingest_all(session_factory, repo_ids=repo_ids)
+
+
+# The running app's scheduler, if any.
+_scheduler: Optional[AsyncIOScheduler | AdaptiveScheduler] = None
+
+
+def start_scheduler(job_func, session_factory) -> Optional[AsyncIOScheduler | AdaptiveScheduler]:
+    """Start polling: per-repo adaptive intervals (SCHEDULER_MODE=adaptive) or one fixed-interval job."""
+    global _scheduler
     settings = get_settings()
+    if not settings.scheduler_enabled:
+        return None
+    if settings.scheduler_mode == "adaptive":
+        _scheduler = AdaptiveScheduler(job_func, session_factory, sync_repos=ensure_allowlisted_repos)
+        _scheduler.start()
+        return _scheduler
+
     sched = AsyncIOScheduler()
 
     async def _runner():
-        async with session_factory() as session:
-            await job_func(session)
+        await job_func(session_factory)
 
-    if settings.scheduler_enabled:
-        sched.add_job(_runner, "interval", minutes=settings.scheduler_interval_minutes, id="ingest")
-        sched.start()
+    # With webhooks delivering pushes, polling is only a safety net for missed deliveries.
+    minutes = settings.webhook_poll_interval_minutes if settings.github_webhook_secret else settings.scheduler_interval_minutes
+    sched.add_job(_runner, "interval", minutes=minutes, id="ingest")
+    if settings.github_webhook_secret:
+        # pushes received by non-leader processes only mark the repo; poll those without
+        # waiting for the next full interval (the adaptive scheduler treats them as due)
+        sched.add_job(ingest_requested, "interval", seconds=REQUESTED_POLL_CHECK_SECONDS, args=[session_factory], id="requested")
+    # a run due while the previous one is still going is skipped by APScheduler
+    sched.add_listener(lambda _event: INGEST_TICK_OVERLAPS.inc(), EVENT_JOB_MAX_INSTANCES)
+    sched.start()
+    _scheduler = sched
     return sched
+
+
+async def stop_scheduler() -> None:
+    global _scheduler
+    if isinstance(_scheduler, AdaptiveScheduler):
+        await _scheduler.stop()
+    elif _scheduler is not None:
+        _scheduler.shutdown(wait=False)
+    _scheduler = None
+
+
+async def start_ingestion(session_factory: async_sessionmaker) -> None:
+    """Start what the ingestion leader runs: file fetches and backfill slices, then the scheduler."""
+    start_file_queue(session_factory)
+    start_backfill_runner(session_factory)
+    start_scheduler(ingest_all, session_factory)
+
+
+async def stop_ingestion() -> None:
+    await stop_scheduler()
+    await stop_backfill_runner()
+    await stop_file_queue()
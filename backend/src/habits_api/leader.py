@@ -0,0 +1,245 @@
+"""Single-leader election so only one process ingests.
+
+With several uvicorn workers or replicas, every process serves reads but only the holder of
+the `ingest` lease runs the scheduler and the file queue. The lease is a row in `leases`
+renewed every TTL/3; if the leader dies, another process takes over once the row expires,
+so failover takes at most about TTL + TTL/3. A file lock (`LEADER_ELECTION=file`) does the
+same for processes on one host, released by the OS when the holder exits.
+"""
+from __future__ import annotations
+
+import asyncio
+import datetime as dt
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from sqlalchemy import or_, select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from .config import get_settings
+from .db import Lease, dialect_insert
+
+log = logging.getLogger(__name__)
+
+LEASE_NAME = "ingest"
+
+Callback = Callable[[], Awaitable[None]]
+
+
+def holder_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class DbLease:
+    """A named lease row; whoever renews it before `expires_at` keeps it."""
+
+    def __init__(self, session_factory: async_sessionmaker, ttl_seconds: float, name: str = LEASE_NAME, holder: Optional[str] = None) -> None:
+        self.session_factory = session_factory
+        self.ttl = ttl_seconds
+        self.name = name
+        self.holder = holder or holder_id()
+
+    async def try_acquire(self, now: Optional[dt.datetime] = None) -> bool:
+        """Take or renew the lease; returns whether this process holds it afterwards."""
+        now = now or dt.datetime.now(dt.timezone.utc)
+        expires = now + dt.timedelta(seconds=self.ttl)
+        table = Lease.__table__
+        async with self.session_factory() as session:
+            res = await session.execute(
+                update(table)
+                .where(table.c.name == self.name, or_(table.c.holder == self.holder, table.c.expires_at < now))
+                .values(holder=self.holder, expires_at=expires, renewed_at=now)
+            )
+            held = res.rowcount == 1
+            if not held:
+                res = await session.execute(
+                    dialect_insert(session, table).on_conflict_do_nothing(index_elements=["name"]),
+                    [{"name": self.name, "holder": self.holder, "expires_at": expires, "renewed_at": now}],
+                )
+                held = res.rowcount == 1
+            await session.commit()
+        return held
+
+    async def release(self) -> None:
+        table = Lease.__table__
+        async with self.session_factory() as session:
+            await session.execute(
+                update(table)
+                .where(table.c.name == self.name, table.c.holder == self.holder)
+                .values(expires_at=dt.datetime.now(dt.timezone.utc) - dt.timedelta(seconds=1))
+            )
+            await session.commit()
+
+    async def current(self) -> Dict[str, Any]:
+        async with self.session_factory() as session:
+            row = (await session.execute(select(Lease).where(Lease.name == self.name))).scalar_one_or_none()
+        if row is None:
+            return {"holder": None, "expires_at": None}
+        return {"holder": row.holder, "expires_at": row.expires_at}
+
+
+class FileLease:
+    """An exclusive flock on a file; the OS drops it when the process exits."""
+
+    def __init__(self, path: str, holder: Optional[str] = None) -> None:
+        self.path = path
+        self.holder = holder or holder_id()
+        self._fd: Optional[int] = None
+
+    async def try_acquire(self, now: Optional[dt.datetime] = None) -> bool:
+        import fcntl
+
+        if self._fd is not None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, self.holder.encode())
+        self._fd = fd
+        return True
+
+    async def release(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)  # closing drops the flock
+            self._fd = None
+
+    async def current(self) -> Dict[str, Any]:
+        try:
+            with open(self.path) as f:
+                holder = f.read().strip() or None
+        except FileNotFoundError:
+            holder = None
+        return {"holder": holder, "expires_at": None}
+
+
+class LeaderElection:
+    """Keeps trying to hold a lease and runs callbacks when leadership changes.
+
+    `on_elected` starts the ingestion machinery, `on_demoted` stops it. A leader that cannot
+    renew (DB unreachable) steps down before its lease can expire, so two processes never
+    believe they lead at once.
+    """
+
+    def __init__(self, lease: Any, ttl_seconds: float, on_elected: Callback, on_demoted: Callback) -> None:
+        self.lease = lease
+        self.ttl = ttl_seconds
+        self.renew_every = ttl_seconds / 3
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.is_leader = False
+        self._renewed_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def step(self) -> bool:
+        """One acquire/renew attempt; returns leadership afterwards."""
+        try:
+            held = await self.lease.try_acquire()
+        except Exception as e:
+            log.warning("Leader lease renewal failed: %s", e)
+            # keep leading only while our last renewal is certainly still valid
+            held = self.is_leader and time.monotonic() - self._renewed_at < self.ttl - self.renew_every
+        else:
+            if held:
+                self._renewed_at = time.monotonic()
+        if held and not self.is_leader:
+            self.is_leader = True
+            log.info("Elected ingestion leader (%s)", self.lease.holder)
+            await self.on_elected()
+        elif not held and self.is_leader:
+            self.is_leader = False
+            log.warning("Lost ingestion leadership (%s)", self.lease.holder)
+            await self.on_demoted()
+        return self.is_leader
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.step()
+            except Exception as e:
+                log.exception("Leader election step failed: %s", e)
+            await asyncio.sleep(self.renew_every)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.is_leader:
+            self.is_leader = False
+            await self.on_demoted()
+            # let a standby take over right away instead of waiting for expiry
+            try:
+                await self.lease.release()
+            except Exception as e:
+                log.warning("Releasing leader lease failed: %s", e)
+
+    async def status(self) -> Dict[str, Any]:
+        return {"is_leader": self.is_leader, "this_process": self.lease.holder, **await self.lease.current()}
+
+
+# The running app's election, if any; None means this process always leads, unless it
+# opted out of ingestion altogether (an API server with INGEST_IN_API=false).
+_election: Optional[LeaderElection] = None
+_ingests = True
+
+
+async def start_leader_election(
+    session_factory: async_sessionmaker, on_elected: Callback, on_demoted: Callback, ingests: bool = True
+) -> Optional[LeaderElection]:
+    """Start per LEADER_ELECTION: `db` lease row, `file` lock, or `none` (lead unconditionally).
+
+    With `ingests=False` this process never leads and no callback runs; a separate worker
+    process (`python -m habits_api.worker`) holds the lease instead.
+    """
+    global _election, _ingests
+    settings = get_settings()
+    _ingests = ingests
+    if not ingests:
+        return None
+    mode = settings.leader_election
+    if mode == "none":
+        await on_elected()
+        return None
+    ttl = settings.leader_lease_ttl_seconds
+    if mode == "file":
+        lease: Any = FileLease(settings.leader_lock_file)
+    elif mode == "db":
+        lease = DbLease(session_factory, ttl)
+    else:
+        raise ValueError(f"unknown LEADER_ELECTION {mode!r}")
+    _election = LeaderElection(lease, ttl, on_elected, on_demoted)
+    # decide before startup finishes, so a lone process starts ingesting immediately
+    await _election.step()
+    _election.start()
+    return _election
+
+
+async def stop_leader_election(on_demoted: Callback) -> None:
+    global _election, _ingests
+    if _election is None:
+        if _ingests:
+            await on_demoted()
+        _ingests = True
+        return
+    await _election.stop()
+    _election = None
+
+
+def is_leader() -> bool:
+    return _ingests and (_election is None or _election.is_leader)
+
+
+def get_election() -> Optional[LeaderElection]:
+    return _election
@@ -0,0 +1,28 @@
+"""Opaque keyset cursors for newest-first listings ordered by (committed_at, id)."""
+from __future__ import annotations
+
+import base64
+import binascii
+import datetime as dt
+from typing import Tuple
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(committed_at: dt.datetime, row_id: int) -> str:
+    """Cursor pointing just past the row (`committed_at`, `row_id`); times are UTC."""
+    if committed_at.tzinfo is not None:
+        committed_at = committed_at.astimezone(dt.timezone.utc).replace(tzinfo=None)
+    raw = f"{committed_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[dt.datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        stamp, row_id = raw.rsplit("|", 1)
+        return dt.datetime.fromisoformat(stamp).replace(tzinfo=dt.timezone.utc), int(row_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise InvalidCursor(f"invalid cursor: {cursor!r}") from e
@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import datetime as dt
+import hashlib
+import zlib
+from typing import Any, Dict, Iterable, Optional
+
+from sqlalchemy import bindparam, delete, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .db import CommitFile, PatchBlob, dialect_insert
+
+CODEC = "zlib"
+# keep IN (...) lists well under SQLite's bound-parameter limit
+_LOOKUP_CHUNK = 500
+# gc leaves blobs younger than this alone: they may belong to a write still in progress
+GC_GRACE_SECONDS = 3600
+
+
+def compress_patch(patch: str) -> bytes:
+    return zlib.compress(patch.encode("utf-8"), 6)
+
+
+def decompress_patch(codec: str, data: bytes) -> str:
+    if codec != CODEC:
+        raise ValueError(f"unknown patch codec {codec!r}")
+    return zlib.decompress(data).decode("utf-8")
+
+
+def patch_hash(patch: str) -> str:
+    return hashlib.sha256(patch.encode("utf-8")).hexdigest()
+
+
+async def _blob_ids_by_hash(session: AsyncSession, hashes: Iterable[str]) -> Dict[str, int]:
+    hashes = list(hashes)
+    found: Dict[str, int] = {}
+    for i in range(0, len(hashes), _LOOKUP_CHUNK):
+        res = await session.execute(select(PatchBlob.hash, PatchBlob.id).where(PatchBlob.hash.in_(hashes[i:i + _LOOKUP_CHUNK])))
+        found.update(dict(res.all()))
+    return found
+
+
+async def store_patches(session: AsyncSession, patches: Iterable[str]) -> list[int]:
+    """Return blob ids for the given patch texts (same order), storing each distinct text once.
+
+    Blobs are keyed by the sha256 of the text, so a patch already stored for another repo,
+    fork or cherry-pick is only hashed and looked up, never compressed or written again.
+    """
+    patches = list(patches)
+    hashes = [patch_hash(p) for p in patches]
+    if not hashes:
+        return []
+    text_by_hash = dict(zip(hashes, patches))
+    ids = await _blob_ids_by_hash(session, text_by_hash)
+    missing = [h for h in text_by_hash if h not in ids]
+    if missing:
+        rows = [{"hash": h, "codec": CODEC, "data": compress_patch(text_by_hash[h])} for h in missing]
+        # DO NOTHING covers a concurrent writer storing the same text between lookup and insert
+        stmt = dialect_insert(session, PatchBlob.__table__).on_conflict_do_nothing(index_elements=["hash"])
+        await session.execute(stmt, rows)
+        ids.update(await _blob_ids_by_hash(session, missing))
+    return [ids[h] for h in hashes]
+
+
+async def attach_blobs(session: AsyncSession, blob_by_file: Dict[int, int]) -> None:
+    """Point commit_files rows at their blobs and drop any legacy inline text."""
+    if not blob_by_file:
+        return
+    table = CommitFile.__table__
+    stmt = update(table).where(table.c.id == bindparam("file_id")).values(patch_blob_id=bindparam("blob_id"), patch=None)
+    await session.execute(stmt, [{"file_id": fid, "blob_id": bid} for fid, bid in blob_by_file.items()])
+
+
+async def load_patches(session: AsyncSession, files: Iterable[CommitFile]) -> Dict[int, Optional[str]]:
+    """Return {commit_file id: patch text}, decompressing blobs and reading legacy inline text."""
+    files = list(files)
+    out: Dict[int, Optional[str]] = {}
+    files_by_blob: Dict[int, list[int]] = {}
+    for f in files:
+        if f.patch_blob_id is not None:
+            files_by_blob.setdefault(f.patch_blob_id, []).append(f.id)
+    if files_by_blob:
+        res = await session.execute(select(PatchBlob.id, PatchBlob.codec, PatchBlob.data).where(PatchBlob.id.in_(files_by_blob)))
+        for blob_id, codec, data in res.all():
+            text = decompress_patch(codec, data)
+            for file_id in files_by_blob[blob_id]:
+                out[file_id] = text
+    legacy = [f.id for f in files if f.patch_blob_id is None]
+    if legacy:
+        res = await session.execute(select(CommitFile.id, CommitFile.patch).where(CommitFile.id.in_(legacy)))
+        out.update(dict(res.all()))
+    return out
+
+
+async def migrate_patches(session: AsyncSession, batch_size: int = 500) -> int:
+    """Move legacy inline `commit_files.patch` text into compressed blobs; returns rows moved.
+
+    Commits after every batch, so it can be interrupted and re-run.
+    """
+    moved = 0
+    while True:
+        res = await session.execute(
+            select(CommitFile.id, CommitFile.patch)
+            .where(CommitFile.patch.is_not(None), CommitFile.patch_blob_id.is_(None))
+            .limit(batch_size)
+        )
+        rows = res.all()
+        if not rows:
+            return moved
+        blob_ids = await store_patches(session, [patch for _, patch in rows])
+        await attach_blobs(session, {fid: bid for (fid, _), bid in zip(rows, blob_ids)})
+        await session.commit()
+        moved += len(rows)
+
+
+async def dedupe_patches(session: AsyncSession, batch_size: int = 500) -> int:
+    """Hash blobs written before dedup and fold duplicates into one blob; returns blobs removed.
+
+    Commits after every batch, so it can be interrupted and re-run.
+    """
+    removed = 0
+    files = CommitFile.__table__
+    while True:
+        res = await session.execute(
+            select(PatchBlob.id, PatchBlob.codec, PatchBlob.data).where(PatchBlob.hash.is_(None)).order_by(PatchBlob.id).limit(batch_size)
+        )
+        rows = res.all()
+        if not rows:
+            return removed
+        hash_by_id = {bid: patch_hash(decompress_patch(codec, data)) for bid, codec, data in rows}
+        keep = await _blob_ids_by_hash(session, set(hash_by_id.values()))
+        repoint: Dict[int, int] = {}
+        for bid, h in hash_by_id.items():
+            if h in keep:
+                repoint[bid] = keep[h]
+            else:
+                keep[h] = bid
+        named = [{"blob_id": bid, "blob_hash": h} for bid, h in hash_by_id.items() if bid not in repoint]
+        if named:
+            await session.execute(
+                update(PatchBlob.__table__).where(PatchBlob.__table__.c.id == bindparam("blob_id")).values(hash=bindparam("blob_hash")),
+                named,
+            )
+        if repoint:
+            await session.execute(
+                update(files).where(files.c.patch_blob_id == bindparam("old_id")).values(patch_blob_id=bindparam("new_id")),
+                [{"old_id": old, "new_id": new} for old, new in repoint.items()],
+            )
+            await session.execute(delete(PatchBlob).where(PatchBlob.id.in_(repoint)))
+            removed += len(repoint)
+        await session.commit()
+
+
+async def gc_patches(session: AsyncSession, grace_seconds: float = GC_GRACE_SECONDS) -> int:
+    """Delete blobs no commit_files row references any more; returns blobs deleted.
+
+    Sweeping is used instead of per-blob reference counts because file rows also disappear
+    through ON DELETE CASCADE, which would bypass any counter maintained in Python.
+
+    A blob is stored before the file rows pointing at it, so blobs created in the last
+    `grace_seconds` are kept. Storing can also reuse an old unreferenced blob found by hash;
+    a sweep landing between that lookup and the file write would leave the file without its
+    patch (the foreign key is SET NULL). Run it while ingestion is idle to rule that out.
+    """
+    cutoff = dt.datetime.now(dt.timezone.utc) - dt.timedelta(seconds=grace_seconds)
+    referenced = select(CommitFile.patch_blob_id).where(CommitFile.patch_blob_id.is_not(None))
+    res = await session.execute(
+        delete(PatchBlob).where(
+            PatchBlob.id.not_in(referenced),
+            or_(PatchBlob.created_at.is_(None), PatchBlob.created_at < cutoff),
+        )
+    )
+    await session.commit()
+    return res.rowcount or 0
+
+
+async def patch_dedup_report(session: AsyncSession) -> Dict[str, Any]:
+    """How much sharing blobs saves: file patches vs distinct stored blobs, and bytes."""
+    file_patches = (await session.execute(select(func.count()).where(CommitFile.patch_blob_id.is_not(None)))).scalar_one()
+    distinct_blobs, stored_bytes = (
+        await session.execute(select(func.count(PatchBlob.id), func.coalesce(func.sum(func.length(PatchBlob.data)), 0)))
+    ).one()
+    referenced_bytes = (
+        await session.execute(
+            select(func.coalesce(func.sum(func.length(PatchBlob.data)), 0)).select_from(CommitFile).join(
+                PatchBlob, PatchBlob.id == CommitFile.patch_blob_id
+            )
+        )
+    ).scalar_one()
+    return {
+        "file_patches": file_patches,
+        "distinct_blobs": distinct_blobs,
+        "dedup_ratio": round(file_patches / distinct_blobs, 3) if distinct_blobs else None,
+        "stored_bytes": stored_bytes,
+        "referenced_bytes": referenced_bytes,
+    }
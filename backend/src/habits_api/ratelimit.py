@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import asyncio
+import datetime as dt
+import logging
+import time
+from typing import Any, Dict, Mapping, Optional
+
+import httpx
+
+from .config import get_settings
+from .telemetry import GITHUB_RATELIMIT_REMAINING, REGISTRY
+
+log = logging.getLogger(__name__)
+
+GRAPHQL = "graphql"
+REST = "rest"
+
+# Used when GitHub signals a secondary limit without saying how long to back off.
+DEFAULT_SECONDARY_WAIT_SECONDS = 60.0
+
+
+class Budget:
+    """One GitHub rate-limit budget: the server-reported quota plus a local token bucket."""
+
+    def __init__(self, kind: str, rate_per_second: float, burst: int, reserve: int) -> None:
+        self.kind = kind
+        self.rate = max(rate_per_second, 0.001)
+        self.capacity = float(max(burst, 1))
+        self.reserve = reserve
+        self.tokens = self.capacity
+        self.refilled_at = time.monotonic()
+        self.limit: Optional[int] = None
+        self.remaining: Optional[int] = None
+        self.reset_at: Optional[dt.datetime] = None
+        self.blocked_until: Optional[dt.datetime] = None
+        self.lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.refilled_at) * self.rate)
+        self.refilled_at = now
+
+    def wait_seconds(self) -> float:
+        """How long the next request has to wait; 0 when it may go now."""
+        now = dt.datetime.now(dt.timezone.utc)
+        waits = [0.0]
+        if self.blocked_until and self.blocked_until > now:
+            waits.append((self.blocked_until - now).total_seconds())
+        if self.remaining is not None and self.remaining <= self.reserve and self.reset_at and self.reset_at > now:
+            waits.append((self.reset_at - now).total_seconds())
+        self._refill()
+        if self.tokens < 1:
+            waits.append((1 - self.tokens) / self.rate)
+        return max(waits)
+
+    def take(self) -> None:
+        self.tokens -= 1
+        if self.remaining is not None:
+            self.remaining -= 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        self._refill()
+        return {
+            "limit": self.limit,
+            "remaining": self.remaining,
+            "reset_at": self.reset_at,
+            "blocked_until": self.blocked_until,
+            "tokens": round(self.tokens, 2),
+            "rate_per_second": self.rate,
+        }
+
+
+class RateGovernor:
+    """Paces GitHub calls and parks them until quota returns instead of failing.
+
+    GraphQL and REST have separate budgets. Each request first waits in `acquire` for the
+    token bucket, for a primary-quota reset when `remaining` is at the reserve, and for any
+    secondary-limit block. Responses then feed `observe` with what GitHub reports.
+    """
+
+    def __init__(self, graphql: Budget, rest: Budget) -> None:
+        self.budgets = {GRAPHQL: graphql, REST: rest}
+
+    @classmethod
+    def from_settings(cls) -> "RateGovernor":
+        s = get_settings()
+        return cls(
+            Budget(GRAPHQL, s.github_graphql_rate_per_second, s.github_rate_burst, s.github_rate_reserve),
+            Budget(REST, s.github_rest_rate_per_second, s.github_rate_burst, s.github_rate_reserve),
+        )
+
+    async def acquire(self, kind: str) -> None:
+        budget = self.budgets[kind]
+        async with budget.lock:
+            while True:
+                wait = budget.wait_seconds()
+                if wait <= 0:
+                    break
+                if wait > 1:
+                    log.info("GitHub %s budget exhausted; sleeping %.0fs", kind, wait)
+                await asyncio.sleep(wait)
+            budget.take()
+
+    def observe(self, kind: str, resp: httpx.Response) -> bool:
+        """Update the budget from X-RateLimit-*/Retry-After headers.
+
+        Returns True when the response was a rate-limit rejection worth retrying later.
+        """
+        budget = self.budgets[kind]
+        headers = resp.headers
+        if "x-ratelimit-remaining" in headers:
+            try:
+                budget.remaining = int(headers["x-ratelimit-remaining"])
+                budget.limit = int(headers.get("x-ratelimit-limit", budget.limit or 0)) or budget.limit
+                if "x-ratelimit-reset" in headers:
+                    budget.reset_at = dt.datetime.fromtimestamp(int(headers["x-ratelimit-reset"]), dt.timezone.utc)
+            except ValueError:
+                log.debug("Unparseable rate-limit headers: %s", dict(headers))
+
+        if resp.status_code not in (403, 429):
+            return False
+        now = dt.datetime.now(dt.timezone.utc)
+        retry_after = headers.get("retry-after")
+        if retry_after is not None:
+            try:
+                budget.blocked_until = now + dt.timedelta(seconds=float(retry_after))
+            except ValueError:
+                budget.blocked_until = now + dt.timedelta(seconds=DEFAULT_SECONDARY_WAIT_SECONDS)
+            return True
+        if budget.remaining == 0:
+            return True  # primary quota gone; acquire() waits for reset_at
+        if resp.status_code == 429 or "rate limit" in resp.text.lower():
+            budget.blocked_until = now + dt.timedelta(seconds=DEFAULT_SECONDARY_WAIT_SECONDS)
+            return True
+        return False  # an ordinary 403 (permissions)
+
+    def observe_graphql(self, rate_limit: Optional[Mapping[str, Any]]) -> None:
+        """Record the `rateLimit { remaining resetAt }` object from a GraphQL response."""
+        if not rate_limit:
+            return
+        budget = self.budgets[GRAPHQL]
+        if rate_limit.get("remaining") is not None:
+            budget.remaining = int(rate_limit["remaining"])
+        if rate_limit.get("resetAt"):
+            budget.reset_at = dt.datetime.fromisoformat(str(rate_limit["resetAt"]).replace("Z", "+00:00"))
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {kind: b.snapshot() for kind, b in self.budgets.items()}
+
+
+_governor: Optional[RateGovernor] = None
+
+
+def get_governor() -> RateGovernor:
+    global _governor
+    if _governor is None:
+        _governor = RateGovernor.from_settings()
+    return _governor
+
+
+def _export_remaining() -> None:
+    if _governor is None:
+        return
+    for kind, budget in _governor.budgets.items():
+        if budget.remaining is not None:
+            GITHUB_RATELIMIT_REMAINING.set(budget.remaining, kind=kind)
+
+
+REGISTRY.on_collect(_export_remaining)
@@ -0,0 +1,148 @@
+"""Cross-process delivery of cache invalidations and /stream events through the database.
+
+The response cache and the /stream broadcaster are per process, so writes made by another
+process (a standalone worker, or the leader among several uvicorn workers) would go unseen
+until the cache TTL. The ingesting process appends a row to `ingest_events` after each write;
+every API process tails the table and replays new rows locally: one cache generation bump per
+batch, and each carried event to its /stream subscribers. Rows a process wrote itself are
+skipped, since it applied them when it wrote them. Rows older than RETENTION_SECONDS are
+pruned by the tailers.
+"""
+from __future__ import annotations
+
+import asyncio
+import datetime as dt
+import json
+import logging
+import os
+import socket
+import uuid
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Set
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from .cache import bump_generation
+from .config import get_settings
+from .db import IngestEvent
+from .events import publish
+
+log = logging.getLogger(__name__)
+
+# identifies this process's own rows
+ORIGIN = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+RETENTION_SECONDS = 3600
+# ids are re-read this far behind the newest seen: on Postgres a lower id can commit after a higher one
+LOOKBACK_IDS = 100
+PRUNE_EVERY_SECONDS = 300
+
+
+async def record_event(session: AsyncSession, event: Optional[Dict[str, Any]] = None) -> None:
+    """Tell other processes that data changed, with an optional /stream event; commits.
+
+    A no-op when EVENT_RELAY is off.
+    """
+    if not get_settings().event_relay:
+        return
+    payload = json.dumps(event, default=str, separators=(",", ":")) if event is not None else None
+    session.add(IngestEvent(origin=ORIGIN, payload=payload))
+    await session.commit()
+
+
+class EventRelay:
+    """Tails `ingest_events` and replays other processes' rows into this process."""
+
+    def __init__(self, session_factory: async_sessionmaker, poll_seconds: Optional[float] = None) -> None:
+        self.session_factory = session_factory
+        self.poll_seconds = poll_seconds or get_settings().event_relay_poll_seconds
+        self.origin = ORIGIN
+        self.last_id: Optional[int] = None
+        self._seen: Set[int] = set()
+        self._order: Deque[int] = deque()
+        self._pruned_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def step(self) -> int:
+        """Apply rows written since the last step; returns how many came from other processes."""
+        async with self.session_factory() as session:
+            if self.last_id is None:
+                # start from now: earlier writes are already in the database this process reads
+                self.last_id = (await session.execute(select(func.max(IngestEvent.id)))).scalar_one() or 0
+                res = await session.execute(select(IngestEvent.id).where(IngestEvent.id > self.last_id - LOOKBACK_IDS))
+                for row_id in res.scalars().all():
+                    self._remember(row_id)
+                return 0
+            res = await session.execute(
+                select(IngestEvent.id, IngestEvent.origin, IngestEvent.payload)
+                .where(IngestEvent.id > self.last_id - LOOKBACK_IDS)
+                .order_by(IngestEvent.id)
+            )
+            rows = [r for r in res.all() if r.id not in self._seen]
+            await self._maybe_prune(session)
+        applied = 0
+        for row in rows:
+            self._remember(row.id)
+            self.last_id = max(self.last_id, row.id)
+            if row.origin == self.origin:
+                continue
+            if applied == 0:
+                bump_generation()
+            applied += 1
+            if row.payload:
+                publish(json.loads(row.payload))
+        return applied
+
+    def _remember(self, row_id: int) -> None:
+        self._seen.add(row_id)
+        self._order.append(row_id)
+        while len(self._order) > LOOKBACK_IDS * 2:
+            self._seen.discard(self._order.popleft())
+
+    async def _maybe_prune(self, session: AsyncSession) -> None:
+        loop_now = asyncio.get_running_loop().time()
+        if loop_now - self._pruned_at < PRUNE_EVERY_SECONDS:
+            return
+        self._pruned_at = loop_now
+        cutoff = dt.datetime.now(dt.timezone.utc) - dt.timedelta(seconds=RETENTION_SECONDS)
+        await session.execute(delete(IngestEvent).where(IngestEvent.created_at < cutoff))
+        await session.commit()
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.step()
+            except Exception as e:
+                log.warning("Event relay poll failed: %s", e)
+            await asyncio.sleep(self.poll_seconds)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+# The running app's relay, if any.
+_relay: Optional[EventRelay] = None
+
+
+async def start_event_relay(session_factory: async_sessionmaker) -> Optional[EventRelay]:
+    global _relay
+    if not get_settings().event_relay:
+        return None
+    _relay = EventRelay(session_factory)
+    await _relay.step()  # take the starting position before serving
+    _relay.start()
+    return _relay
+
+
+async def stop_event_relay() -> None:
+    global _relay
+    if _relay is not None:
+        await _relay.stop()
+        _relay = None
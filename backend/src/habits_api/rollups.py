@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import datetime as dt
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import and_, delete, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .db import Commit, CommitRollup
+from .writes import floor_hour
+
+# (commits, additions, deletions)
+Totals = Tuple[int, int, int]
+
+
+def _hour_expr(session: AsyncSession):
+    """SQL expression truncating commits.committed_at to its UTC hour, per dialect."""
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        return func.date_trunc("hour", Commit.committed_at)
+    if dialect == "sqlite":
+        # Matches SQLAlchemy's SQLite DateTime storage format, so rows read back as datetimes.
+        return func.strftime("%Y-%m-%d %H:00:00.000000", Commit.committed_at)
+    raise NotImplementedError(f"rollups are not supported on {dialect!r}")
+
+
+async def rebuild_rollups(session: AsyncSession) -> int:
+    """Recompute every hourly rollup from the raw commits table; returns the number of rows."""
+    hour = _hour_expr(session)
+    await session.execute(delete(CommitRollup))
+    source = select(
+        Commit.repo_id,
+        hour.label("hour"),
+        func.count(Commit.id),
+        func.coalesce(func.sum(Commit.additions), 0),
+        func.coalesce(func.sum(Commit.deletions), 0),
+    ).group_by(Commit.repo_id, hour)
+    await session.execute(
+        CommitRollup.__table__.insert().from_select(["repo_id", "hour", "commits", "additions", "deletions"], source)
+    )
+    count = (await session.execute(select(func.count()).select_from(CommitRollup))).scalar_one()
+    await session.commit()
+    return int(count)
+
+
+async def rollups_missing(session: AsyncSession) -> bool:
+    """True when commits exist but no rollups do (e.g. a database from before rollups)."""
+    has_commits = (await session.execute(select(Commit.id).limit(1))).first() is not None
+    has_rollups = (await session.execute(select(CommitRollup.repo_id).limit(1))).first() is not None
+    return has_commits and not has_rollups
+
+
+async def window_totals(
+    session: AsyncSession,
+    since: dt.datetime,
+    repo_id: Optional[int] = None,
+    now: Optional[dt.datetime] = None,
+) -> Dict[int, Totals]:
+    """Per-repo (commits, additions, deletions) for commits at or after `since`.
+
+    Whole hours come from the rollups; only the partial hours at either end of the window
+    are read from raw commits, so the cost does not grow with history.
+    """
+    now = now or dt.datetime.now(dt.timezone.utc)
+    head_end = floor_hour(since)
+    if head_end != since:
+        head_end += dt.timedelta(hours=1)
+    tail_start = floor_hour(now)
+
+    totals: Dict[int, Totals] = {}
+
+    def _merge(rows) -> None:
+        for rid, c, a, d in rows:
+            pc, pa, pd = totals.get(rid, (0, 0, 0))
+            totals[rid] = (pc + int(c or 0), pa + int(a or 0), pd + int(d or 0))
+
+    raw_range = Commit.committed_at >= since
+    if head_end < tail_start:
+        rollup = (
+            select(
+                CommitRollup.repo_id,
+                func.sum(CommitRollup.commits),
+                func.sum(CommitRollup.additions),
+                func.sum(CommitRollup.deletions),
+            )
+            .where(CommitRollup.hour >= head_end, CommitRollup.hour < tail_start)
+            .group_by(CommitRollup.repo_id)
+        )
+        if repo_id is not None:
+            rollup = rollup.where(CommitRollup.repo_id == repo_id)
+        _merge((await session.execute(rollup)).all())
+        raw_range = or_(
+            and_(Commit.committed_at >= since, Commit.committed_at < head_end),
+            Commit.committed_at >= tail_start,
+        )
+
+    raw = (
+        select(Commit.repo_id, func.count(Commit.id), func.sum(Commit.additions), func.sum(Commit.deletions))
+        .where(raw_range)
+        .group_by(Commit.repo_id)
+    )
+    if repo_id is not None:
+        raw = raw.where(Commit.repo_id == repo_id)
+    _merge((await session.execute(raw)).all())
+    return totals
@@ -0,0 +1,267 @@
+"""Activity-adaptive polling.
+
+Every repo has a row in `repo_schedules` with its own next-due time. A poll that finds new
+commits drops the interval to the minimum; empty polls back off exponentially, and a repo
+whose last commit is N hours old is never polled more often than about every N/10 hours.
+Intervals stay within SCHEDULER_MIN/MAX_INTERVAL_MINUTES, and polls of API-sourced repos
+draw from a global SCHEDULER_POLLS_PER_HOUR budget.
+"""
+from __future__ import annotations
+
+import asyncio
+import datetime as dt
+import heapq
+import logging
+import time
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from .config import get_settings
+from .db import Commit, RepoSchedule, Repository, as_utc, dialect_insert
+from .ratelimit import Budget
+from .sources import GITHUB, source_for
+
+log = logging.getLogger(__name__)
+
+# A repo idle for N hours is polled about every N / ACTIVITY_DIVISOR hours.
+ACTIVITY_DIVISOR = 10
+# How often the repo list (allowlist / ALL) is re-synced.
+REPO_LIST_REFRESH_SECONDS = 3600
+# Upper bound on one sleep, so repos added or enabled meanwhile are picked up.
+MAX_SLEEP_SECONDS = 60.0
+
+
+def interval_bounds() -> Tuple[int, int]:
+    """(min, max) poll interval in seconds; webhooks raise the minimum to their safety-net interval."""
+    s = get_settings()
+    lo = s.scheduler_min_interval_minutes * 60
+    if s.github_webhook_secret:
+        lo = max(lo, s.webhook_poll_interval_minutes * 60)
+    return lo, max(lo, s.scheduler_max_interval_minutes * 60)
+
+
+def poll_interval(
+    now: dt.datetime,
+    last_commit_at: Optional[dt.datetime],
+    previous: Optional[int] = None,
+    found_new: bool = False,
+) -> int:
+    """Seconds until the next poll of a repo."""
+    lo, hi = interval_bounds()
+    if found_new:
+        return lo
+    hint = lo if last_commit_at is None else (now - as_utc(last_commit_at)).total_seconds() / ACTIVITY_DIVISOR
+    backed_off = previous * get_settings().scheduler_backoff_factor if previous else lo
+    return int(min(hi, max(lo, hint, backed_off)))
+
+
+async def _upsert(session: AsyncSession, row: dict) -> None:
+    stmt = dialect_insert(session, RepoSchedule.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["repo_id"],
+        set_={k: stmt.excluded[k] for k in row if k != "repo_id"},
+    )
+    await session.execute(stmt, [row])
+
+
+async def record_poll(
+    session: AsyncSession, repo_id: int, now: dt.datetime, newest_commit_at: Optional[dt.datetime] = None
+) -> None:
+    """Reschedule a repo after a successful poll; `newest_commit_at` is set when it found new commits.
+
+    Runs inside the caller's transaction (ingest_repo), next to `last_checked_at`.
+    """
+    res = await session.execute(
+        select(RepoSchedule.interval_seconds, RepoSchedule.last_commit_at).where(RepoSchedule.repo_id == repo_id)
+    )
+    current = res.one_or_none()
+    previous = current.interval_seconds if current else None
+    last_commit_at = current.last_commit_at if current else None
+    if current is None and newest_commit_at is None:
+        last_commit_at = (await session.execute(select(func.max(Commit.committed_at)).where(Commit.repo_id == repo_id))).scalar_one()
+    if newest_commit_at is not None and (last_commit_at is None or newest_commit_at > as_utc(last_commit_at)):
+        last_commit_at = newest_commit_at
+    interval = poll_interval(now, last_commit_at, previous, found_new=newest_commit_at is not None)
+    await _upsert(
+        session,
+        {
+            "repo_id": repo_id,
+            "next_due_at": now + dt.timedelta(seconds=interval),
+            "interval_seconds": interval,
+            "last_commit_at": last_commit_at,
+            "failures": 0,
+            "updated_at": now,
+        },
+    )
+    # a request made after this poll started still needs a poll of its own
+    await session.execute(
+        update(RepoSchedule)
+        .where(RepoSchedule.repo_id == repo_id, RepoSchedule.poll_requested_at <= now)
+        .values(poll_requested_at=None)
+    )
+
+
+async def record_failure(session: AsyncSession, repo_id: int, now: dt.datetime) -> None:
+    """Retry a failed poll after min interval * 2^(failures-1), capped at the max interval."""
+    lo, hi = interval_bounds()
+    sched = await session.get(RepoSchedule, repo_id)
+    if sched is None:
+        sched = RepoSchedule(repo_id=repo_id, interval_seconds=lo, failures=0, next_due_at=now)
+        session.add(sched)
+    sched.failures += 1
+    sched.next_due_at = now + dt.timedelta(seconds=min(hi, lo * 2 ** (sched.failures - 1)))
+
+
+async def request_poll(session: AsyncSession, repo: Repository, now: dt.datetime, since: Optional[dt.datetime] = None) -> None:
+    """Make a repo due now, for the leader's scheduler to pick up (webhooks on other processes).
+
+    `since` rewinds `last_checked_at` so the poll reaches back to older pushed commits. The
+    adaptive scheduler polls it as due; in fixed mode the leader polls requested repos
+    separately (see ingest.start_scheduler).
+    """
+    if since is not None and (repo.last_checked_at is None or since < as_utc(repo.last_checked_at)):
+        repo.last_checked_at = since
+    sched = await session.get(RepoSchedule, repo.id)
+    if sched is None:
+        lo, _ = interval_bounds()
+        session.add(RepoSchedule(repo_id=repo.id, interval_seconds=lo, failures=0, next_due_at=now, poll_requested_at=now))
+    else:
+        sched.next_due_at = now
+        sched.poll_requested_at = now
+    await session.commit()
+
+
+async def ensure_schedules(session: AsyncSession, now: dt.datetime) -> int:
+    """Create rows for repos that have none, seeded from `last_checked_at` and commit recency."""
+    res = await session.execute(
+        select(Repository.id, Repository.last_checked_at)
+        .outerjoin(RepoSchedule, RepoSchedule.repo_id == Repository.id)
+        .where(RepoSchedule.repo_id.is_(None))
+    )
+    missing = res.all()
+    if not missing:
+        return 0
+    res = await session.execute(
+        select(Commit.repo_id, func.max(Commit.committed_at)).where(Commit.repo_id.in_([m.id for m in missing])).group_by(Commit.repo_id)
+    )
+    latest = dict(res.all())
+    for repo_id, last_checked_at in missing:
+        interval = poll_interval(now, latest.get(repo_id))
+        due = as_utc(last_checked_at) + dt.timedelta(seconds=interval) if last_checked_at else now
+        await _upsert(
+            session,
+            {
+                "repo_id": repo_id,
+                "next_due_at": due,
+                "interval_seconds": interval,
+                "last_commit_at": latest.get(repo_id),
+                "failures": 0,
+                "updated_at": now,
+            },
+        )
+    await session.commit()
+    return len(missing)
+
+
+IngestJob = Callable[..., Awaitable[object]]
+
+
+class AdaptiveScheduler:
+    """Polls repos in next-due order from a heap built over `repo_schedules`.
+
+    `job(session_factory, repo_ids=[...])` ingests the due repos (ingest_all); a successful
+    ingest_repo reschedules its repo via record_poll, and repos it leaves due are treated as
+    failed. `sync_repos(session)` refreshes the tracked repo list.
+    """
+
+    def __init__(
+        self,
+        job: IngestJob,
+        session_factory: async_sessionmaker,
+        sync_repos: Optional[Callable[[AsyncSession], Awaitable[None]]] = None,
+        polls_per_hour: Optional[int] = None,
+    ) -> None:
+        per_hour = max(1, polls_per_hour or get_settings().scheduler_polls_per_hour)
+        self.job = job
+        self.session_factory = session_factory
+        self.sync_repos = sync_repos
+        # ten minutes' worth of polls may go at once, e.g. right after startup
+        self.budget = Budget("polls", per_hour / 3600, max(1, per_hour // 6), 0)
+        self._synced_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def _heap(self, now: dt.datetime) -> List[Tuple[dt.datetime, int, Optional[str]]]:
+        async with self.session_factory() as session:
+            await ensure_schedules(session, now)
+            res = await session.execute(
+                select(RepoSchedule.next_due_at, RepoSchedule.repo_id, Repository.source)
+                .join(Repository, Repository.id == RepoSchedule.repo_id)
+                .where(Repository.enabled == True)  # noqa: E712
+            )
+            heap = [(as_utc(due), repo_id, source) for due, repo_id, source in res.all()]
+        heapq.heapify(heap)
+        return heap
+
+    async def run_once(self, now: Optional[dt.datetime] = None) -> float:
+        """Poll every due repo the budget allows; returns seconds until there is more to do."""
+        now = now or dt.datetime.now(dt.timezone.utc)
+        heap = await self._heap(now)
+        due: List[int] = []
+        deferred = False
+        while heap and heap[0][0] <= now:
+            _, repo_id, source = heapq.heappop(heap)
+            if source_for(source) == GITHUB:
+                if self.budget.wait_seconds() > 0:
+                    deferred = True
+                    continue
+                self.budget.take()
+            due.append(repo_id)
+
+        if due:
+            await self.job(self.session_factory, repo_ids=due)
+            await self._record_failures(due, now)
+        if deferred:
+            log.info("Poll budget exhausted; deferring overdue repos")
+            return self.budget.wait_seconds()
+        return (heap[0][0] - now).total_seconds() if heap else MAX_SLEEP_SECONDS
+
+    async def _record_failures(self, repo_ids: List[int], started: dt.datetime) -> None:
+        async with self.session_factory() as session:
+            res = await session.execute(
+                select(RepoSchedule.repo_id).where(RepoSchedule.repo_id.in_(repo_ids), RepoSchedule.next_due_at <= started)
+            )
+            failed = res.scalars().all()
+            for repo_id in failed:
+                await record_failure(session, repo_id, dt.datetime.now(dt.timezone.utc))
+            await session.commit()
+
+    async def _sync(self) -> None:
+        if self.sync_repos is None:
+            return
+        if self._synced_at is not None and time.monotonic() - self._synced_at < REPO_LIST_REFRESH_SECONDS:
+            return
+        async with self.session_factory() as session:
+            await self.sync_repos(session)
+        self._synced_at = time.monotonic()
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self._sync()
+                wait = await self.run_once()
+            except Exception as e:
+                log.exception("Scheduler run failed: %s", e)
+                wait = MAX_SLEEP_SECONDS
+            await asyncio.sleep(min(max(wait, 1.0), MAX_SLEEP_SECONDS))
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
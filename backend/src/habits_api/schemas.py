@@ -30,6 +30,23 @@ class SummaryOut(BaseModel):
     per_repo: List[SummaryRepo]
 
 
+class TimeseriesPoint(BaseModel):
+    start: dt.datetime
+    commits: int
+    additions: int
+    deletions: int
+
+
+class TimeseriesOut(BaseModel):
+    bucket: str
+    tz: str
+    repo_id: Optional[int]
+    # covered range: start of the first bucket to the end of the last one
+    since: dt.datetime
+    until: dt.datetime
+    points: List[TimeseriesPoint]
+
+
 class RepoMetrics(BaseModel):
     window: str
     repo_id: int
@@ -0,0 +1,41 @@
+"""Per-repo choice of ingestion engine: the GitHub API or a local git mirror."""
+from __future__ import annotations
+
+import datetime as dt
+from typing import Any, AsyncIterator, Dict, Optional
+
+from . import github, gitmirror
+from .config import get_settings
+
+GITHUB = "github"
+GIT = "git"
+SOURCES = (GITHUB, GIT)
+
+
+def source_for(source: Optional[str]) -> str:
+    """Resolve a repo's `source` column, falling back to INGEST_SOURCE."""
+    resolved = source or get_settings().ingest_source
+    if resolved not in SOURCES:
+        raise ValueError(f"unknown ingestion source {resolved!r}")
+    return resolved
+
+
+def iter_commit_pages(
+    full_name: str,
+    since: dt.datetime,
+    after: Optional[str] = None,
+    source: str = GITHUB,
+    until: Optional[dt.datetime] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """History pages from the given engine (see github.iter_commit_pages for the shape)."""
+    if source == GIT:
+        # git log is one stream, so there is never a cursor to resume from
+        return gitmirror.iter_commit_pages(full_name, since, until=until)
+    return github.iter_commit_pages(full_name, since, after=after, until=until)
+
+
+async def fetch_commit_files(full_name: str, sha: str, source: str = GITHUB) -> Dict[str, Any]:
+    """Per-file changes from the given engine (see github.fetch_commit_files for the shape)."""
+    if source == GIT:
+        return await gitmirror.fetch_commit_files(full_name, sha)
+    return await github.fetch_commit_files(full_name, sha)
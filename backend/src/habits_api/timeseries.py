@@ -0,0 +1,153 @@
+"""Commit activity bucketed by hour, day or week in a given time zone.
+
+Buckets are keyed in SQL: `(epoch + shift) // width`, where `shift` is the zone's UTC offset
+(plus three days for Monday-start weeks). A range is split at the zone's offset changes (DST)
+so the shift is a constant per query; there are a few such segments per year. In zones whose
+offsets are whole hours every boundary falls on a UTC hour, so the per-hour `commit_rollups`
+are summed instead of raw commits; fractional-offset zones (e.g. +05:30) read `commits`.
+Python only walks bucket boundaries, never rows.
+"""
+from __future__ import annotations
+
+import datetime as dt
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import BigInteger, Integer, cast, extract, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .db import Commit, CommitRollup, as_utc
+
+HOUR, DAY, WEEK = "hour", "day", "week"
+BUCKET_SECONDS = {HOUR: 3600, DAY: 86400, WEEK: 7 * 86400}
+# the range a request covers when it gives no `since`
+DEFAULT_SPAN = {HOUR: dt.timedelta(hours=48), DAY: dt.timedelta(days=30), WEEK: dt.timedelta(weeks=26)}
+# refuse ranges that would return more points than this
+MAX_BUCKETS = 5000
+
+EPOCH_DAY = dt.date(1970, 1, 1)
+# 1970-01-01 was a Thursday; weeks are counted from the Monday before it
+EPOCH_MONDAY = dt.date(1969, 12, 29)
+
+# (commits, additions, deletions)
+Totals = Tuple[int, int, int]
+
+
+@dataclass
+class Bucket:
+    key: int
+    start: dt.datetime  # aware, in the requested zone
+    end_utc: dt.datetime
+
+
+def _epoch(ts: dt.datetime) -> int:
+    return int(ts.timestamp())
+
+
+def _offset(zone: ZoneInfo, at: dt.datetime) -> int:
+    return int(at.astimezone(zone).utcoffset().total_seconds())  # type: ignore[union-attr]
+
+
+def _shift(bucket: str, offset: int) -> int:
+    if bucket == HOUR:
+        # UTC hours stay distinct across DST; only a fractional offset moves the boundary
+        return offset % 3600
+    return offset + (3 * 86400 if bucket == WEEK else 0)
+
+
+def _local_midnight(day: dt.date, zone: ZoneInfo) -> dt.datetime:
+    return dt.datetime.combine(day, dt.time(), tzinfo=zone)
+
+
+def buckets(bucket: str, since: dt.datetime, until: dt.datetime, zone: ZoneInfo) -> List[Bucket]:
+    """The buckets covering [since, until), first one starting at or before `since`."""
+    out: List[Bucket] = []
+    if bucket == HOUR:
+        shift = _shift(HOUR, _offset(zone, since))
+        t = dt.datetime.fromtimestamp((_epoch(since) + shift) // 3600 * 3600 - shift, dt.timezone.utc)
+        while t < until:
+            shift = _shift(HOUR, _offset(zone, t))
+            nxt = t + dt.timedelta(hours=1)
+            out.append(Bucket((_epoch(t) + shift) // 3600, t.astimezone(zone), nxt))
+            t = nxt
+            if len(out) > MAX_BUCKETS:
+                break
+        return out
+
+    day = since.astimezone(zone).date()
+    if bucket == WEEK:
+        day -= dt.timedelta(days=day.weekday())
+    step = dt.timedelta(days=7 if bucket == WEEK else 1)
+    start = _local_midnight(day, zone)
+    while as_utc(start) < until and len(out) <= MAX_BUCKETS:
+        nxt = _local_midnight(day + step, zone)
+        key = (day - EPOCH_DAY).days if bucket == DAY else (day - EPOCH_MONDAY).days // 7
+        out.append(Bucket(key, start, as_utc(nxt)))
+        day += step
+        start = nxt
+    return out
+
+
+def offset_segments(zone: ZoneInfo, since: dt.datetime, until: dt.datetime) -> List[Tuple[dt.datetime, dt.datetime, int]]:
+    """Split [since, until) where the zone's UTC offset changes; (start, end, offset seconds)."""
+    segments = []
+    start, offset = since, _offset(zone, since)
+    probe = since
+    while probe < until:
+        nxt = min(probe + dt.timedelta(days=1), until)
+        if _offset(zone, nxt) != offset:
+            # transitions fall on whole or half UTC hours; find the first instant past it
+            t = probe
+            while _offset(zone, t) == offset:
+                t += dt.timedelta(minutes=30)
+            segments.append((start, t, offset))
+            start, offset = t, _offset(zone, t)
+        probe = nxt
+    segments.append((start, until, offset))
+    return [s for s in segments if s[0] < s[1]]
+
+
+def _epoch_expr(session: AsyncSession, column):
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        return cast(extract("epoch", column), BigInteger)
+    if dialect == "sqlite":
+        return cast(func.strftime("%s", column), Integer)
+    raise NotImplementedError(f"time series are not supported on {dialect!r}")
+
+
+async def bucket_totals(
+    session: AsyncSession,
+    bucket: str,
+    since: dt.datetime,
+    until: dt.datetime,
+    zone: ZoneInfo,
+    repo_id: Optional[int] = None,
+) -> Dict[int, Totals]:
+    """Per-bucket-key (commits, additions, deletions) for [since, until), which must be bucket-aligned."""
+    width = BUCKET_SECONDS[bucket]
+    segments = offset_segments(zone, since, until)
+    use_rollups = all(offset % 3600 == 0 for _, _, offset in segments)
+    totals: Dict[int, Totals] = {}
+    for start, end, offset in segments:
+        if use_rollups:
+            repo_col = CommitRollup.repo_id
+            column = CommitRollup.hour
+            values = (func.sum(CommitRollup.commits), func.sum(CommitRollup.additions), func.sum(CommitRollup.deletions))
+        else:
+            repo_col = Commit.repo_id
+            column = Commit.committed_at
+            values = (func.count(Commit.id), func.sum(Commit.additions), func.sum(Commit.deletions))
+        # collapse repos (and rows within an hour) first, so the epoch arithmetic runs once per hour
+        inner = select(column.label("at"), *(v.label(n) for v, n in zip(values, ("c", "a", "d"))))
+        inner = inner.where(column >= start, column < end).group_by(column)
+        if repo_id is not None:
+            inner = inner.where(repo_col == repo_id)
+        inner = inner.subquery()
+        key = ((_epoch_expr(session, inner.c.at) + _shift(bucket, offset)) // width).label("key")
+        stmt = select(key, func.sum(inner.c.c), func.sum(inner.c.a), func.sum(inner.c.d)).group_by(key)
+        for k, c, a, d in (await session.execute(stmt)).all():
+            pc, pa, pd = totals.get(int(k), (0, 0, 0))
+            totals[int(k)] = (pc + int(c or 0), pa + int(a or 0), pd + int(d or 0))
+    return totals
@@ -0,0 +1,206 @@
+"""GitHub push webhooks: signature checks, payload parsing and a debounced per-repo queue.
+
+A push only queues its repository. Bursts (several pushes, redeliveries) inside the debounce
+window collapse into one `ingest_repo` run, and a run is skipped when every pushed commit is
+already stored. Scheduled polling stays as a slow safety net for missed deliveries.
+"""
+from __future__ import annotations
+
+import asyncio
+import datetime as dt
+import hashlib
+import hmac
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from .config import get_settings
+from .db import Commit, Repository, as_utc
+from .ingest import ingest_repo
+from .leader import is_leader
+from .scheduling import request_poll
+from .writes import parse_timestamp
+
+log = logging.getLogger(__name__)
+
+SIGNATURE_HEADER = "X-Hub-Signature-256"
+EVENT_HEADER = "X-GitHub-Event"
+DELIVERY_HEADER = "X-GitHub-Delivery"
+
+
+def sign(secret: str, body: bytes) -> str:
+    """The `X-Hub-Signature-256` value GitHub sends for `body`."""
+    return "sha256=" + hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+
+
+def verify_signature(secret: str, body: bytes, header: Optional[str]) -> bool:
+    return bool(header) and hmac.compare_digest(sign(secret, body), header)  # type: ignore[arg-type]
+
+
+@dataclass
+class PushEvent:
+    full_name: str
+    default_branch: str
+    # sha -> commit timestamp, for the commits GitHub lists in the payload (at most 20)
+    commits: Dict[str, str]
+
+
+def parse_push(payload: Dict[str, Any]) -> Optional[PushEvent]:
+    """Return the push if it adds commits to the default branch, else None.
+
+    Only default-branch history is tracked, so pushes to other branches, tags and branch
+    deletions are ignored.
+    """
+    repo = payload.get("repository") or {}
+    full_name = repo.get("full_name")
+    default_branch = repo.get("default_branch") or repo.get("master_branch") or "main"
+    if not full_name or payload.get("deleted") or payload.get("ref") != f"refs/heads/{default_branch}":
+        return None
+    commits = {c["id"]: c.get("timestamp") for c in payload.get("commits") or [] if c.get("id")}
+    head = payload.get("head_commit") or {}
+    if head.get("id"):
+        commits.setdefault(head["id"], head.get("timestamp"))
+    return PushEvent(full_name=full_name, default_branch=default_branch, commits=commits)
+
+
+@dataclass
+class _Pending:
+    due: float
+    commits: Dict[str, Optional[str]] = field(default_factory=dict)
+
+
+class PushQueue:
+    """Debounced per-repo ingestion triggered by push events.
+
+    The first push for a repo starts a `debounce_seconds` timer; later pushes before it fires
+    only add their commits. A repo never has two runs at once: pushes arriving mid-run wait
+    for the next one.
+    """
+
+    def __init__(self, session_factory: async_sessionmaker, debounce_seconds: Optional[float] = None) -> None:
+        settings = get_settings()
+        self.session_factory = session_factory
+        self.debounce_seconds = settings.webhook_debounce_seconds if debounce_seconds is None else debounce_seconds
+        self.concurrency = max(1, settings.ingest_concurrency)
+        self._pending: Dict[str, _Pending] = {}
+        self._running: Set[str] = set()
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._runs: Set[asyncio.Task] = set()
+
+    def add(self, event: PushEvent) -> bool:
+        """Queue a push; returns False when it was merged into one already waiting."""
+        pending = self._pending.get(event.full_name)
+        merged = pending is not None
+        if pending is None:
+            pending = self._pending[event.full_name] = _Pending(due=time.monotonic() + self.debounce_seconds)
+        pending.commits.update(event.commits)
+        self._wake.set()
+        return not merged
+
+    @property
+    def pending(self) -> List[str]:
+        return list(self._pending)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._dispatch())
+
+    async def stop(self) -> None:
+        tasks = [t for t in (self._task, *self._runs) if t is not None]
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        self._runs.clear()
+
+    async def drain(self) -> int:
+        """Run every pending repo now, ignoring the debounce (CLI/tests); returns runs done."""
+        names = [n for n in self._pending if n not in self._running]
+        await asyncio.gather(*(self._run(name, self._pending.pop(name)) for name in names))
+        return len(names)
+
+    async def _dispatch(self) -> None:
+        sem = asyncio.Semaphore(self.concurrency)
+
+        async def _limited(name: str, pending: _Pending) -> None:
+            async with sem:
+                await self._run(name, pending)
+
+        while True:
+            # Clear before scanning so an add() racing with the scan is not lost.
+            self._wake.clear()
+            now = time.monotonic()
+            waiting = [(p.due, n) for n, p in self._pending.items() if n not in self._running]
+            for due, name in waiting:
+                if due <= now:
+                    task = asyncio.create_task(_limited(name, self._pending.pop(name)))
+                    self._runs.add(task)
+                    task.add_done_callback(self._runs.discard)
+            future = [due - now for due, _ in waiting if due > now]
+            timeout = min(future) if future else None
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run(self, full_name: str, pending: _Pending) -> None:
+        self._running.add(full_name)
+        try:
+            await self.process(full_name, pending.commits)
+        except Exception as e:
+            log.exception("Webhook ingestion failed for %s: %s", full_name, e)
+        finally:
+            self._running.discard(full_name)
+            self._wake.set()
+
+    async def process(self, full_name: str, commits: Dict[str, Optional[str]]) -> int:
+        """Ingest one pushed repo unless all its pushed commits are already stored.
+
+        A process that is not the ingestion leader only requests a poll, which the leader's
+        scheduler runs within about a minute (in fixed mode too, through its `requested` job).
+        """
+        async with self.session_factory() as session:
+            repo = (await session.execute(select(Repository).where(Repository.full_name == full_name))).scalar_one_or_none()
+            if repo is None or not repo.enabled:
+                return 0
+            if commits:
+                res = await session.execute(select(Commit.sha).where(Commit.repo_id == repo.id, Commit.sha.in_(list(commits))))
+                if set(res.scalars().all()) >= set(commits):
+                    log.debug("Push for %s already ingested", full_name)
+                    return 0
+            # Pushed commits can be older than the last check (committed earlier, pushed now).
+            stamps = [parse_timestamp(ts) for ts in commits.values() if ts]
+            since = min(stamps) if stamps else None
+            if since is not None and repo.last_checked_at is not None and since >= as_utc(repo.last_checked_at):
+                since = None
+            if not is_leader():
+                await request_poll(session, repo, dt.datetime.now(dt.timezone.utc), since=since)
+                return 0
+            return await ingest_repo(session, repo, since=since)
+
+
+# The running app's push queue, if any.
+_queue: Optional[PushQueue] = None
+
+
+def start_push_queue(session_factory: async_sessionmaker) -> PushQueue:
+    global _queue
+    _queue = PushQueue(session_factory)
+    _queue.start()
+    return _queue
+
+
+async def stop_push_queue() -> None:
+    global _queue
+    if _queue is not None:
+        await _queue.stop()
+        _queue = None
+
+
+def get_push_queue() -> Optional[PushQueue]:
+    return _queue
@@ -0,0 +1,89 @@
+"""Standalone ingestion worker: `python -m habits_api.worker` (from backend/ with PYTHONPATH=src).
+
+Runs the scheduler, the file queue and backfill slices in a process of its own, so parsing
+GitHub payloads and building rows never shares an event loop with request handling. Pair it
+with API servers started with INGEST_IN_API=false; they read the shared database and learn
+about new data from the event relay (see relay.py). Several workers may run: they elect one
+leader through the same lease as in-process ingestion (LEADER_ELECTION). With
+WORKER_METRICS_PORT set, the worker's own Prometheus metrics are served on that port.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import signal
+from typing import Optional
+
+from .config import get_settings
+from .db import SessionLocal, init_db
+from .github import close_client, open_client
+from .ingest import start_ingestion, stop_ingestion
+from .leader import start_leader_election, stop_leader_election
+from .rollups import rebuild_rollups, rollups_missing
+from .telemetry import CONTENT_TYPE, REGISTRY
+
+log = logging.getLogger(__name__)
+
+
+async def _serve_metrics(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """Answer any request with the metrics text; enough for a Prometheus scrape."""
+    try:
+        await reader.readuntil(b"\r\n\r\n")
+        body = REGISTRY.render().encode()
+        head = f"HTTP/1.1 200 OK\r\nContent-Type: {CONTENT_TYPE}\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n"
+        writer.write(head.encode() + body)
+        await writer.drain()
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def _start_ingestion() -> None:
+    await start_ingestion(SessionLocal)
+
+
+async def run(stop: Optional[asyncio.Event] = None) -> None:
+    """Ingest until `stop` is set (SIGINT/SIGTERM when run as a command)."""
+    settings = get_settings()
+    stop = stop or asyncio.Event()
+    await init_db()
+    async with SessionLocal() as session:
+        if await rollups_missing(session):
+            await rebuild_rollups(session)
+    await open_client()
+    metrics = None
+    if settings.worker_metrics_port and settings.prometheus_metrics:
+        metrics = await asyncio.start_server(_serve_metrics, port=settings.worker_metrics_port)
+    try:
+        await start_leader_election(SessionLocal, _start_ingestion, stop_ingestion)
+        log.info("Ingestion worker started (leader election: %s)", settings.leader_election)
+        await stop.wait()
+    finally:
+        await stop_leader_election(stop_ingestion)
+        if metrics is not None:
+            metrics.close()
+            await metrics.wait_closed()
+        await close_client()
+        log.info("Ingestion worker stopped")
+
+
+async def _main() -> None:
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await run(stop)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="habits_api.worker", description="Run ingestion without the API server.")
+    parser.add_argument("--log-level", default="INFO")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    asyncio.run(_main())
+
+
+if __name__ == "__main__":
+    main()
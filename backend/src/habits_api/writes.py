@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import datetime as dt
+from typing import Any, Dict, Iterable, Mapping
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .db import Commit, CommitFile, CommitFileJob, CommitRollup, dialect_insert
+from .patches import attach_blobs, store_patches
+
+
+def floor_hour(ts: dt.datetime) -> dt.datetime:
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def parse_timestamp(value: str) -> dt.datetime:
+    return dt.datetime.fromisoformat(value.replace("Z", "+00:00")).astimezone(dt.timezone.utc)
+
+
+def commit_row(repo_id: int, c: Mapping[str, Any]) -> Dict[str, Any]:
+    return {
+        "repo_id": repo_id,
+        "sha": c["sha"],
+        "author_name": c.get("author_name"),
+        "author_login": c.get("author_login"),
+        "committed_at": parse_timestamp(c["committed_at"]),
+        "message": c.get("message", ""),
+        "additions": int(c.get("additions", 0)),
+        "deletions": int(c.get("deletions", 0)),
+        "changed_files": int(c.get("changed_files", 0)),
+        "url": c.get("url"),
+    }
+
+
+def file_row(commit_id: int, f: Mapping[str, Any]) -> Dict[str, Any]:
+    return {
+        "commit_id": commit_id,
+        "path": f.get("path") or "",
+        "status": f.get("status"),
+        "additions": int(f.get("additions", 0)),
+        "deletions": int(f.get("deletions", 0)),
+        "patch": f.get("patch"),
+    }
+
+
+async def insert_commits(session: AsyncSession, repo_id: int, commits: Iterable[Mapping[str, Any]]) -> Dict[str, int]:
+    """Insert a page of commits, skipping ones already stored (uq_commits_repo_sha).
+
+    The hourly rollups are bumped for the inserted rows in the same transaction.
+    Returns {sha: id} for the rows that were actually inserted.
+    """
+    rows = list({c["sha"]: commit_row(repo_id, c) for c in commits}.values())
+    if not rows:
+        return {}
+    table = Commit.__table__
+    stmt = (
+        dialect_insert(session, table)
+        .on_conflict_do_nothing(index_elements=["repo_id", "sha"])
+        .returning(table.c.id, table.c.sha)
+    )
+    res = await session.execute(stmt, rows)
+    inserted = {sha: cid for cid, sha in res.all()}
+    await add_to_rollups(session, [r for r in rows if r["sha"] in inserted])
+    return inserted
+
+
+async def add_to_rollups(session: AsyncSession, rows: Iterable[Mapping[str, Any]]) -> None:
+    """Add newly inserted commit rows (as built by commit_row) to their hourly rollups."""
+    buckets: Dict[tuple, Dict[str, Any]] = {}
+    for r in rows:
+        key = (r["repo_id"], floor_hour(r["committed_at"]))
+        b = buckets.setdefault(key, {"repo_id": key[0], "hour": key[1], "commits": 0, "additions": 0, "deletions": 0})
+        b["commits"] += 1
+        b["additions"] += r["additions"]
+        b["deletions"] += r["deletions"]
+    if not buckets:
+        return
+    table = CommitRollup.__table__
+    stmt = dialect_insert(session, table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["repo_id", "hour"],
+        set_={
+            "commits": table.c.commits + stmt.excluded.commits,
+            "additions": table.c.additions + stmt.excluded.additions,
+            "deletions": table.c.deletions + stmt.excluded.deletions,
+        },
+    )
+    await session.execute(stmt, list(buckets.values()))
+
+
+async def insert_commit_files(session: AsyncSession, files_by_commit: Mapping[int, Iterable[Mapping[str, Any]]]) -> int:
+    """Insert file rows for many commits, skipping duplicates (uq_commit_files_commit_path).
+
+    Patches are stored compressed in patch_blobs, only for the rows actually inserted.
+    Returns the number of rows inserted.
+    """
+    rows = list(
+        {(cid, row["path"]): row for cid, files in files_by_commit.items() for row in (file_row(cid, f) for f in files)}.values()
+    )
+    if not rows:
+        return 0
+    patch_by_key = {(r["commit_id"], r["path"]): r.pop("patch") for r in rows}
+    table = CommitFile.__table__
+    stmt = (
+        dialect_insert(session, table)
+        .on_conflict_do_nothing(index_elements=["commit_id", "path"])
+        .returning(table.c.id, table.c.commit_id, table.c.path)
+    )
+    inserted = (await session.execute(stmt, rows)).all()
+
+    with_patch = [(fid, patch_by_key[(cid, path)]) for fid, cid, path in inserted if patch_by_key.get((cid, path))]
+    blob_ids = await store_patches(session, [patch for _, patch in with_patch])
+    await attach_blobs(session, {fid: bid for (fid, _), bid in zip(with_patch, blob_ids)})
+    return len(inserted)
+
+
+async def enqueue_file_jobs(session: AsyncSession, commit_ids: Iterable[int]) -> None:
+    """Queue per-commit file fetches; already-queued commits are left as they are."""
+    now = dt.datetime.now(dt.timezone.utc)
+    rows = [{"commit_id": cid, "attempts": 0, "next_attempt_at": now, "created_at": now} for cid in commit_ids]
+    if not rows:
+        return
+    stmt = dialect_insert(session, CommitFileJob.__table__).on_conflict_do_nothing(index_elements=["commit_id"])
+    await session.execute(stmt, rows)
@@ -7,3 +7,36 @@ SRC = ROOT / "src"
 if str(SRC) not in sys.path:
     sys.path.insert(0, str(SRC))
 
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+
+@pytest.fixture
+def anyio_backend():
+    # The app is built on asyncio (APScheduler, aiosqlite); don't run under trio.
+    return "asyncio"
+
+
+@pytest.fixture(autouse=True)
+def _isolated_caches(monkeypatch):
+    # Keep tests from writing the default on-disk REST cache into the working directory,
+    # and from seeing read responses cached by another test.
+    from habits_api import cache, events, httpcache
+    from habits_api.config import get_settings
+
+    monkeypatch.setattr(get_settings(), "http_cache_path", "")
+    monkeypatch.setattr(httpcache, "_cache", None)
+    monkeypatch.setattr(cache, "_cache", None)
+    monkeypatch.setattr(events, "_broadcaster", None)
+
+
+@pytest.fixture
+async def session_factory(tmp_path):
+    """Session factory bound to a fresh on-disk SQLite database."""
+    from habits_api.db import Base
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    await engine.dispose()
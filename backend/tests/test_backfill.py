@@ -0,0 +1,193 @@
+import asyncio
+import datetime as dt
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import func, select
+
+from habits_api import backfill
+from habits_api.app import app
+from habits_api.config import get_settings
+from habits_api.db import BackfillSlice, Commit, CommitFileJob, Repository, as_utc, get_session
+
+UNTIL = dt.datetime(2025, 4, 1, tzinfo=dt.timezone.utc)
+SINCE = UNTIL - dt.timedelta(days=90)
+
+
+def _page(since, cursor, has_next):
+    sha = f"{since:%Y%m%d}-{cursor}"
+    return {
+        "default_branch": "main",
+        "is_private": False,
+        "commits": [{"sha": sha, "committed_at": (since + dt.timedelta(hours=1)).isoformat(), "message": sha}],
+        "has_next_page": has_next,
+        "end_cursor": cursor,
+    }
+
+
+async def _repo(session_factory):
+    async with session_factory() as session:
+        repo = Repository(full_name="o/r")
+        session.add(repo)
+        await session.commit()
+        return repo
+
+
+def test_plan_slices_cover_the_range_from_since():
+    slices = backfill.plan_slices(SINCE, UNTIL, 40)
+    assert slices == [
+        (SINCE, SINCE + dt.timedelta(days=40)),
+        (SINCE + dt.timedelta(days=40), SINCE + dt.timedelta(days=80)),
+        (SINCE + dt.timedelta(days=80), UNTIL),
+    ]
+
+
+@pytest.mark.anyio
+async def test_replanning_later_adds_no_slices(session_factory, monkeypatch):
+    repo = await _repo(session_factory)
+    monkeypatch.setattr(backfill, "_now", lambda: UNTIL)
+    async with session_factory() as session:
+        assert await backfill.plan_backfill(session, repo, SINCE, slice_days=30) == 3
+    # the same command an hour later: the plan's end is reused, nothing is refetched
+    monkeypatch.setattr(backfill, "_now", lambda: UNTIL + dt.timedelta(hours=1))
+    async with session_factory() as session:
+        assert await backfill.plan_backfill(session, repo, SINCE, slice_days=30) == 0
+        # widening the range only plans the uncovered part
+        assert await backfill.plan_backfill(session, repo, SINCE - dt.timedelta(days=45), UNTIL + dt.timedelta(days=1), slice_days=30) == 3
+        res = await session.execute(select(BackfillSlice.since, BackfillSlice.until).order_by(BackfillSlice.since))
+        ranges = [(as_utc(lo), as_utc(hi)) for lo, hi in res.all()]
+    assert ranges[0] == (SINCE - dt.timedelta(days=45), SINCE - dt.timedelta(days=15))
+    assert ranges[1] == (SINCE - dt.timedelta(days=15), SINCE)
+    assert ranges[-1] == (UNTIL, UNTIL + dt.timedelta(days=1))
+    assert all(a[1] == b[0] for a, b in zip(ranges, ranges[1:]))
+
+
+@pytest.mark.anyio
+async def test_backfill_fetches_slices_in_parallel_and_checkpoints(session_factory, monkeypatch):
+    calls = []
+
+    async def fake_pages(full_name, since, after=None, source="github", until=None):
+        calls.append((since, until, after))
+        yield _page(since, "c1", True)
+        yield _page(since, "c2", False)
+
+    monkeypatch.setattr(backfill, "iter_commit_pages", fake_pages)
+    repo = await _repo(session_factory)
+    async with session_factory() as session:
+        assert await backfill.plan_backfill(session, repo, SINCE, UNTIL, slice_days=30) == 3
+        # planning the same range again adds nothing
+        assert await backfill.plan_backfill(session, repo, SINCE, UNTIL, slice_days=30) == 0
+
+    assert await backfill.BackfillRunner(session_factory, concurrency=2).drain() == 3
+    assert sorted(calls) == [(SINCE + dt.timedelta(days=30 * i), SINCE + dt.timedelta(days=30 * (i + 1)), None) for i in range(3)]
+
+    async with session_factory() as session:
+        assert (await session.execute(select(func.count(Commit.id)))).scalar_one() == 6
+        # backfilled commits do not flood the file queue, and the poll cursor is untouched
+        assert (await session.execute(select(func.count(CommitFileJob.commit_id)))).scalar_one() == 0
+        assert (await session.get(Repository, repo.id)).last_checked_at is None
+        status = await backfill.backfill_status(session, repo.id)
+    assert status["slices"] == {"pending": 0, "running": 0, "done": 3, "failed": 0}
+    assert status["commits"] == 6
+
+
+@pytest.mark.anyio
+async def test_failed_slice_resumes_from_its_last_cursor(session_factory, monkeypatch):
+    calls = []
+    fail = True
+
+    async def fake_pages(full_name, since, after=None, source="github", until=None):
+        calls.append(after)
+        if after is None:
+            yield _page(since, "c1", True)
+        if fail:
+            raise RuntimeError("502")
+        yield _page(since, "c2", False)
+
+    monkeypatch.setattr(backfill, "iter_commit_pages", fake_pages)
+    repo = await _repo(session_factory)
+    async with session_factory() as session:
+        await backfill.plan_backfill(session, repo, UNTIL - dt.timedelta(days=10), UNTIL, slice_days=30)
+
+    runner = backfill.BackfillRunner(session_factory, concurrency=1)
+    assert await runner.drain() == 1
+    async with session_factory() as session:
+        s = (await session.execute(select(BackfillSlice))).scalar_one()
+        assert (s.status, s.cursor, s.commits, s.attempts) == ("pending", "c1", 1, 1)
+        assert "502" in s.last_error
+        # backed off; make it due again
+        s.next_attempt_at = dt.datetime.now(dt.timezone.utc)
+        await session.commit()
+
+    fail = False
+    assert await runner.drain() == 1
+    assert calls == [None, "c1"]
+    async with session_factory() as session:
+        s = (await session.execute(select(BackfillSlice))).scalar_one()
+        assert (s.status, s.commits) == ("done", 2)
+
+
+@pytest.mark.anyio
+async def test_stale_running_slice_is_taken_over(session_factory, monkeypatch):
+    async def fake_pages(full_name, since, after=None, source="github", until=None):
+        yield _page(since, "c1", False)
+
+    monkeypatch.setattr(backfill, "iter_commit_pages", fake_pages)
+    repo = await _repo(session_factory)
+    async with session_factory() as session:
+        await backfill.plan_backfill(session, repo, UNTIL - dt.timedelta(days=10), UNTIL)
+        s = (await session.execute(select(BackfillSlice))).scalar_one()
+        s.status = "running"
+        await session.commit()
+
+    runner = backfill.BackfillRunner(session_factory, concurrency=1)
+    # a live claim by another worker is left alone
+    assert await runner.drain() == 0
+    async with session_factory() as session:
+        s = (await session.execute(select(BackfillSlice))).scalar_one()
+        s.updated_at = dt.datetime.now(dt.timezone.utc) - dt.timedelta(seconds=runner.stale_seconds + 1)
+        await session.commit()
+    assert await runner.drain() == 1
+
+
+@pytest.mark.anyio
+async def test_heartbeat_keeps_a_slow_slice_claimed(session_factory, monkeypatch):
+    monkeypatch.setattr(get_settings(), "backfill_stale_seconds", 0.2)
+
+    async def slow_pages(full_name, since, after=None, source="github", until=None):
+        await asyncio.sleep(0.6)  # a slow page, or a pause for the GraphQL budget
+        yield _page(since, "c1", False)
+
+    monkeypatch.setattr(backfill, "iter_commit_pages", slow_pages)
+    repo = await _repo(session_factory)
+    async with session_factory() as session:
+        await backfill.plan_backfill(session, repo, UNTIL - dt.timedelta(days=10), UNTIL)
+
+    worker, other = backfill.BackfillRunner(session_factory), backfill.BackfillRunner(session_factory)
+    work = asyncio.create_task(worker.drain())
+    await asyncio.sleep(0.4)
+    assert await other._claim() is None
+    assert await work == 1
+
+
+@pytest.mark.anyio
+async def test_admin_endpoint_plans_and_reports(session_factory):
+    repo = await _repo(session_factory)
+
+    async def _session():
+        async with session_factory() as s:
+            yield s
+
+    app.dependency_overrides[get_session] = _session
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+            params = {"since": "2025-01-01T00:00:00Z", "until": "2025-03-02T00:00:00Z", "slice_days": 30}
+            r = await ac.post(f"/admin/backfill/{repo.id}", params=params)
+            assert r.status_code == 202
+            assert r.json()["planned"] == 2
+            r = await ac.get(f"/admin/backfill/{repo.id}")
+            assert r.json()["slices"]["pending"] == 2
+            r = await ac.post("/admin/backfill/999", params=params)
+            assert r.status_code == 404
+    finally:
+        app.dependency_overrides.clear()
@@ -0,0 +1,66 @@
+import datetime as dt
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from habits_api.app import app
+from habits_api.db import Repository, get_session
+from habits_api.writes import insert_commits
+
+BASE = dt.datetime(2025, 3, 1, tzinfo=dt.timezone.utc)
+
+
+@pytest.fixture
+async def client(session_factory):
+    async with session_factory() as session:
+        session.add(Repository(full_name="o/r"))
+        await session.flush()
+        # 250 commits, three per timestamp, so pages split inside runs of equal committed_at
+        commits = [
+            {"sha": f"c{i:03d}", "committed_at": (BASE + dt.timedelta(minutes=i // 3)).isoformat(), "message": str(i)}
+            for i in range(250)
+        ]
+        await insert_commits(session, 1, commits)
+        await session.commit()
+
+    async def _session():
+        async with session_factory() as s:
+            yield s
+
+    app.dependency_overrides[get_session] = _session
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        yield ac
+    app.dependency_overrides.clear()
+
+
+@pytest.mark.anyio
+async def test_cursor_walks_every_commit_once_newest_first(client):
+    url = f"/repos/1/commits?since={BASE.isoformat().replace('+00:00', 'Z')}&limit=100"
+    seen, pages = [], 0
+    while url:
+        r = await client.get(url)
+        assert r.status_code == 200
+        seen += [(c["committed_at"], c["sha"]) for c in r.json()]
+        pages += 1
+        link = r.headers.get("link")
+        assert (link is None) == ("x-next-cursor" not in r.headers)
+        url = link[1 : link.index(">")] if link else None
+    assert pages == 3
+    assert len(seen) == len(set(seen)) == 250
+    assert [t for t, _ in seen] == sorted((t for t, _ in seen), reverse=True)
+
+
+@pytest.mark.anyio
+async def test_since_until_range_and_bad_cursor(client):
+    since = (BASE + dt.timedelta(minutes=10)).isoformat()
+    until = (BASE + dt.timedelta(minutes=20)).isoformat()
+    r = await client.get("/repos/1/commits", params={"since": since, "until": until, "limit": 1000})
+    assert {c["message"] for c in r.json()} == {str(i) for i in range(30, 60)}
+    assert "x-next-cursor" not in r.headers
+
+    # cached pages keep their pagination headers
+    first = await client.get("/repos/1/commits", params={"since": since, "limit": 5})
+    again = await client.get("/repos/1/commits", params={"since": since, "limit": 5})
+    assert first.headers["x-next-cursor"] == again.headers["x-next-cursor"]
+
+    assert (await client.get("/repos/1/commits", params={"cursor": "not-a-cursor"})).status_code == 400
@@ -0,0 +1,81 @@
+import datetime as dt
+import json
+
+import pytest
+
+from habits_api import events, ingest
+from habits_api.db import Repository
+from habits_api.events import Broadcaster, event_stream
+
+
+def _frame_data(frame: str) -> dict:
+    return json.loads(frame.split("data: ", 1)[1])
+
+
+@pytest.mark.anyio
+async def test_slow_subscriber_gets_resync_instead_of_unbounded_backlog():
+    b = Broadcaster(queue_size=3)
+    fast, slow = b.subscribe(), b.subscribe()
+    for i in range(3):
+        b.publish({"type": "ingest", "n": i})
+        await fast.queue.get()
+    b.publish({"type": "ingest", "n": 3})
+
+    assert slow.queue.get_nowait() == {"type": "resync"}
+    assert slow.queue.empty() and slow.dropped == 3
+    assert fast.queue.get_nowait()["n"] == 3
+
+
+@pytest.mark.anyio
+async def test_event_stream_frames_and_unsubscribes():
+    b = Broadcaster(queue_size=10)
+    disconnected = False
+
+    async def is_disconnected():
+        return disconnected
+
+    stream = event_stream(b, is_disconnected, keepalive_seconds=0.01)
+    assert (await stream.__anext__()).startswith("event: hello")
+    assert b.subscriber_count == 1
+    assert await stream.__anext__() == ": ping\n\n"
+
+    b.publish({"type": "ingest", "repo_id": 1})
+    frame = await stream.__anext__()
+    assert frame.startswith("event: ingest\n") and _frame_data(frame)["repo_id"] == 1
+
+    disconnected = True
+    with pytest.raises(StopAsyncIteration):
+        await stream.__anext__()
+    assert b.subscriber_count == 0
+
+
+@pytest.mark.anyio
+async def test_ingest_publishes_delta_with_counts(session_factory):
+    sub = events.get_broadcaster().subscribe()
+    now = dt.datetime.now(dt.timezone.utc)
+    page = {
+        "default_branch": "main",
+        "is_private": False,
+        "commits": [
+            {"sha": "new", "committed_at": (now - dt.timedelta(hours=1)).isoformat(), "message": "feat: x\n\nbody", "additions": 4},
+            {"sha": "older", "committed_at": (now - dt.timedelta(hours=30)).isoformat(), "message": "old"},
+        ],
+        "has_next_page": False,
+        "end_cursor": None,
+    }
+    async with session_factory() as session:
+        repo = Repository(full_name="o/r")
+        session.add(repo)
+        await session.commit()
+        await ingest.ingest_repo(session, repo, payload=page)
+        # Re-ingesting the same commits publishes nothing.
+        await ingest.ingest_repo(session, repo, payload=page)
+
+    event = sub.queue.get_nowait()
+    assert sub.queue.empty()
+    assert event["type"] == "ingest" and event["full_name"] == "o/r"
+    assert event["new_count"] == 2
+    assert [c["sha"] for c in event["new_commits"]] == ["new", "older"]
+    assert event["new_commits"][0]["message"] == "feat: x"
+    assert event["commits_count"] == {"6h": 1, "24h": 1, "7d": 2}
+    assert event["last_checked_at"] is not None
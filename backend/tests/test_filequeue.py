@@ -0,0 +1,159 @@
+import asyncio
+
+import pytest
+from sqlalchemy import func, select
+
+from habits_api import filequeue, ingest
+from habits_api.db import Commit, CommitFile, CommitFileJob, Repository
+
+
+def _page(*shas):
+    return {
+        "default_branch": "main",
+        "is_private": False,
+        "commits": [{"sha": s, "committed_at": "2025-01-01T00:00:00Z", "message": s} for s in shas],
+        "has_next_page": False,
+        "end_cursor": None,
+    }
+
+
+async def _count(session, column):
+    return (await session.execute(select(func.count(column)))).scalar_one()
+
+
+@pytest.mark.anyio
+async def test_ingest_queues_file_jobs_and_workers_drain_them(session_factory, monkeypatch):
+    fetched = []
+
+    async def fake_files(full_name, sha, source="github"):
+        fetched.append(sha)
+        if sha == "bad":
+            raise RuntimeError("502")
+        return {"files": [{"path": f"{sha}.py", "status": "added", "additions": 1, "deletions": 0}]}
+
+    monkeypatch.setattr(filequeue, "fetch_commit_files", fake_files)
+
+    async with session_factory() as session:
+        repo = Repository(full_name="o/r")
+        session.add(repo)
+        await session.commit()
+        assert await ingest.ingest_repo(session, repo, payload=_page("a", "b", "bad")) == 3
+        # Commit metadata lands immediately; files are only queued.
+        assert await _count(session, CommitFileJob.commit_id) == 3
+        assert await _count(session, CommitFile.id) == 0
+
+    queue = filequeue.FileFetchQueue(session_factory, concurrency=2)
+    assert await queue.drain() == 3
+    assert sorted(fetched) == ["a", "b", "bad"]
+
+    async with session_factory() as session:
+        assert await _count(session, CommitFile.id) == 2
+        job = (await session.execute(select(CommitFileJob))).scalar_one()
+        assert job.attempts == 1 and "502" in job.last_error
+
+    # The failed job is backed off, so it is not due again yet.
+    assert await queue.drain() == 0
+
+
+@pytest.mark.anyio
+async def test_started_queue_wakes_on_notify(session_factory, monkeypatch):
+    async def fake_files(full_name, sha, source="github"):
+        return {"files": [{"path": "x.py"}]}
+
+    monkeypatch.setattr(filequeue, "fetch_commit_files", fake_files)
+    monkeypatch.setattr(filequeue.get_settings(), "file_fetch_poll_seconds", 60.0)
+
+    queue = filequeue.start_file_queue(session_factory)
+    try:
+        async with session_factory() as session:
+            repo = Repository(full_name="o/r")
+            session.add(repo)
+            await session.commit()
+            await ingest.ingest_repo(session, repo, payload=_page("a"))
+
+        for _ in range(100):
+            async with session_factory() as session:
+                if await _count(session, CommitFile.id) == 1:
+                    break
+            await asyncio.sleep(0.02)
+        async with session_factory() as session:
+            assert await _count(session, CommitFile.id) == 1
+            assert await _count(session, CommitFileJob.commit_id) == 0
+    finally:
+        await filequeue.stop_file_queue()
+    assert not queue._tasks
+
+
+@pytest.mark.anyio
+async def test_ensure_commit_files_skips_the_line(session_factory, monkeypatch):
+    async def fake_files(full_name, sha, source="github"):
+        return {"files": [{"path": "x.py"}, {"path": "y.py"}]}
+
+    monkeypatch.setattr(filequeue, "fetch_commit_files", fake_files)
+
+    async with session_factory() as session:
+        repo = Repository(full_name="o/r")
+        session.add(repo)
+        await session.commit()
+        await ingest.ingest_repo(session, repo, payload=_page("a"))
+        commit = (await session.execute(select(Commit))).scalar_one()
+
+        assert await ingest.ensure_commit_files(session, repo, commit) == 2
+        assert await _count(session, CommitFileJob.commit_id) == 0
+
+
+@pytest.mark.anyio
+async def test_concurrent_viewers_share_one_fetch(session_factory, monkeypatch):
+    calls = []
+
+    async def fake_files(full_name, sha, source="github"):
+        calls.append(sha)
+        await asyncio.sleep(0.05)
+        return {"files": [{"path": "x.py"}]}
+
+    monkeypatch.setattr(filequeue, "fetch_commit_files", fake_files)
+
+    async with session_factory() as session:
+        repo = Repository(full_name="o/r")
+        session.add(repo)
+        await session.commit()
+        await ingest.ingest_repo(session, repo, payload=_page("a"))
+        commit = (await session.execute(select(Commit))).scalar_one()
+
+    async def view():
+        async with session_factory() as session:
+            return await ingest.ensure_commit_files(session, repo, commit)
+
+    queue = filequeue.FileFetchQueue(session_factory)
+    results = await asyncio.gather(*(view() for _ in range(5)), queue.drain())
+    assert calls == ["a"]
+    assert results[:5] == [1] * 5  # every viewer gets the shared result
+    async with session_factory() as session:
+        assert await _count(session, CommitFile.id) == 1
+        assert await _count(session, CommitFileJob.commit_id) == 0
+
+
+@pytest.mark.anyio
+async def test_prefetch_loads_newest_listed_commits(session_factory, monkeypatch):
+    fetched = []
+
+    async def fake_files(full_name, sha, source="github"):
+        fetched.append(sha)
+        return {"files": [{"path": f"{sha}.py"}]}
+
+    monkeypatch.setattr(filequeue, "fetch_commit_files", fake_files)
+    monkeypatch.setattr(filequeue.get_settings(), "commit_files_prefetch", 2)
+
+    async with session_factory() as session:
+        repo = Repository(full_name="o/r")
+        session.add(repo)
+        await session.commit()
+        await ingest.ingest_repo(session, repo, payload=_page("a", "b", "c"))
+        commits = (await session.execute(select(Commit).order_by(Commit.sha))).scalars().all()
+
+        assert await filequeue.prefetch_commit_files(session, repo, commits) == 2
+        await asyncio.gather(*filequeue._prefetches)
+        assert sorted(fetched) == ["a", "b"]
+        # already stored, so nothing is fetched again
+        assert await filequeue.prefetch_commit_files(session, repo, commits) == 0
+        assert await _count(session, CommitFileJob.commit_id) == 1
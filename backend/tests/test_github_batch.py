@@ -0,0 +1,89 @@
+import datetime as dt
+import json
+
+import pytest
+import respx
+from httpx import Response
+
+from habits_api.github import GQL_URL, MAX_GRAPHQL_BATCH, fetch_commits_batch
+
+
+def _repo_node(name: str) -> dict:
+    return {
+        "isPrivate": False,
+        "nameWithOwner": name,
+        "defaultBranchRef": {
+            "name": "main",
+            "target": {
+                "history": {
+                    "nodes": [
+                        {
+                            "oid": f"{name}-sha",
+                            "committedDate": "2025-01-01T00:00:00Z",
+                            "message": "msg",
+                            "additions": 1,
+                            "deletions": 2,
+                            "changedFiles": 1,
+                            "url": None,
+                            "author": {"name": "A", "user": {"login": "a"}},
+                        }
+                    ]
+                }
+            },
+        },
+    }
+
+
+@pytest.mark.anyio
+async def test_fetch_commits_batch_packs_aliases_and_isolates_errors():
+    since = dt.datetime(2025, 1, 1, tzinfo=dt.timezone.utc)
+    names = [f"o/r{i}" for i in range(5)]
+
+    def handler(request):
+        body = json.loads(request.content)
+        variables = body["variables"]
+        data, errors = {}, []
+        i = 0
+        while f"o{i}" in variables:
+            full = f"{variables[f'o{i}']}/{variables[f'n{i}']}"
+            assert f"r{i}: repository(" in body["query"]
+            if full == "o/r3":
+                data[f"r{i}"] = None
+                errors.append({"type": "NOT_FOUND", "path": [f"r{i}"], "message": "Could not resolve"})
+            else:
+                data[f"r{i}"] = _repo_node(full)
+            i += 1
+        out = {"data": data}
+        if errors:
+            out["errors"] = errors
+        return Response(200, json=out)
+
+    with respx.mock(assert_all_called=True) as rsx:
+        route = rsx.post(GQL_URL).mock(side_effect=handler)
+        result = await fetch_commits_batch([(n, since) for n in names], batch_size=2)
+
+    assert route.call_count == 3
+    assert set(result.payloads) == {"o/r0", "o/r1", "o/r2", "o/r4"}
+    assert result.errors == {"o/r3": "Could not resolve"}
+    payload = result.payloads["o/r4"]
+    assert payload["default_branch"] == "main"
+    assert payload["commits"][0]["sha"] == "o/r4-sha"
+    assert payload["commits"][0]["author_login"] == "a"
+
+
+@pytest.mark.anyio
+async def test_fetch_commits_batch_caps_repos_per_query():
+    since = dt.datetime(2025, 1, 1, tzinfo=dt.timezone.utc)
+    names = [f"o/r{i}" for i in range(MAX_GRAPHQL_BATCH + 1)]
+
+    def handler(request):
+        variables = json.loads(request.content)["variables"]
+        count = sum(1 for k in variables if k.startswith("o"))
+        assert count <= MAX_GRAPHQL_BATCH
+        return Response(200, json={"data": {f"r{i}": _repo_node(f"o/x{i}") for i in range(count)}})
+
+    with respx.mock() as rsx:
+        route = rsx.post(GQL_URL).mock(side_effect=handler)
+        await fetch_commits_batch([(n, since) for n in names], batch_size=1000)
+
+    assert route.call_count == 2
@@ -0,0 +1,50 @@
+import httpx
+import pytest
+import respx
+from httpx import Response
+
+from habits_api import github
+from habits_api.config import get_settings
+from habits_api.github import fetch_commit_files
+
+
+URL = "https://api.github.com/repos/alice/project/commits/abc123"
+
+
+@pytest.fixture
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(get_settings(), "github_retry_backoff_seconds", 0.0)
+    monkeypatch.setattr(get_settings(), "github_max_retries", 2)
+
+
+@pytest.mark.anyio
+async def test_retries_5xx_then_succeeds(fast_retries):
+    with respx.mock(assert_all_called=True) as rsx:
+        route = rsx.get(URL).mock(side_effect=[Response(502), Response(200, json={"files": []})])
+        data = await fetch_commit_files("alice/project", "abc123")
+    assert route.call_count == 2
+    assert data["files"] == []
+
+
+@pytest.mark.anyio
+async def test_retries_connection_errors_then_gives_up(fast_retries):
+    with respx.mock() as rsx:
+        route = rsx.get(URL).mock(side_effect=httpx.ConnectError("refused"))
+        with pytest.raises(httpx.ConnectError):
+            await fetch_commit_files("alice/project", "abc123")
+    assert route.call_count == 3
+
+
+@pytest.mark.anyio
+async def test_client_injection_and_shared_lifecycle():
+    def handler(request: httpx.Request) -> Response:
+        return Response(200, json={"files": [{"filename": "a.py", "status": "added", "additions": 1, "deletions": 0}]})
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        data = await fetch_commit_files("alice/project", "abc123", client=client)
+    assert data["files"][0]["path"] == "a.py"
+
+    shared = await github.open_client()
+    assert github.get_client() is shared
+    await github.close_client()
+    assert shared.is_closed
@@ -0,0 +1,69 @@
+import datetime as dt
+import json
+
+import pytest
+import respx
+from httpx import Response
+
+from habits_api.github import GQL_URL, fetch_commits_since, iter_commit_pages
+
+
+def _page(shas, cursor=None):
+    return {
+        "data": {
+            "repository": {
+                "isPrivate": True,
+                "nameWithOwner": "o/r",
+                "defaultBranchRef": {
+                    "name": "trunk",
+                    "target": {
+                        "history": {
+                            "pageInfo": {"hasNextPage": cursor is not None, "endCursor": cursor},
+                            "nodes": [{"oid": s, "committedDate": "2025-01-01T00:00:00Z", "message": s} for s in shas],
+                        }
+                    },
+                },
+            }
+        }
+    }
+
+
+SINCE = dt.datetime(2024, 1, 1, tzinfo=dt.timezone.utc)
+
+
+def _paged_handler(seen_cursors):
+    pages = {None: _page(["a", "b"], "c1"), "c1": _page(["c", "d"], "c2"), "c2": _page(["e"])}
+
+    def handler(request):
+        cursor = json.loads(request.content)["variables"]["cursor"]
+        seen_cursors.append(cursor)
+        return Response(200, json=pages[cursor])
+
+    return handler
+
+
+@pytest.mark.anyio
+async def test_iter_commit_pages_follows_end_cursor():
+    seen = []
+    with respx.mock(assert_all_called=True) as rsx:
+        rsx.post(GQL_URL).mock(side_effect=_paged_handler(seen))
+        pages = [p async for p in iter_commit_pages("o/r", SINCE)]
+
+    assert seen == [None, "c1", "c2"]
+    assert [[c["sha"] for c in p["commits"]] for p in pages] == [["a", "b"], ["c", "d"], ["e"]]
+    assert pages[0]["has_next_page"] and pages[0]["end_cursor"] == "c1"
+    assert not pages[-1]["has_next_page"]
+    assert pages[0]["default_branch"] == "trunk" and pages[0]["is_private"]
+
+
+@pytest.mark.anyio
+async def test_iter_commit_pages_resumes_after_cursor_and_fetch_collects_all():
+    seen = []
+    with respx.mock(assert_all_called=True) as rsx:
+        rsx.post(GQL_URL).mock(side_effect=_paged_handler(seen))
+        resumed = [p async for p in iter_commit_pages("o/r", SINCE, after="c1")]
+        full = await fetch_commits_since("o/r", SINCE)
+
+    assert seen == ["c1", "c2", None, "c1", "c2"]
+    assert len(resumed) == 2
+    assert [c["sha"] for c in full["commits"]] == ["a", "b", "c", "d", "e"]
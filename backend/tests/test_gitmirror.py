@@ -0,0 +1,140 @@
+import base64
+import datetime as dt
+import shutil
+import subprocess
+import time
+
+import pytest
+from sqlalchemy import func, select
+
+from habits_api import gitmirror, ingest
+from habits_api.config import get_settings
+from habits_api.db import Commit, CommitFile, CommitFileJob, Repository
+
+pytestmark = pytest.mark.skipif(shutil.which("git") is None, reason="git not installed")
+
+EMAIL = "123+octo@users.noreply.github.com"
+
+
+def _git(cwd, *args):
+    subprocess.run(["git", *args], cwd=cwd, check=True, capture_output=True)
+
+
+def _commit(repo, message, files):
+    for name, content in files.items():
+        path = repo / name
+        if content is None:
+            _git(repo, "rm", "-q", name)
+        else:
+            path.write_bytes(content) if isinstance(content, bytes) else path.write_text(content)
+            _git(repo, "add", name)
+    _git(repo, "commit", "-q", "-m", message)
+
+
+@pytest.fixture
+def upstream(tmp_path, monkeypatch):
+    """A local "remote" at remotes/o/r plus settings pointing the mirror engine at it."""
+    repo = tmp_path / "remotes" / "o" / "r"
+    repo.mkdir(parents=True)
+    _git(repo, "init", "-q", "-b", "trunk")
+    _git(repo, "config", "user.name", "Octo Cat")
+    _git(repo, "config", "user.email", EMAIL)
+    monkeypatch.setattr(get_settings(), "git_mirror_dir", str(tmp_path / "mirrors"))
+    monkeypatch.setattr(get_settings(), "git_remote_url", str(tmp_path / "remotes" / "{full_name}"))
+    return repo
+
+
+@pytest.mark.anyio
+async def test_history_pages_match_github_payload_shape(upstream):
+    _commit(upstream, "first\n\nwith a body", {"a.txt": "a\nb\n", "logo.png": b"\x00\x01\x02"})
+    _commit(upstream, "second", {"a.txt": "a\nc\nd\n", "logo.png": None, "new file.txt": "x\n"})
+    _commit(upstream, "third", {"b.txt": "1\n"})
+
+    since = dt.datetime.now(dt.timezone.utc) - dt.timedelta(days=1)
+    pages = [p async for p in gitmirror.iter_commit_pages("o/r", since, page_size=2)]
+
+    assert [p["has_next_page"] for p in pages] == [True, False]
+    assert all(p["default_branch"] == "trunk" and "is_private" not in p for p in pages)
+    commits = [c for p in pages for c in p["commits"]]
+    assert [c["message"] for c in commits] == ["third", "second", "first\n\nwith a body"]
+    second = commits[1]
+    assert (second["additions"], second["deletions"], second["changed_files"]) == (3, 1, 3)
+    assert second["author_name"] == "Octo Cat" and second["author_login"] == "octo"
+    assert dt.datetime.fromisoformat(second["committed_at"]) > since
+    assert set(second) >= {"sha", "committed_at", "message", "author_name", "author_login", "additions", "deletions", "changed_files", "url"}
+
+    files = await gitmirror.fetch_commit_files("o/r", second["sha"])
+    by_path = {f["path"]: f for f in files["files"]}
+    assert {p: f["status"] for p, f in by_path.items()} == {"a.txt": "modified", "logo.png": "removed", "new file.txt": "added"}
+    assert by_path["a.txt"]["patch"].startswith("@@ -1,2 +1,3 @@") and "+c" in by_path["a.txt"]["patch"]
+    assert by_path["logo.png"]["patch"] is None
+    assert files["stats"] == {"additions": 3, "deletions": 1, "total": 4}
+
+
+@pytest.mark.anyio
+async def test_ingest_repo_uses_git_source_incrementally(upstream, session_factory):
+    _commit(upstream, "one", {"a.txt": "1\n"})
+    async with session_factory() as session:
+        repo = Repository(full_name="o/r", source="git")
+        session.add(repo)
+        await session.commit()
+
+        assert await ingest.ingest_repo(session, repo) == 1
+        _commit(upstream, "two", {"a.txt": "2\n"})
+        # the next run fetches the mirror; overlapping history is ignored by the upsert
+        repo.last_checked_at = dt.datetime.now(dt.timezone.utc) - dt.timedelta(hours=1)
+        assert await ingest.ingest_repo(session, repo) == 1
+
+        assert repo.default_branch == "trunk"
+        assert (await session.execute(select(func.count(Commit.id)))).scalar_one() == 2
+        assert (await session.execute(select(func.count()).select_from(CommitFileJob))).scalar_one() == 2
+
+        commit = (await session.execute(select(Commit).where(Commit.message == "two"))).scalar_one()
+        assert await ingest.ensure_commit_files(session, repo, commit) == 1
+        path = (await session.execute(select(CommitFile.path).where(CommitFile.commit_id == commit.id))).scalar_one()
+        assert path == "a.txt"
+
+
+@pytest.fixture
+def pacific_host(monkeypatch):
+    """Run with a non-UTC local time zone."""
+    monkeypatch.setenv("TZ", "America/Los_Angeles")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+@pytest.mark.anyio
+async def test_naive_last_checked_at_is_utc_on_any_host(upstream, session_factory, monkeypatch, pacific_host):
+    now = dt.datetime.now(dt.timezone.utc)
+    monkeypatch.setenv("GIT_COMMITTER_DATE", (now - dt.timedelta(hours=2)).isoformat())
+    _commit(upstream, "two hours ago", {"a.txt": "1\n"})
+    async with session_factory() as session:
+        session.add(Repository(full_name="o/r", source="git", last_checked_at=now - dt.timedelta(hours=3)))
+        await session.commit()
+    # reloaded, as the scheduler sees it: SQLite returns last_checked_at naive
+    async with session_factory() as session:
+        repo = (await session.execute(select(Repository))).scalar_one()
+        assert repo.last_checked_at.tzinfo is None
+        assert await ingest.ingest_repo(session, repo) == 1
+
+
+@pytest.mark.anyio
+async def test_github_token_reaches_git_but_not_argv(monkeypatch):
+    monkeypatch.setattr(get_settings(), "github_token", "s3cret-token")
+    spawned = []
+    real_exec = gitmirror.asyncio.create_subprocess_exec
+
+    async def recording_exec(*cmd, **kwargs):
+        spawned.append(cmd)
+        return await real_exec(*cmd, **kwargs)
+
+    monkeypatch.setattr(gitmirror.asyncio, "create_subprocess_exec", recording_exec)
+    header = await gitmirror._git(None, "config", "--get", "http.https://github.com/.extraheader", url="https://github.com/o/r.git")
+
+    encoded = base64.b64encode(b"x-access-token:s3cret-token").decode()
+    assert header.strip() == f"AUTHORIZATION: basic {encoded}"
+    assert not any("s3cret" in arg or encoded in arg for arg in spawned[0])
+    # other remotes never see it
+    assert "GIT_CONFIG_VALUE_0" not in gitmirror._git_env("https://example.com/o/r.git")
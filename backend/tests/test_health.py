@@ -1,14 +1,13 @@
 import asyncio
 import pytest
-from httpx import AsyncClient
+from httpx import ASGITransport, AsyncClient
 
 from habits_api.app import app
 
 
 @pytest.mark.anyio
 async def test_health():
-    async with AsyncClient(app=app, base_url="http://test") as ac:
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
         r = await ac.get("/health")
         assert r.status_code == 200
         assert r.json()["status"] == "ok"
-
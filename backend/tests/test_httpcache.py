@@ -0,0 +1,69 @@
+import os
+
+import pytest
+import respx
+from httpx import Response
+
+from habits_api import httpcache
+from habits_api.config import get_settings
+from habits_api.github import fetch_commit_files
+from habits_api.httpcache import CacheEntry, HttpCache
+
+URL = "https://api.github.com/repos/o/r/commits/abc"
+PAYLOAD = {"files": [{"filename": "a.py", "status": "added", "additions": 1, "deletions": 0, "patch": "@@ +1 @@"}]}
+
+
+@pytest.mark.anyio
+async def test_rest_get_revalidates_with_etag(tmp_path, monkeypatch):
+    monkeypatch.setattr(get_settings(), "http_cache_path", str(tmp_path / "cache.db"))
+    seen = []
+
+    def handler(request):
+        seen.append(request.headers.get("if-none-match"))
+        if request.headers.get("if-none-match") == '"v1"':
+            return Response(304, headers={"ETag": '"v1"'})
+        return Response(200, json=PAYLOAD, headers={"ETag": '"v1"'})
+
+    with respx.mock(assert_all_called=True) as rsx:
+        rsx.get(URL).mock(side_effect=handler)
+        first = await fetch_commit_files("o/r", "abc")
+        second = await fetch_commit_files("o/r", "abc")
+
+    assert seen == [None, '"v1"']
+    assert first == second
+    assert second["files"][0]["patch"] == "@@ +1 @@"
+    stats = httpcache.get_http_cache().stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1 and stats["entries"] == 1
+    httpcache.close_http_cache()
+
+
+@pytest.mark.anyio
+async def test_lru_eviction_keeps_size_bounded(tmp_path):
+    cache = HttpCache(str(tmp_path / "cache.db"), max_bytes=2500, touch_after_seconds=0)
+    blob = os.urandom(1000)  # incompressible
+    await cache.put("u1", CacheEntry('"1"', None, "application/json", blob))
+    await cache.put("u2", CacheEntry('"2"', None, "application/json", blob))
+    assert await cache.get("u1") is not None  # u1 is now the most recently used
+    await cache.put("u3", CacheEntry('"3"', None, "application/json", blob))
+
+    assert await cache.get("u2") is None
+    assert (await cache.get("u1")).body == blob
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["size_bytes"] <= 2500
+    cache.close()
+
+
+@pytest.mark.anyio
+async def test_reads_only_rewrite_recency_when_it_is_stale(tmp_path):
+    cache = HttpCache(str(tmp_path / "cache.db"), max_bytes=10_000)
+    await cache.put("u1", CacheEntry('"1"', None, "application/json", b"x"))
+    stored = cache._conn.execute("SELECT accessed_at FROM http_cache").fetchone()[0]
+    assert await cache.get("u1") is not None
+    assert cache._conn.execute("SELECT accessed_at FROM http_cache").fetchone()[0] == stored
+
+    cache._conn.execute("UPDATE http_cache SET accessed_at = accessed_at - 3600")
+    assert await cache.get("u1") is not None
+    assert cache._conn.execute("SELECT accessed_at FROM http_cache").fetchone()[0] > stored - 3600
+    # the running size total matches the table
+    assert cache.stats()["size_bytes"] == cache._stored_bytes()
+    cache.close()
@@ -0,0 +1,131 @@
+import asyncio
+
+import pytest
+from sqlalchemy import func, select
+
+from habits_api import ingest
+from habits_api.cache import get_response_cache
+from habits_api.db import Commit, IngestEvent, Repository
+from habits_api.github import BatchResult
+
+
+async def _noop_allowlist(session):
+    return None
+
+
+def _commit(sha: str) -> dict:
+    return {
+        "sha": sha,
+        "committed_at": "2025-01-01T12:00:00Z",
+        "message": f"commit {sha}",
+        "author_name": "Alice",
+        "author_login": "alice",
+        "additions": 3,
+        "deletions": 1,
+        "changed_files": 1,
+        "url": None,
+    }
+
+
+@pytest.mark.anyio
+async def test_ingest_all_concurrent_with_failure_isolation(session_factory, monkeypatch):
+    async with session_factory() as session:
+        session.add_all([Repository(full_name=n) for n in ("a/one", "a/two", "a/broken", "a/bad", "a/three")])
+        await session.commit()
+
+    in_flight = 0
+    peak = 0
+
+    async def fake_batch(items):
+        items = dict(items)
+        payloads = {
+            name: {"default_branch": "main", "is_private": False, "commits": [_commit(name + "-1"), _commit(name + "-2")]}
+            for name in items
+            if name != "a/broken"
+        }
+        # A malformed commit makes this repo's write phase fail after the batch succeeded.
+        payloads["a/bad"]["commits"].append({"sha": "x"})
+        return BatchResult(payloads=payloads, errors={"a/broken": "NOT_FOUND"})
+
+    real_ingest_repo = ingest.ingest_repo
+
+    async def counting_ingest_repo(session, repo, **kwargs):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        try:
+            await asyncio.sleep(0.01)
+            return await real_ingest_repo(session, repo, **kwargs)
+        finally:
+            in_flight -= 1
+
+    monkeypatch.setattr(ingest, "ensure_allowlisted_repos", _noop_allowlist)
+    monkeypatch.setattr(ingest, "fetch_commits_batch", fake_batch)
+    monkeypatch.setattr(ingest, "ingest_repo", counting_ingest_repo)
+
+    stats = await ingest.ingest_all(session_factory, concurrency=2)
+
+    assert stats.repos_total == 5
+    assert stats.repos_done == 3
+    assert stats.repos_failed == 2
+    assert stats.new_commits == 6
+    assert stats.wall_time_s >= 0
+    assert peak == 2
+
+    async with session_factory() as session:
+        assert (await session.execute(select(func.count(Commit.id)))).scalar_one() == 6
+        for name in ("a/broken", "a/bad"):
+            repo = (await session.execute(select(Repository).where(Repository.full_name == name))).scalar_one()
+            assert repo.last_checked_at is None
+
+
+@pytest.mark.anyio
+async def test_ingest_repo_streams_remaining_pages(session_factory, monkeypatch):
+    resumed_from = []
+
+    async def fake_pages(full_name, since, after=None, source="github"):
+        resumed_from.append(after)
+        yield {"default_branch": "main", "is_private": False, "commits": [_commit("c3")], "has_next_page": True, "end_cursor": "p3"}
+        yield {"default_branch": "main", "is_private": False, "commits": [_commit("c4")], "has_next_page": False, "end_cursor": None}
+
+    monkeypatch.setattr(ingest, "iter_commit_pages", fake_pages)
+
+    async with session_factory() as session:
+        repo = Repository(full_name="a/big")
+        session.add(repo)
+        await session.commit()
+
+        first = {
+            "default_branch": "dev",
+            "is_private": True,
+            "commits": [_commit("c1"), _commit("c2")],
+            "has_next_page": True,
+            "end_cursor": "p2",
+        }
+        new = await ingest.ingest_repo(session, repo, payload=first)
+
+        assert new == 4
+        assert resumed_from == ["p2"]
+        assert repo.default_branch == "dev" and repo.is_private
+        assert repo.last_checked_at is not None
+        assert (await session.execute(select(func.count(Commit.id)))).scalar_one() == 4
+
+
+@pytest.mark.anyio
+async def test_idle_poll_does_not_invalidate(session_factory):
+    page = {"default_branch": "main", "is_private": False, "commits": [_commit("c1")], "has_next_page": False, "end_cursor": None}
+    async with session_factory() as session:
+        repo = Repository(full_name="a/quiet")
+        session.add(repo)
+        await session.commit()
+        await ingest.ingest_repo(session, repo, payload=page)
+        generation = get_response_cache().generation
+        events = (await session.execute(select(func.count(IngestEvent.id)))).scalar_one()
+
+        # same commits, same metadata: nothing for readers to refresh
+        assert await ingest.ingest_repo(session, repo, payload=page) == 0
+        assert get_response_cache().generation == generation
+        assert (await session.execute(select(func.count(IngestEvent.id)))).scalar_one() == events
+
+        await ingest.ingest_repo(session, repo, payload={**page, "default_branch": "trunk"})
+        assert get_response_cache().generation == generation + 1
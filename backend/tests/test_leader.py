@@ -0,0 +1,89 @@
+import datetime as dt
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from habits_api import leader
+from habits_api.app import app
+from habits_api.leader import DbLease, FileLease, LeaderElection
+
+NOW = dt.datetime(2025, 3, 1, 12, 0, tzinfo=dt.timezone.utc)
+
+
+@pytest.mark.anyio
+async def test_db_lease_is_exclusive_until_it_expires(session_factory):
+    a = DbLease(session_factory, ttl_seconds=30, holder="a")
+    b = DbLease(session_factory, ttl_seconds=30, holder="b")
+
+    assert await a.try_acquire(NOW)
+    assert not await b.try_acquire(NOW + dt.timedelta(seconds=5))
+    assert await a.try_acquire(NOW + dt.timedelta(seconds=10))  # heartbeat extends to +40s
+    assert not await b.try_acquire(NOW + dt.timedelta(seconds=35))
+
+    # `a` stopped renewing (crashed): `b` takes over once the lease has expired
+    assert await b.try_acquire(NOW + dt.timedelta(seconds=41))
+    assert not await a.try_acquire(NOW + dt.timedelta(seconds=42))
+    assert (await a.current())["holder"] == "b"
+
+
+@pytest.mark.anyio
+async def test_election_runs_callbacks_and_hands_over_on_stop(session_factory):
+    events = []
+
+    def election(name):
+        async def elected():
+            events.append((name, "elected"))
+
+        async def demoted():
+            events.append((name, "demoted"))
+
+        return LeaderElection(DbLease(session_factory, 30, holder=name), 30, elected, demoted)
+
+    a, b = election("a"), election("b")
+    assert await a.step() and not await b.step()
+    assert await a.step()  # renewal does not re-run callbacks
+    await a.stop()
+    assert await b.step()
+    assert events == [("a", "elected"), ("a", "demoted"), ("b", "elected")]
+
+
+@pytest.mark.anyio
+async def test_file_lease_allows_one_holder(tmp_path):
+    path = str(tmp_path / "leader.lock")
+    a, b = FileLease(path, holder="a"), FileLease(path, holder="b")
+    assert await a.try_acquire() and await a.try_acquire()
+    assert not await b.try_acquire()
+    assert (await b.current())["holder"] == "a"
+    await a.release()
+    assert await b.try_acquire()
+    await b.release()
+
+
+@pytest.mark.anyio
+async def test_api_with_ingestion_moved_to_a_worker_never_leads(session_factory):
+    events = []
+
+    async def elected():
+        events.append("elected")
+
+    async def demoted():
+        events.append("demoted")
+
+    assert await leader.start_leader_election(session_factory, elected, demoted, ingests=False) is None
+    assert not leader.is_leader()
+    await leader.stop_leader_election(demoted)
+    assert events == []
+    assert leader.is_leader()  # back to the default for the next start
+
+
+@pytest.mark.anyio
+async def test_manual_ingest_is_refused_where_ingestion_is_off(session_factory):
+    async def noop():
+        pass
+
+    await leader.start_leader_election(session_factory, noop, noop, ingests=False)
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+            assert (await ac.post("/admin/ingest")).status_code == 409
+    finally:
+        await leader.stop_leader_election(noop)
@@ -0,0 +1,171 @@
+import datetime as dt
+
+import pytest
+from sqlalchemy import func, inspect, select, text, update
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from habits_api.db import Base, CommitFile, PatchBlob, Repository, _upgrade_schema
+from habits_api.patches import compress_patch, dedupe_patches, gc_patches, load_patches, migrate_patches, patch_dedup_report, store_patches
+from habits_api.writes import insert_commit_files, insert_commits
+
+PATCH = "@@ -1,3 +1,3 @@\n-old line\n+new line\n context\n" * 20
+
+
+async def _commit_id(session, full_name="o/r"):
+    repo = Repository(full_name=full_name)
+    session.add(repo)
+    await session.flush()
+    ids = await insert_commits(session, repo.id, [{"sha": "a", "committed_at": "2025-01-01T00:00:00Z", "message": "m"}])
+    return ids["a"]
+
+
+@pytest.mark.anyio
+async def test_patches_stored_compressed_and_loaded_on_demand(session_factory):
+    async with session_factory() as session:
+        cid = await _commit_id(session)
+        await insert_commit_files(session, {cid: [{"path": "a.py", "patch": PATCH}, {"path": "bin.png", "patch": None}]})
+        await session.commit()
+
+        raw = (await session.execute(text("SELECT path, patch, patch_blob_id FROM commit_files ORDER BY path"))).all()
+        assert raw[0][1] is None and raw[0][2] is not None
+        assert raw[1][1] is None and raw[1][2] is None
+        blob = (await session.execute(select(PatchBlob))).scalar_one()
+        assert len(blob.data) < len(PATCH) / 5
+
+        files = (await session.execute(select(CommitFile).order_by(CommitFile.path))).scalars().all()
+        patches = await load_patches(session, files)
+        assert patches[files[0].id] == PATCH
+        assert patches.get(files[1].id) is None
+
+
+@pytest.mark.anyio
+async def test_migrate_legacy_inline_patches(session_factory):
+    async with session_factory() as session:
+        cid = await _commit_id(session)
+        session.add_all([CommitFile(commit_id=cid, path=f"f{i}.py", patch=f"{PATCH}{i}") for i in range(5)])
+        session.add(CommitFile(commit_id=cid, path="empty.txt"))
+        await session.commit()
+
+        files = (await session.execute(select(CommitFile).order_by(CommitFile.path))).scalars().all()
+        before = await load_patches(session, files)
+
+        assert await migrate_patches(session, batch_size=2) == 5
+        assert await migrate_patches(session) == 0
+        session.expunge_all()
+
+        files = (await session.execute(select(CommitFile).order_by(CommitFile.path))).scalars().all()
+        assert await load_patches(session, files) == before
+        assert (await session.execute(select(func.count()).where(CommitFile.patch.is_not(None)))).scalar_one() == 0
+        assert (await session.execute(select(func.count(PatchBlob.id)))).scalar_one() == 5
+
+
+@pytest.mark.anyio
+async def test_same_patch_in_fork_and_cherry_pick_is_stored_once(session_factory):
+    async with session_factory() as session:
+        upstream = await _commit_id(session, "o/r")
+        fork = await _commit_id(session, "fork/r")
+        await insert_commit_files(session, {upstream: [{"path": "a.py", "patch": PATCH}, {"path": "b.py", "patch": PATCH}]})
+        await insert_commit_files(session, {fork: [{"path": "a.py", "patch": PATCH}, {"path": "c.py", "patch": "other"}]})
+        await session.commit()
+
+        assert (await session.execute(select(func.count(PatchBlob.id)))).scalar_one() == 2
+        files = (await session.execute(select(CommitFile))).scalars().all()
+        patches = await load_patches(session, files)
+        assert sorted(patches.values()) == sorted([PATCH, PATCH, PATCH, "other"])
+
+        report = await patch_dedup_report(session)
+        assert report["file_patches"] == 4 and report["distinct_blobs"] == 2 and report["dedup_ratio"] == 2.0
+        assert report["referenced_bytes"] > report["stored_bytes"]
+
+
+@pytest.mark.anyio
+async def test_gc_and_dedupe_legacy_blobs(session_factory):
+    async with session_factory() as session:
+        cid = await _commit_id(session)
+        # blobs written before dedup: no hash, one copy per file
+        blobs = [PatchBlob(codec="zlib", data=compress_patch(PATCH)) for _ in range(3)]
+        orphan = PatchBlob(codec="zlib", data=compress_patch("orphan"))
+        session.add_all([*blobs, orphan])
+        await session.flush()
+        session.add_all([CommitFile(commit_id=cid, path=f"f{i}.py", patch_blob_id=b.id) for i, b in enumerate(blobs)])
+        await session.commit()
+
+        assert await dedupe_patches(session, batch_size=2) == 2
+        assert await dedupe_patches(session) == 0
+        assert await gc_patches(session, grace_seconds=0) == 1
+        session.expunge_all()
+
+        assert (await session.execute(select(func.count(PatchBlob.id)))).scalar_one() == 1
+        files = (await session.execute(select(CommitFile))).scalars().all()
+        assert set((await load_patches(session, files)).values()) == {PATCH}
+
+        # new writes reuse the now-hashed blob
+        await insert_commit_files(session, {cid: [{"path": "g.py", "patch": PATCH}]})
+        await session.commit()
+        assert (await session.execute(select(func.count(PatchBlob.id)))).scalar_one() == 1
+
+
+@pytest.mark.anyio
+async def test_upgrade_schema_upgrades_old_tables(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'old.db'}")
+    async with engine.begin() as conn:
+        await conn.execute(text("CREATE TABLE commit_files (id INTEGER PRIMARY KEY, commit_id INTEGER, path VARCHAR(1024), status VARCHAR(32), additions INTEGER, deletions INTEGER, patch TEXT)"))
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(text("DROP TABLE patch_blobs"))
+        await conn.execute(text("CREATE TABLE patch_blobs (id INTEGER PRIMARY KEY, codec VARCHAR(16), data BLOB)"))
+        await conn.run_sync(_upgrade_schema)
+        columns = await conn.run_sync(lambda c: {col["name"] for col in inspect(c).get_columns("commit_files")})
+        indexes = await conn.run_sync(lambda c: {ix["name"] for ix in inspect(c).get_indexes("patch_blobs")})
+    await engine.dispose()
+    assert "patch_blob_id" in columns
+    assert "ix_patch_blobs_hash" in indexes
+
+
+@pytest.mark.anyio
+async def test_commit_detail_reads_blobs_only_when_returning_patches(session_factory, monkeypatch):
+    from httpx import ASGITransport, AsyncClient
+
+    from habits_api import app as app_module
+    from habits_api.db import get_session
+
+    async with session_factory() as session:
+        cid = await _commit_id(session)
+        await insert_commit_files(session, {cid: [{"path": "a.py", "patch": PATCH}]})
+        await session.commit()
+
+    loads = 0
+    real_load = app_module.load_patches
+
+    async def counting_load(session, files):
+        nonlocal loads
+        loads += 1
+        return await real_load(session, files)
+
+    async def _session():
+        async with session_factory() as s:
+            yield s
+
+    monkeypatch.setattr(app_module, "load_patches", counting_load)
+    app_module.app.dependency_overrides[get_session] = _session
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app_module.app), base_url="http://test") as ac:
+            without = (await ac.get("/repos/1/commit/a?include_patch=false")).json()
+            assert loads == 0
+            with_patch = (await ac.get("/repos/1/commit/a")).json()
+    finally:
+        app_module.app.dependency_overrides.clear()
+
+    assert without["files"][0]["patch"] is None
+    assert with_patch["files"][0]["patch"] == PATCH and loads == 1
+
+
+@pytest.mark.anyio
+async def test_gc_keeps_fresh_blobs(session_factory):
+    async with session_factory() as session:
+        await store_patches(session, iter(["a", "b"]))  # a generator is only consumed once
+        await session.commit()
+        # not referenced yet: a file write may still be on its way
+        assert await gc_patches(session) == 0
+        await session.execute(update(PatchBlob).values(created_at=dt.datetime.now(dt.timezone.utc) - dt.timedelta(days=1)))
+        await session.commit()
+        assert await gc_patches(session) == 2
@@ -0,0 +1,64 @@
+import datetime as dt
+import time
+
+import pytest
+import respx
+from httpx import Response
+
+from habits_api import github, ratelimit
+from habits_api.ratelimit import GRAPHQL, REST, Budget, RateGovernor
+
+
+def _governor(rate=1000.0, burst=100, reserve=0):
+    return RateGovernor(Budget(GRAPHQL, rate, burst, reserve), Budget(REST, rate, burst, reserve))
+
+
+@pytest.mark.anyio
+async def test_token_bucket_paces_requests():
+    gov = _governor(rate=50.0, burst=1)
+    started = time.perf_counter()
+    for _ in range(4):
+        await gov.acquire(REST)
+    # One token up front, then three refills at 50/s
+    assert time.perf_counter() - started >= 0.05
+
+
+def test_headers_and_graphql_rate_limit_update_separate_budgets():
+    gov = _governor()
+    reset = int(time.time()) + 120
+    resp = Response(200, headers={"X-RateLimit-Limit": "5000", "X-RateLimit-Remaining": "42", "X-RateLimit-Reset": str(reset)})
+    assert gov.observe(REST, resp) is False
+    gov.observe_graphql({"remaining": 4999, "resetAt": "2030-01-01T00:00:00Z"})
+
+    snap = gov.snapshot()
+    assert snap["rest"]["remaining"] == 42 and snap["rest"]["limit"] == 5000
+    assert snap["rest"]["reset_at"] == dt.datetime.fromtimestamp(reset, dt.timezone.utc)
+    assert snap["graphql"]["remaining"] == 4999
+    assert snap["graphql"]["reset_at"].year == 2030
+
+
+def test_exhausted_budget_waits_until_reset():
+    gov = _governor(reserve=10)
+    reset = int(time.time()) + 30
+    gov.observe(REST, Response(200, headers={"X-RateLimit-Remaining": "10", "X-RateLimit-Reset": str(reset)}))
+    assert 25 < gov.budgets[REST].wait_seconds() <= 30
+    assert gov.budgets[GRAPHQL].wait_seconds() == 0
+
+
+def test_secondary_limit_and_plain_forbidden():
+    gov = _governor()
+    assert gov.observe(REST, Response(403, headers={"Retry-After": "5"})) is True
+    assert 4 < gov.budgets[REST].wait_seconds() <= 5
+    assert gov.observe(GRAPHQL, Response(403, json={"message": "Resource not accessible"})) is False
+
+
+@pytest.mark.anyio
+async def test_request_retries_after_secondary_limit(monkeypatch):
+    gov = _governor()
+    monkeypatch.setattr(ratelimit, "_governor", gov)
+    url = "https://api.github.com/repos/o/r/commits/abc"
+    with respx.mock(assert_all_called=True) as rsx:
+        route = rsx.get(url).mock(side_effect=[Response(429, headers={"Retry-After": "0.05"}), Response(200, json={"files": []})])
+        data = await github.fetch_commit_files("o/r", "abc")
+    assert route.call_count == 2
+    assert data["files"] == []
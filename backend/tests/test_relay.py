@@ -0,0 +1,40 @@
+import pytest
+
+from habits_api import relay
+from habits_api.cache import get_response_cache
+from habits_api.config import get_settings
+from habits_api.events import get_broadcaster
+
+
+@pytest.mark.anyio
+async def test_relay_replays_other_processes_rows_once(session_factory, monkeypatch):
+    async with session_factory() as session:
+        await relay.record_event(session, {"type": "ingest", "repo_id": 1})  # before the relay started
+
+    tail = relay.EventRelay(session_factory)
+    assert await tail.step() == 0  # takes its position; history is not replayed
+    sub = get_broadcaster().subscribe()
+    generation = get_response_cache().generation
+
+    async with session_factory() as session:
+        await relay.record_event(session)  # written by this process: already applied here
+        monkeypatch.setattr(relay, "ORIGIN", "worker")
+        await relay.record_event(session, {"type": "ingest", "repo_id": 2})
+        await relay.record_event(session)
+
+    assert await tail.step() == 2
+    # one invalidation per batch, one /stream event per carried payload
+    assert get_response_cache().generation == generation + 1
+    assert sub.queue.get_nowait() == {"type": "ingest", "repo_id": 2}
+    assert sub.queue.empty()
+    assert await tail.step() == 0
+
+
+@pytest.mark.anyio
+async def test_relay_off_records_nothing(session_factory, monkeypatch):
+    monkeypatch.setattr(get_settings(), "event_relay", False)
+    tail = relay.EventRelay(session_factory)
+    await tail.step()
+    async with session_factory() as session:
+        await relay.record_event(session, {"type": "ingest"})
+    assert await tail.step() == 0
@@ -0,0 +1,88 @@
+import datetime as dt
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from habits_api import app as app_module
+from habits_api.app import app
+from habits_api.cache import bump_generation
+from habits_api.db import Repository, get_session
+from habits_api.writes import insert_commits
+
+
+@pytest.fixture
+async def client(session_factory):
+    async with session_factory() as session:
+        session.add(Repository(full_name="o/r"))
+        await session.commit()
+
+    async def _session():
+        async with session_factory() as s:
+            yield s
+
+    app.dependency_overrides[get_session] = _session
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        yield ac
+    app.dependency_overrides.clear()
+
+
+@pytest.mark.anyio
+async def test_summary_cached_until_generation_bump(client, session_factory, monkeypatch):
+    builds = 0
+    real = app_module._summary
+
+    async def counting(session, w):
+        nonlocal builds
+        builds += 1
+        return await real(session, w)
+
+    monkeypatch.setattr(app_module, "_summary", counting)
+
+    first = await client.get("/metrics/summary")
+    etag = first.headers["etag"]
+    assert first.status_code == 200 and etag.startswith('"')
+
+    not_modified = await client.get("/metrics/summary", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304 and not_modified.content == b""
+    assert builds == 1
+
+    async with session_factory() as session:
+        now = dt.datetime.now(dt.timezone.utc).isoformat()
+        await insert_commits(session, 1, [{"sha": "a", "committed_at": now, "message": "m"}])
+        await session.commit()
+    bump_generation()
+
+    fresh = await client.get("/metrics/summary", headers={"If-None-Match": etag})
+    assert fresh.status_code == 200
+    assert fresh.json()["total_commits"] == 1
+    assert fresh.headers["etag"] != etag
+    assert builds == 2
+
+
+@pytest.mark.anyio
+async def test_cache_keys_by_window_and_skips_errors(client):
+    assert (await client.get("/repos/1/commits?window=6h")).json() == []
+    assert (await client.get("/repos/1/metrics?window=7d")).json()["window"] == "7d"
+    assert (await client.get("/repos/1/metrics?window=24h")).json()["window"] == "24h"
+    assert (await client.get("/repos/99/metrics")).status_code == 404
+
+
+@pytest.mark.anyio
+async def test_write_during_build_is_not_masked(client, monkeypatch):
+    builds = 0
+    real = app_module._summary
+
+    async def racing(session, w):
+        nonlocal builds
+        builds += 1
+        result = await real(session, w)
+        if builds == 1:
+            bump_generation()  # ingestion commits while this response is being built
+        return result
+
+    monkeypatch.setattr(app_module, "_summary", racing)
+    assert (await client.get("/metrics/summary")).status_code == 200
+    assert (await client.get("/metrics/summary")).status_code == 200
+    assert builds == 2  # the first result was served but not cached
+    assert (await client.get("/metrics/summary")).status_code == 200
+    assert builds == 2
@@ -0,0 +1,94 @@
+import datetime as dt
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import select
+
+from habits_api.app import app
+from habits_api.db import Commit, CommitRollup, Repository, get_session
+from habits_api.rollups import rebuild_rollups, window_totals
+from habits_api.writes import insert_commits
+
+UTC = dt.timezone.utc
+NOW = dt.datetime(2025, 3, 10, 15, 20, tzinfo=UTC)
+
+
+def _commit(sha, ts, adds=1, dels=1):
+    return {"sha": sha, "committed_at": ts.isoformat(), "message": sha, "additions": adds, "deletions": dels}
+
+
+async def _seed(session):
+    repo = Repository(full_name="o/r")
+    other = Repository(full_name="o/other")
+    session.add_all([repo, other])
+    await session.flush()
+    await insert_commits(
+        session,
+        repo.id,
+        [
+            _commit("old", NOW - dt.timedelta(hours=30), 100, 100),  # outside a 24h window
+            _commit("head", NOW - dt.timedelta(hours=23, minutes=50), 1, 2),  # partial first hour
+            _commit("headx", NOW - dt.timedelta(hours=24, minutes=10), 50, 50),  # same hour, before since
+            _commit("mid1", NOW - dt.timedelta(hours=5), 3, 4),
+            _commit("mid2", NOW - dt.timedelta(hours=5, minutes=1), 5, 6),
+            _commit("tail", NOW - dt.timedelta(minutes=5), 7, 8),  # current partial hour
+        ],
+    )
+    await insert_commits(session, other.id, [_commit("o1", NOW - dt.timedelta(hours=2), 10, 0)])
+    await session.commit()
+    return repo, other
+
+
+@pytest.mark.anyio
+async def test_window_totals_match_raw_aggregation(session_factory):
+    async with session_factory() as session:
+        repo, other = await _seed(session)
+        since = NOW - dt.timedelta(hours=24)
+        totals = await window_totals(session, since, now=NOW)
+        assert totals[repo.id] == (4, 16, 20)
+        assert totals[other.id] == (1, 10, 0)
+        assert await window_totals(session, since, repo_id=other.id, now=NOW) == {other.id: (1, 10, 0)}
+
+
+@pytest.mark.anyio
+async def test_rollups_maintained_on_insert_and_rebuild_is_equivalent(session_factory):
+    async with session_factory() as session:
+        await _seed(session)
+        # duplicates must not double count
+        repo = (await session.execute(select(Repository).where(Repository.full_name == "o/r"))).scalar_one()
+        await insert_commits(session, repo.id, [_commit("mid1", NOW - dt.timedelta(hours=5), 3, 4)])
+        await session.commit()
+
+        incremental = sorted((r.repo_id, r.hour, r.commits, r.additions, r.deletions) for r in (await session.execute(select(CommitRollup))).scalars())
+        assert await rebuild_rollups(session) == len(incremental)
+        session.expunge_all()
+        rebuilt = sorted((r.repo_id, r.hour, r.commits, r.additions, r.deletions) for r in (await session.execute(select(CommitRollup))).scalars())
+        assert rebuilt == incremental
+        assert (repo.id, dt.datetime(2025, 3, 10, 10, 0), 2, 8, 10) in [(a, h.replace(tzinfo=None), c, ad, de) for a, h, c, ad, de in rebuilt]
+
+
+@pytest.mark.anyio
+async def test_summary_endpoint_uses_rollups(session_factory):
+    async with session_factory() as session:
+        recent = dt.datetime.now(UTC) - dt.timedelta(hours=3)
+        repo = Repository(full_name="o/r")
+        session.add(repo)
+        await session.flush()
+        await insert_commits(session, repo.id, [_commit("a", recent, 2, 3), _commit("b", recent, 1, 0)])
+        await session.commit()
+
+    async def _session():
+        async with session_factory() as s:
+            yield s
+
+    app.dependency_overrides[get_session] = _session
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+            summary = (await ac.get("/metrics/summary?window=24h")).json()
+            metrics = (await ac.get(f"/repos/{repo.id}/metrics?window=6h")).json()
+    finally:
+        app.dependency_overrides.clear()
+
+    assert summary["total_commits"] == 2 and summary["total_lines_updated"] == 6
+    assert summary["repos_updated_count"] == 1
+    assert metrics["commits_count"] == 2 and metrics["lines_added"] == 3 and metrics["lines_deleted"] == 3
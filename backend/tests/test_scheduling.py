@@ -0,0 +1,94 @@
+import datetime as dt
+
+import pytest
+from sqlalchemy import select
+
+from habits_api import scheduling
+from habits_api.config import get_settings
+from habits_api.db import Commit, RepoSchedule, Repository
+
+NOW = dt.datetime(2025, 3, 1, 12, 0, tzinfo=dt.timezone.utc)
+HOUR = 3600
+
+
+@pytest.fixture(autouse=True)
+def _bounds(monkeypatch):
+    settings = get_settings()
+    monkeypatch.setattr(settings, "scheduler_min_interval_minutes", 5)
+    monkeypatch.setattr(settings, "scheduler_max_interval_minutes", 1440)
+    monkeypatch.setattr(settings, "scheduler_backoff_factor", 2.0)
+    monkeypatch.setattr(settings, "github_webhook_secret", None)
+
+
+def test_poll_interval_follows_activity_within_bounds():
+    assert scheduling.poll_interval(NOW, NOW - dt.timedelta(days=60), previous=3 * HOUR, found_new=True) == 300
+    # idle for 2 hours -> about every 12 minutes; dormant for 60 days -> capped at a day
+    assert scheduling.poll_interval(NOW, NOW - dt.timedelta(hours=2)) == 720
+    assert scheduling.poll_interval(NOW, NOW - dt.timedelta(days=60)) == 24 * HOUR
+    # empty polls back off exponentially
+    assert scheduling.poll_interval(NOW, NOW - dt.timedelta(minutes=10), previous=300) == 600
+    assert scheduling.poll_interval(NOW, NOW - dt.timedelta(minutes=10), previous=20 * HOUR) == 24 * HOUR
+
+
+async def _seed(session_factory):
+    async with session_factory() as session:
+        active = Repository(full_name="o/active", last_checked_at=NOW - dt.timedelta(minutes=30))
+        dormant = Repository(full_name="o/dormant", last_checked_at=NOW - dt.timedelta(hours=1))
+        fresh = Repository(full_name="o/fresh")
+        session.add_all([active, dormant, fresh])
+        await session.flush()
+        session.add_all(
+            [
+                Commit(repo_id=active.id, sha="a", committed_at=NOW - dt.timedelta(hours=1), message=""),
+                Commit(repo_id=dormant.id, sha="d", committed_at=NOW - dt.timedelta(days=90), message=""),
+            ]
+        )
+        await session.commit()
+        return active.id, dormant.id, fresh.id
+
+
+@pytest.mark.anyio
+async def test_scheduler_polls_due_repos_and_state_survives_restart(session_factory):
+    active, dormant, fresh = await _seed(session_factory)
+    polled = []
+
+    async def job(factory, repo_ids):
+        polled.append(sorted(repo_ids))
+        async with factory() as session:
+            # `active` succeeds with a new commit; `fresh` fails (left due)
+            await scheduling.record_poll(session, active, NOW, newest_commit_at=NOW - dt.timedelta(minutes=1))
+            await session.commit()
+
+    sched = scheduling.AdaptiveScheduler(job, session_factory, polls_per_hour=600)
+    await sched.run_once(NOW)
+    assert polled == [sorted([active, fresh])]
+
+    async with session_factory() as session:
+        rows = {r.repo_id: r for r in (await session.execute(select(RepoSchedule))).scalars()}
+    assert rows[active].interval_seconds == 300 and rows[active].failures == 0
+    assert rows[fresh].failures == 1
+    assert rows[dormant].interval_seconds == 24 * HOUR
+
+    # a new scheduler (restart) reads the same next-due times: nothing is due a minute later
+    restarted = scheduling.AdaptiveScheduler(job, session_factory, polls_per_hour=600)
+    wait = await restarted.run_once(NOW + dt.timedelta(minutes=1))
+    assert len(polled) == 1 and 0 < wait <= 4 * 60
+
+
+@pytest.mark.anyio
+async def test_poll_budget_defers_api_repos_but_not_git_mirrors(session_factory):
+    async with session_factory() as session:
+        session.add_all([Repository(full_name=f"o/api{i}") for i in range(3)] + [Repository(full_name="o/mirror", source="git")])
+        await session.commit()
+    polled = []
+
+    async def job(factory, repo_ids):
+        polled.extend(repo_ids)
+
+    # 6 polls/hour allows a burst of one
+    sched = scheduling.AdaptiveScheduler(job, session_factory, polls_per_hour=6)
+    wait = await sched.run_once(NOW)
+    async with session_factory() as session:
+        names = (await session.execute(select(Repository.full_name).where(Repository.id.in_(polled)))).scalars().all()
+    assert sorted(names) == ["o/api0", "o/mirror"]
+    assert wait > 0
@@ -0,0 +1,67 @@
+import pytest
+import respx
+from httpx import ASGITransport, AsyncClient, Response
+from sqlalchemy import select
+
+from habits_api import telemetry
+from habits_api.app import app
+from habits_api.db import Repository, get_session
+from habits_api.github import fetch_commit_files
+from habits_api.ingest import ingest_all, ingest_repo
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = telemetry.Registry()
+    hist = registry.register(telemetry.Histogram("t_seconds", "Test.", ("kind",), buckets=(0.1, 1.0)))
+    counter = registry.register(telemetry.Counter("t_total", "Test.", ("path",)))
+    for value in (0.05, 0.5, 2.0):
+        hist.observe(value, kind="a")
+    counter.inc(path='say "hi"\n')
+
+    lines = registry.render().splitlines()
+    assert "# TYPE t_seconds histogram" in lines
+    assert 't_seconds_bucket{kind="a",le="0.1"} 1' in lines
+    assert 't_seconds_bucket{kind="a",le="1"} 2' in lines
+    assert 't_seconds_bucket{kind="a",le="+Inf"} 3' in lines
+    assert 't_seconds_sum{kind="a"} 2.55' in lines and 't_seconds_count{kind="a"} 3' in lines
+    assert 't_total{path="say \\"hi\\"\\n"} 1' in lines
+
+
+@pytest.mark.anyio
+async def test_prometheus_endpoint_reports_routes_queries_github_and_ingest(session_factory):
+    telemetry.instrument_engine(session_factory.kw["bind"])
+
+    async def _session():
+        async with session_factory() as s:
+            yield s
+
+    app.dependency_overrides[get_session] = _session
+    try:
+        async with session_factory() as session:
+            repo = Repository(full_name="o/r")
+            session.add(repo)
+            await session.commit()
+            page = {"default_branch": "main", "commits": [{"sha": "a", "committed_at": "2025-01-01T00:00:00Z"}]}
+            await ingest_repo(session, repo, payload=page)
+        await ingest_all(session_factory, repo_ids=[])
+
+        with respx.mock() as rsx:
+            rsx.get("https://api.github.com/repos/o/r/commits/a").mock(
+                return_value=Response(200, json={"files": []}, headers={"x-ratelimit-remaining": "4999"})
+            )
+            await fetch_commit_files("o/r", "a")
+
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+            assert (await ac.get(f"/repos/{repo.id}/metrics")).status_code == 200
+            r = await ac.get("/metrics/prometheus")
+    finally:
+        app.dependency_overrides.clear()
+
+    assert r.status_code == 200 and r.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = r.text
+    assert 'habits_http_request_seconds_count{method="GET",route="/repos/{repo_id}/metrics",status="200"}' in body
+    assert 'habits_db_query_seconds_count{statement="SELECT"}' in body
+    assert 'habits_github_requests_total{kind="rest",status="200"}' in body
+    assert 'habits_github_ratelimit_remaining{kind="rest"} 4999' in body
+    assert 'habits_ingest_new_commits_total{repo="o/r"}' in body
+    assert "habits_ingest_tick_seconds_count" in body and "habits_ingest_ticks_running 0" in body
@@ -0,0 +1,86 @@
+import datetime as dt
+import random
+from collections import Counter
+from zoneinfo import ZoneInfo
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from habits_api.app import app
+from habits_api.db import Repository, get_session
+from habits_api.writes import insert_commits
+
+UTC = dt.timezone.utc
+START = dt.datetime(2025, 3, 20, tzinfo=UTC)
+END = dt.datetime(2025, 4, 10, tzinfo=UTC)
+
+
+@pytest.fixture
+async def stamps(session_factory):
+    """Random commit times across the 2025 spring DST change, split over two repos."""
+    rng = random.Random(7)
+    span = int((END - START).total_seconds())
+    times = sorted(START + dt.timedelta(seconds=rng.randrange(span)) for _ in range(600))
+    async with session_factory() as session:
+        session.add_all([Repository(full_name="o/a"), Repository(full_name="o/b")])
+        await session.flush()
+        for repo_id in (1, 2):
+            rows = [{"sha": f"{repo_id}-{i}", "committed_at": t.isoformat(), "additions": 2, "deletions": 1} for i, t in enumerate(times) if i % 2 == repo_id - 1]
+            await insert_commits(session, repo_id, rows)
+        await session.commit()
+    return times
+
+
+@pytest.fixture
+async def client(session_factory):
+    async def _session():
+        async with session_factory() as s:
+            yield s
+
+    app.dependency_overrides[get_session] = _session
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        yield ac
+    app.dependency_overrides.clear()
+
+
+def _expected(times, bucket, tz):
+    zone = ZoneInfo(tz)
+    keys = Counter()
+    for t in times:
+        local = t.astimezone(zone)
+        if bucket == "hour":
+            start = t.replace(minute=0, second=0) if local.utcoffset().total_seconds() % 3600 == 0 else local.replace(minute=0, second=0)
+            keys[start.astimezone(UTC)] += 1
+        else:
+            day = local.date() - dt.timedelta(days=local.weekday() if bucket == "week" else 0)
+            keys[dt.datetime.combine(day, dt.time(), tzinfo=zone).astimezone(UTC)] += 1
+    return keys
+
+
+@pytest.mark.parametrize(
+    "bucket,tz",
+    [("day", "Europe/Berlin"), ("week", "America/New_York"), ("hour", "Europe/Berlin"), ("day", "Asia/Kolkata"), ("hour", "Asia/Kolkata")],
+)
+@pytest.mark.anyio
+async def test_buckets_match_local_calendar(client, stamps, bucket, tz):
+    r = await client.get("/metrics/timeseries", params={"bucket": bucket, "tz": tz, "since": START.isoformat(), "until": END.isoformat()})
+    assert r.status_code == 200
+    body = r.json()
+    got = {dt.datetime.fromisoformat(p["start"]).astimezone(UTC): p["commits"] for p in body["points"] if p["commits"]}
+    assert got == dict(_expected(stamps, bucket, tz))
+    assert sum(p["additions"] for p in body["points"]) == 2 * len(stamps)
+    # zero-filled and contiguous
+    starts = [dt.datetime.fromisoformat(p["start"]) for p in body["points"]]
+    assert starts == sorted(starts) and len(set(starts)) == len(starts)
+
+
+@pytest.mark.anyio
+async def test_per_repo_and_validation(client, stamps):
+    params = {"since": START.isoformat(), "until": END.isoformat()}
+    one = (await client.get("/metrics/timeseries", params={**params, "repo_id": 1})).json()
+    assert sum(p["commits"] for p in one["points"]) == 300
+    assert (await client.get("/metrics/timeseries", params={**params, "repo_id": 9})).status_code == 404
+    assert (await client.get("/metrics/timeseries", params={"tz": "Mars/Olympus"})).status_code == 400
+    assert (await client.get("/metrics/timeseries", params={"bucket": "minute"})).status_code == 422
+    too_long = {"bucket": "hour", "since": "2020-01-01T00:00:00Z", "until": "2025-01-01T00:00:00Z"}
+    assert (await client.get("/metrics/timeseries", params=too_long)).status_code == 400
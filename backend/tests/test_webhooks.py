@@ -0,0 +1,152 @@
+import asyncio
+import datetime as dt
+import json
+from pathlib import Path
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from habits_api import webhooks
+from habits_api.app import app
+from habits_api.config import get_settings
+from habits_api.db import Repository
+from habits_api.writes import insert_commits
+
+SECRET = "s3cret"
+PUSH = (Path(__file__).parent / "fixtures" / "github_push.json").read_bytes()
+
+
+def _headers(body, event="push", secret=SECRET):
+    return {"Content-Type": "application/json", "X-GitHub-Event": event, "X-Hub-Signature-256": webhooks.sign(secret, body)}
+
+
+@pytest.fixture
+def queue(session_factory, monkeypatch):
+    monkeypatch.setattr(get_settings(), "github_webhook_secret", SECRET)
+    q = webhooks.PushQueue(session_factory, debounce_seconds=60)
+    monkeypatch.setattr(webhooks, "_queue", q)
+    return q
+
+
+@pytest.mark.anyio
+async def test_replayed_push_is_verified_and_bursts_are_merged(queue):
+    other_branch = json.dumps({**json.loads(PUSH), "ref": "refs/heads/feature"}).encode()
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        assert (await ac.post("/webhooks/github", content=PUSH, headers=_headers(PUSH, secret="wrong"))).status_code == 401
+        assert (await ac.post("/webhooks/github", content=b"{}", headers=_headers(b"{}", event="ping"))).json() == {"status": "pong"}
+
+        first = await ac.post("/webhooks/github", content=PUSH, headers=_headers(PUSH))
+        redelivery = await ac.post("/webhooks/github", content=PUSH, headers=_headers(PUSH))
+        ignored = await ac.post("/webhooks/github", content=other_branch, headers=_headers(other_branch))
+
+    assert first.status_code == 202 and first.json() == {"status": "queued", "repo": "o/r", "commits": 2}
+    assert redelivery.json()["status"] == "merged"
+    assert ignored.json()["status"] == "ignored"
+    assert queue.pending == ["o/r"]
+
+
+@pytest.mark.anyio
+async def test_non_object_payloads_are_rejected(queue):
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        for body in (b"[]", b"null", b"42", b"not json", b'{"repository": "o/r"}'):
+            r = await ac.post("/webhooks/github", content=body, headers=_headers(body))
+            assert r.status_code == 400, body
+    assert queue.pending == []
+
+
+@pytest.mark.anyio
+async def test_queue_ingests_from_oldest_pushed_commit_and_skips_known(queue, session_factory, monkeypatch):
+    calls = []
+
+    async def fake_ingest_repo(session, repo, since=None):
+        calls.append((repo.full_name, since))
+        return 2
+
+    monkeypatch.setattr(webhooks, "ingest_repo", fake_ingest_repo)
+    async with session_factory() as session:
+        repo = Repository(full_name="o/r", last_checked_at=dt.datetime(2025, 1, 3, tzinfo=dt.timezone.utc))
+        session.add(repo)
+        await session.commit()
+
+    push = webhooks.parse_push(json.loads(PUSH))
+    queue.add(push)
+    queue.add(webhooks.PushEvent(full_name="not/tracked", default_branch="main", commits={}))
+    assert await queue.drain() == 2
+    assert calls == [("o/r", dt.datetime(2025, 1, 2, 8, 14, 3, tzinfo=dt.timezone.utc))]
+
+    async with session_factory() as session:
+        await insert_commits(session, 1, [{"sha": sha, "committed_at": ts, "message": ""} for sha, ts in push.commits.items()])
+        await session.commit()
+    queue.add(push)
+    await queue.drain()
+    assert len(calls) == 1
+
+
+@pytest.mark.anyio
+async def test_started_queue_debounces_a_burst_into_one_run(session_factory, monkeypatch):
+    runs = []
+
+    async def fake_process(full_name, commits):
+        runs.append(sorted(commits))
+
+    q = webhooks.PushQueue(session_factory, debounce_seconds=0.05)
+    monkeypatch.setattr(q, "process", fake_process)
+    q.start()
+    try:
+        q.add(webhooks.PushEvent("o/r", "main", {"a": None}))
+        q.add(webhooks.PushEvent("o/r", "main", {"b": None}))
+        await asyncio.sleep(0.2)
+    finally:
+        await q.stop()
+    assert runs == [["a", "b"]]
+
+
+@pytest.mark.anyio
+async def test_non_leader_hands_push_to_the_leaders_scheduler(queue, session_factory, monkeypatch):
+    from sqlalchemy import select
+
+    from habits_api.db import RepoSchedule
+
+    async def fail_ingest(*args, **kwargs):
+        raise AssertionError("only the leader ingests")
+
+    monkeypatch.setattr(webhooks, "ingest_repo", fail_ingest)
+    monkeypatch.setattr(webhooks, "is_leader", lambda: False)
+    checked = dt.datetime(2025, 1, 3, tzinfo=dt.timezone.utc)
+    async with session_factory() as session:
+        session.add(Repository(full_name="o/r", last_checked_at=checked))
+        await session.commit()
+
+    before = dt.datetime.now(dt.timezone.utc)
+    assert await queue.process("o/r", webhooks.parse_push(json.loads(PUSH)).commits) == 0
+
+    async with session_factory() as session:
+        repo = (await session.execute(select(Repository))).scalar_one()
+        sched = (await session.execute(select(RepoSchedule))).scalar_one()
+    assert repo.last_checked_at.replace(tzinfo=dt.timezone.utc) == dt.datetime(2025, 1, 2, 8, 14, 3, tzinfo=dt.timezone.utc)
+    assert sched.next_due_at.replace(tzinfo=dt.timezone.utc) >= before - dt.timedelta(seconds=1)
+
+
+@pytest.mark.anyio
+async def test_handed_off_push_is_polled_in_fixed_mode(queue, session_factory, monkeypatch):
+    from habits_api import ingest
+    from habits_api.github import BatchResult
+
+    requested = []
+
+    async def fake_batch(items):
+        requested.extend(name for name, _ in items)
+        return BatchResult(payloads={name: {"default_branch": "main", "is_private": False, "commits": []} for name, _ in items}, errors={})
+
+    monkeypatch.setattr(webhooks, "is_leader", lambda: False)
+    monkeypatch.setattr(ingest, "fetch_commits_batch", fake_batch)
+    async with session_factory() as session:
+        session.add_all([Repository(full_name="o/r"), Repository(full_name="o/quiet")])
+        await session.commit()
+
+    assert await ingest.ingest_requested(session_factory) is None
+    await queue.process("o/r", webhooks.parse_push(json.loads(PUSH)).commits)
+    stats = await ingest.ingest_requested(session_factory)
+    assert stats.repos_done == 1 and requested == ["o/r"]
+    # the poll answered the request
+    assert await ingest.ingest_requested(session_factory) is None
@@ -0,0 +1,45 @@
+import datetime as dt
+
+import pytest
+from sqlalchemy import func, select
+
+from habits_api.db import Commit, CommitFile, Repository
+from habits_api.writes import insert_commit_files, insert_commits
+
+
+def _commit(sha: str, ts: str = "2025-01-01T12:00:00Z") -> dict:
+    return {"sha": sha, "committed_at": ts, "message": sha, "additions": 2, "deletions": 1, "changed_files": 1}
+
+
+@pytest.mark.anyio
+async def test_insert_commits_skips_existing_and_returns_new_ids(session_factory):
+    async with session_factory() as session:
+        repo = Repository(full_name="o/r")
+        session.add(repo)
+        await session.flush()
+
+        first = await insert_commits(session, repo.id, [_commit("a"), _commit("b"), _commit("a")])
+        second = await insert_commits(session, repo.id, [_commit("b"), _commit("c", "2025-01-01T14:00:00+02:00")])
+        await session.commit()
+
+        assert set(first) == {"a", "b"}
+        assert set(second) == {"c"}
+        assert (await session.execute(select(func.count(Commit.id)))).scalar_one() == 3
+        c = (await session.execute(select(Commit).where(Commit.sha == "c"))).scalar_one()
+        assert c.committed_at.replace(tzinfo=None) == dt.datetime(2025, 1, 1, 12, 0)
+
+
+@pytest.mark.anyio
+async def test_insert_commit_files_is_idempotent(session_factory):
+    async with session_factory() as session:
+        repo = Repository(full_name="o/r")
+        session.add(repo)
+        await session.flush()
+        ids = await insert_commits(session, repo.id, [_commit("a"), _commit("b")])
+
+        files = [{"path": "x.py", "status": "added", "additions": 1, "deletions": 0, "patch": "@@"}, {"path": "y.py"}]
+        assert await insert_commit_files(session, {ids["a"]: files, ids["b"]: files[:1]}) == 3
+        assert await insert_commit_files(session, {ids["a"]: files}) == 0
+        await session.commit()
+
+        assert (await session.execute(select(func.count(CommitFile.id)))).scalar_one() == 3